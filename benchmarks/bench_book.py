@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2018, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Benchmarks for filling Books of many histograms, which share one fill program.
+
+from histbook.axis import *
+from histbook.hist import *
+
+from benchmarks.bench_fill import events, eventrate
+
+class FillBook(object):
+    params = ([1, 10, 100, 1000], [False, True])
+    param_names = ["numhists", "weighted"]
+    timeout = 600
+
+    def setup(self, numhists, weighted):
+        self.arrays = events()
+        weight = "w" if weighted else None
+        self.book = Book()
+        for i in range(numhists):
+            # a quarter of the histograms share their expression, so common subexpressions are exercised
+            if i % 4 == 0:
+                self.book["h{0}".format(i)] = Hist(bin("x", 100, -5, 5), weight=weight)
+            else:
+                self.book["h{0}".format(i)] = Hist(bin("x + {0}".format(i), 100, -5, 5), weight=weight)
+        self.book.fill(self.arrays)
+
+    def time_fill(self, numhists, weighted):
+        self.book.fill(self.arrays)
+
+    def peakmem_fill(self, numhists, weighted):
+        self.book.fill(self.arrays)
+
+    def track_eventrate(self, numhists, weighted):
+        return eventrate(self.book, self.arrays, number=1)
+    track_eventrate.unit = "events/s"
+
+class FilterBook(object):
+    # a selection shared by the whole book is applied before the other expressions are computed
+    params = ([None, "x > 0", "x > 2"], [False, True])
+    param_names = ["filter", "shared"]
+    timeout = 600
+
+    def setup(self, filter, shared):
+        self.arrays = events()
+        self.book = Book()
+        for i in range(10):
+            hfilter = filter if shared or filter is None or i % 2 == 0 else "y > -10"
+            self.book["h{0}".format(i)] = Hist(bin("sinh(atan2(y, x) * log(x**2 + y**2 + {0}))".format(i + 1), 100, -5, 5), filter=hfilter)
+        self.book.fill(self.arrays)
+
+    def time_fill(self, filter, shared):
+        self.book.fill(self.arrays)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2018, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Benchmarks for exporting filled histograms to Pandas and Vega-Lite.
+
+from histbook.axis import *
+from histbook.hist import *
+
+from benchmarks.bench_fill import events
+
+class Export(object):
+    params = [10, 100, 1000]
+    param_names = ["numbins"]
+
+    def setup(self, numbins):
+        self.hist = Hist(groupby("c"), bin("x", numbins, -5, 5), profile("y"), weight="w")
+        self.hist.fill(events())
+
+    def time_pandas(self, numbins):
+        self.hist.pandas("y")
+
+    def peakmem_pandas(self, numbins):
+        self.hist.pandas("y")
+
+    def time_vegalite(self, numbins):
+        self.hist.overlay("c").step("x").vegalite()
+
+    def peakmem_vegalite(self, numbins):
+        self.hist.overlay("c").step("x").vegalite()
+
+    def time_arrow(self, numbins):
+        self.hist.arrow()
+
+    def peakmem_arrow(self, numbins):
+        self.hist.arrow()
+
+    def time_uproot(self, numbins):
+        self.hist.uproot("x", "y")
+
+    def time_tojson(self, numbins):
+        self.hist.overlay("c").step("x").tojson()
+
+    def time_vegalite_maxbins(self, numbins):
+        self.hist.overlay("c").step("x").vegalite(maxbins=50)
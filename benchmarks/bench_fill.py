@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2018, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Benchmarks for Hist.fill, run with airspeed velocity ("asv run" from the repository root).
+#
+#   time_*      wall time per fill
+#   peakmem_*   peak resident memory of a fill
+#   track_*     events per second, which is the number to watch for regressions
+
+import timeit
+
+import numpy
+
+from histbook.axis import *
+from histbook.hist import *
+
+NUMEVENTS = 100000
+
+def events(numevents=NUMEVENTS):
+    random = numpy.random.RandomState(12345)
+    return {"x": random.normal(0, 1, numevents),
+            "y": random.normal(0, 1, numevents),
+            "w": random.exponential(1, numevents),
+            "i": random.randint(-5, 15, numevents),
+            "c": random.randint(0, 10, numevents)}
+
+AXES = {"bin":      lambda: bin("x", 100, -5, 5),
+        "intbin":   lambda: intbin("i", 0, 10),
+        "split":    lambda: split("x", (-3, -2, -1, 0, 1, 2, 3)),
+        "cut":      lambda: cut("x > 0"),
+        "groupby":  lambda: groupby("c"),
+        "groupbin": lambda: groupbin("x", 0.1),
+        "growbin":  lambda: growbin("x", 0.1),
+        "profile":  lambda: profile("y"),
+        "quantile": lambda: quantile("y")}
+
+def eventrate(hist, arrays, number=3):
+    return number * len(arrays["x"]) / timeit.timeit(lambda: hist.fill(arrays), number=number)
+
+class Fill(object):
+    params = (sorted(AXES), [False, True])
+    param_names = ["axis", "weighted"]
+
+    def setup(self, axis, weighted):
+        self.arrays = events()
+        self.hist = Hist(AXES[axis](), weight=("w" if weighted else None))
+        self.hist.fill(self.arrays)   # compile the fill program outside of the timed region
+
+    def time_fill(self, axis, weighted):
+        self.hist.fill(self.arrays)
+
+    def peakmem_fill(self, axis, weighted):
+        self.hist.fill(self.arrays)
+
+    def track_eventrate(self, axis, weighted):
+        return eventrate(self.hist, self.arrays)
+    track_eventrate.unit = "events/s"
+
+class FillMultidimensional(object):
+    def setup(self):
+        self.arrays = events()
+        self.hist = Hist(groupby("c"), bin("x", 100, -5, 5), bin("y", 100, -5, 5), profile("x * y"), weight="w")
+        self.hist.fill(self.arrays)
+
+    def time_fill(self):
+        self.hist.fill(self.arrays)
+
+    def peakmem_fill(self):
+        self.hist.fill(self.arrays)
+
+    def track_eventrate(self):
+        return eventrate(self.hist, self.arrays)
+    track_eventrate.unit = "events/s"
+
+class FillCompensated(object):
+    # compensated float32 sums take as many bytes as float64 and cost more time; this tracks by how much
+    params = (["float64", "float32", "compensated"], [1000, NUMEVENTS])
+    param_names = ["content", "numevents"]
+
+    def setup(self, content, numevents):
+        self.arrays = events(numevents)
+        opts = {"float64": {}, "float32": {"dtype": numpy.float32}, "compensated": {"compensated": True}}[content]
+        self.hist = Hist(bin("x", 1000, -5, 5), bin("y", 1000, -5, 5), weight="w", **opts)
+        self.hist.fill(self.arrays)
+
+    def time_fill(self, content, numevents):
+        self.hist.fill(self.arrays)
+
+    def track_contentbytes(self, content, numevents):
+        return self.hist._contentbytes()
+    track_contentbytes.unit = "bytes"
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2018, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Benchmarks for projections and tables of filled histograms.
+
+from histbook.axis import *
+from histbook.hist import *
+
+from benchmarks.bench_fill import events
+
+def filled():
+    hist = Hist(groupby("c"), bin("x", 100, -5, 5), bin("y", 100, -5, 5), cut("x > y"), profile("x * y"), weight="w")
+    hist.fill(events())
+    return hist
+
+class Projection(object):
+    def setup(self):
+        self.hist = filled()
+
+    def time_project(self):
+        self.hist.project("c", "x")
+
+    def time_select(self):
+        self.hist.select("x < 1")
+
+    def time_rebin(self):
+        self.hist.rebin("x", (-5, -1, 0, 1, 5))
+
+    def time_rebinby(self):
+        self.hist.rebinby("x", 5)
+
+    def peakmem_project(self):
+        self.hist.project("c", "x")
+
+class Table(object):
+    def setup(self):
+        self.hist = filled()
+
+    def time_table(self):
+        self.hist.table("x * y")
+
+    def time_fraction(self):
+        self.hist.fraction("x > y")
+
+    def peakmem_table(self):
+        self.hist.table("x * y")
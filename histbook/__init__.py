@@ -28,6 +28,6 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from histbook.axis import groupby, groupbin, bin, intbin, split, cut, profile
+from histbook.axis import groupby, groupbin, bin, intbin, growbin, growintbin, split, cut, profile, quantile
 from histbook.hist import Hist, Book
 from histbook.vega import overlay, beside, below
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2018, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# asyncio front end to Fillable.fill; requires Python 3.5+, so it is only imported by Fillable.afill/afillstream
+# and setup.py leaves it out of installations on older Pythons
+
+import asyncio
+import functools
+import inspect
+
+import histbook.hist
+
+def _lock(fillable):
+    # asyncio.Lock is bound to the loop it was created in, so keep one per running loop
+    loop = asyncio.get_event_loop()
+    if fillable._asynclock is None or fillable._asynclock[0] is not loop:
+        fillable._asynclock = (loop, asyncio.Lock())
+    return fillable._asynclock[1]
+
+async def _resolve(fillable, arrays):
+    # only the fields the histograms need are awaited, and they are awaited concurrently
+    names = []
+    awaitables = []
+    out = {}
+    for name in fillable.fields:
+        try:
+            array = arrays[name]
+        except KeyError:
+            continue
+        if inspect.isawaitable(array):
+            names.append(name)
+            awaitables.append(array)
+        else:
+            out[name] = array
+
+    _closeunused(arrays, awaitables)
+
+    for name, array in zip(names, await asyncio.gather(*awaitables)):
+        out[name] = array
+    return out
+
+def _closeunused(arrays, used):
+    # coroutines under fields that no histogram needs are closed, rather than left to warn that they were never awaited;
+    # futures and other awaitables may be shared with other code, so they are left alone
+    if isinstance(arrays, histbook.hist._ChainedDict):
+        _closeunused(arrays._one, used)
+        _closeunused(arrays._two, used)
+    elif isinstance(arrays, dict):
+        for array in arrays.values():
+            if inspect.iscoroutine(array) and not any(array is x for x in used):
+                array.close()
+
+async def _fill(fillable, arrays, executor):
+    async with _lock(fillable):
+        await asyncio.get_event_loop().run_in_executor(executor, functools.partial(fillable.fill, arrays))
+
+async def afill(fillable, arrays, executor=None):
+    await _fill(fillable, await _resolve(fillable, arrays), executor)
+
+async def afillstream(fillable, source, executor=None):
+    # the next chunk is fetched and resolved while the previous one fills
+    pending = None
+    try:
+        async for arrays in source:
+            arrays = await _resolve(fillable, histbook.hist._fieldsource(arrays))
+            if pending is not None:
+                await pending
+            pending = asyncio.ensure_future(_fill(fillable, arrays, executor))
+    finally:
+        if pending is not None:
+            await pending
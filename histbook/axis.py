@@ -28,14 +28,18 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import math
 import numbers
 
+import histbook.calc
 import histbook.expr
 import histbook.instr
 
 import numpy
 
 class Interval(object):
+    __slots__ = ("_low", "_high", "_closedlow", "_closedhigh")
+
     def __init__(self, low, high, closedlow=True, closedhigh=False):
         self._low = low
         self._high = high
@@ -107,7 +111,16 @@ class Interval(object):
     def __hash__(self):
         return hash((self.__class__, self._low, self._high, self._closedlow, self._closedhigh))
 
+    def __getstate__(self):
+        return dict((n, getattr(self, n)) for n in Interval.__slots__ if hasattr(self, n))
+
+    def __setstate__(self, state):
+        for n, x in state.items():
+            setattr(self, n, x)
+
 class IntervalNaN(Interval):
+    __slots__ = ()
+
     def __init__(self):
         pass
 
@@ -146,14 +159,37 @@ class IntervalNaN(Interval):
         return hash((self.__class__,))
 
 class IntervalTuple(tuple):
+    __slots__ = ()
+
     def __repr__(self):
         return "({0}{1})".format(", ".join(str(x) for x in self), ("," if len(self) == 1 else ""))
 
 class IntervalPair(tuple):
+    __slots__ = ()
+
     def __repr__(self):
         return "({0}, {1})".format(str(self[0]), repr(self[1]))
 
 class Axis(object):
+    # _original, _parsed and the index attributes are assigned by the Hist that owns the axis
+    __slots__ = ("_expr", "_original", "_parsed", "_shapeindex", "_dictindex", "_sumwxindex", "_sumwx2index", "_sketchindex")
+
+    @classmethod
+    def _slotnames(cls):
+        return [n for c in cls.__mro__ for n in c.__dict__.get("__slots__", ())]
+
+    def __getstate__(self):
+        return dict((n, getattr(self, n)) for n in self._slotnames() if hasattr(self, n))
+
+    def __setstate__(self, state):
+        for n, x in state.items():
+            setattr(self, n, x)
+
+    def _copy(self):
+        out = self.__class__.__new__(self.__class__)
+        out.__setstate__(self.__getstate__())
+        return out
+
     @staticmethod
     def _int(x, n):
         if not isinstance(x, (numbers.Integral, numpy.integer)):
@@ -185,19 +221,30 @@ class Axis(object):
     def __ne__(self, other):
         return not self.__eq__(other)
 
-class GroupAxis(Axis): pass
+class GroupAxis(Axis):
+    __slots__ = ()
+
 class FixedAxis(Axis):
+    __slots__ = ()
+
     def items(self, content):
         keys = self.keys()
         if len(keys) != len(content):
             raise ValueError("len(keys) is {0} but len(content) is {1}", len(keys), len(content))
         return [IntervalPair(x) for x in zip(keys, content)]
 
-class ProfileAxis(Axis): pass
-class RebinFactor(Axis): pass
-class RebinSplit(Axis): pass
+class ProfileAxis(Axis):
+    __slots__ = ()
+
+class RebinFactor(Axis):
+    __slots__ = ()
+
+class RebinSplit(Axis):
+    __slots__ = ()
 
 class groupby(GroupAxis):
+    __slots__ = ()
+
     def __init__(self, expr):
         self._expr = expr
 
@@ -251,6 +298,8 @@ class groupby(GroupAxis):
         return [IntervalPair((n, content[n])) for n in sorted(content)]
 
 class groupbin(GroupAxis, RebinFactor):
+    __slots__ = ("_binwidth", "_origin", "_nanflow", "_closedlow")
+
     def __init__(self, expr, binwidth, origin=0, nanflow=True, closedlow=True):
         self._expr = expr
         self._binwidth = self._real(binwidth, "binwidth")
@@ -305,12 +354,21 @@ class groupbin(GroupAxis, RebinFactor):
     def _rebinfactor(self, factor, content, index):
         assert factor > 0
 
-        newaxis = groupbin(self._expr, float(self._binwidth) / float(factor), origin=self._origin, nanflow=self._nanflow, closedlow=self._closedlow)
+        newaxis = groupbin(self._expr, float(self._binwidth) * float(factor), origin=self._origin, nanflow=self._nanflow, closedlow=self._closedlow)
         if hasattr(self, "_original"):
             newaxis._original = self._original
         if hasattr(self, "_parsed"):
             newaxis._parsed = self._parsed
 
+        def add(left, right):
+            if isinstance(left, dict):
+                out = dict(left)
+                for n, x in right.items():
+                    out[n] = add(out[n], x) if n in out else x
+                return out
+            else:
+                return left + right
+
         def recurse(j, content):
             if j == index:
                 out = {}
@@ -319,19 +377,19 @@ class groupbin(GroupAxis, RebinFactor):
                         out[n] = recurse(j + 1, x)
 
                     else:
-                        index = (n - float(self._origin)) / float(self._binwidth)
+                        i = (n - float(self._origin)) / float(self._binwidth)
                         if self._closedlow:
-                            index = int(numpy.floor(index))
+                            i = int(numpy.floor(i))
                         else:
-                            index = int(numpy.ceil(index)) - 1
+                            i = int(numpy.ceil(i)) - 1
 
-                        index = index // int(factor)
+                        i = i // int(factor)
 
-                        n = index * float(newindex._binwidth) + float(newaxis._origin)
+                        n = i * float(newaxis._binwidth) + float(newaxis._origin)
                         if n not in out:
                             out[n] = recurse(j + 1, x)
                         else:
-                            out[n] += recurse(j + 1, x)
+                            out[n] = add(out[n], recurse(j + 1, x))
 
                 return out
                         
@@ -398,6 +456,8 @@ class groupbin(GroupAxis, RebinFactor):
         return [IntervalPair((Interval(n, n + float(self._binwidth), closedlow=self._closedlow, closedhigh=(not self._closedlow)), content[n])) for n in sorted(content)]
 
 class bin(FixedAxis, RebinFactor, RebinSplit):
+    __slots__ = ("_numbins", "_low", "_high", "_underflow", "_overflow", "_nanflow", "_closedlow")
+
     def __init__(self, expr, numbins, low, high, underflow=True, overflow=True, nanflow=True, closedlow=True):
         self._expr = expr
         self._numbins = self._nonnegint(numbins, "numbins")
@@ -459,6 +519,25 @@ class bin(FixedAxis, RebinFactor, RebinSplit):
     def closedlow(self):
         return self._closedlow
 
+    @property
+    def edges(self):
+        out = numpy.arange(self._numbins + 1, dtype=numpy.float64)
+        if self._numbins > 0:
+            numpy.divide(out, float(self._numbins), out)
+            numpy.multiply(out, float(self._high - self._low), out)
+        numpy.add(out, float(self._low), out)
+        out[-1] = self._high
+        return out
+
+    @property
+    def centers(self):
+        edges = self.edges
+        return 0.5*(edges[:-1] + edges[1:])
+
+    @property
+    def widths(self):
+        return numpy.diff(self.edges)
+
     def relabel(self, label):
         return bin(label, self._numbins, self._low, self._high, underflow=self._underflow, overflow=self._overflow, nanflow=self._nanflow, closedlow=self._closedlow)
 
@@ -467,7 +546,7 @@ class bin(FixedAxis, RebinFactor, RebinSplit):
         return self._numbins + (1 if self._underflow else 0) + (1 if self._overflow else 0) + (1 if self._nanflow else 0)
 
     def split(self):
-        splitaxis = split(self._expr, [(float(i) / float(self._numbins)) * (self._high - self._low) + self._low for i in range(self._numbins)] + [self._high], underflow=self._underflow, overflow=self._overflow, nanflow=self._nanflow, closedlow=self._closedlow)
+        splitaxis = split(self._expr, self.edges.tolist(), underflow=self._underflow, overflow=self._overflow, nanflow=self._nanflow, closedlow=self._closedlow)
         if hasattr(self, "_original"):
             splitaxis._original = self._original
         if hasattr(self, "_parsed"):
@@ -494,29 +573,25 @@ class bin(FixedAxis, RebinFactor, RebinSplit):
 
     def _select(self, cmp, value, tolerance):
         if value == float("-inf") and cmp == ">=":
-            out = self.__class__.__new__(self.__class__)
-            out.__dict__.update(self.__dict__)
+            out = self._copy()
             out._nanflow = False
             out._checktot()
             return out, slice(0, self._numbins + (1 if self._underflow else 0) + (1 if self._overflow else 0)), None, False
 
         elif value == float("inf") and cmp == "<=":
-            out = self.__class__.__new__(self.__class__)
-            out.__dict__.update(self.__dict__)
+            out = self._copy()
             out._nanflow = False
             out._checktot()
             return out, slice(0, self._numbins + (1 if self._underflow else 0) + (1 if self._overflow else 0)), None, False
 
         elif isinstance(value, (numbers.Real, numpy.floating, numpy.integer)) and numpy.isnan(value) and cmp == "!=":
-            out = self.__class__.__new__(self.__class__)
-            out.__dict__.update(self.__dict__)
+            out = self._copy()
             out._nanflow = False
             out._checktot()
             return out, slice(0, self._numbins + (1 if self._underflow else 0) + (1 if self._overflow else 0)), None, False
 
         elif isinstance(value, (numbers.Real, numpy.floating, numpy.integer)) and numpy.isnan(value) and cmp == "==":
-            out = self.__class__.__new__(self.__class__)
-            out.__dict__.update(self.__dict__)
+            out = self._copy()
             out._nanflow = False
             out._checktot()
             return out, slice(self._numbins + (1 if self._underflow else 0) + (1 if self._overflow else 0), self._numbins + (1 if self._underflow else 0) + (1 if self._overflow else 0) + 1), None, False
@@ -527,8 +602,7 @@ class bin(FixedAxis, RebinFactor, RebinSplit):
             close = min(self._numbins, max(0, edgenum)) / scale + float(self._low)
 
             if abs(value - close) < tolerance:
-                out = self.__class__.__new__(self.__class__)
-                out.__dict__.update(self.__dict__)
+                out = self._copy()
 
                 if self._closedlow and cmp == "<":
                     out._numbins = edgenum
@@ -570,14 +644,15 @@ class bin(FixedAxis, RebinFactor, RebinSplit):
             return None, None, None, False
 
     def keys(self, content=None):
-        def i2x(i):
-            return (float(i) / float(self._numbins)) * float(self._high - self._low) + float(self._low)
+        edges = self.edges.tolist()
         return IntervalTuple(([Interval(float("-inf"), float(self._low), closedlow=True, closedhigh=(not self._closedlow))] if self.underflow else []) +
-                             [Interval(i2x(i), i2x(i + 1), closedlow=self._closedlow, closedhigh=(not self._closedlow)) for i in range(self._numbins)] +
+                             [Interval(low, high, closedlow=self._closedlow, closedhigh=(not self._closedlow)) for low, high in zip(edges[:-1], edges[1:])] +
                              ([Interval(float(self._high), float("inf"), closedlow=self._closedlow, closedhigh=True)] if self.overflow else []) +
                              ([IntervalNaN()] if self.nanflow else []))
             
 class intbin(FixedAxis, RebinFactor, RebinSplit):
+    __slots__ = ("_min", "_max", "_underflow", "_overflow")
+
     def __init__(self, expr, min, max, underflow=True, overflow=True):
         self._expr = expr
         self._min = self._int(min, "min")
@@ -618,6 +693,18 @@ class intbin(FixedAxis, RebinFactor, RebinSplit):
     def overflow(self):
         return self._overflow
 
+    @property
+    def edges(self):
+        return numpy.arange(self._min, self._max + 2, dtype=numpy.float64) - 0.5
+
+    @property
+    def centers(self):
+        return numpy.arange(self._min, self._max + 1, dtype=numpy.float64)
+
+    @property
+    def widths(self):
+        return numpy.ones(self.numbins, dtype=numpy.float64)
+
     def relabel(self, label):
         return intbin(label, self._min, self._max, underflow=self._underflow, overflow=self._overflow)
 
@@ -655,36 +742,28 @@ class intbin(FixedAxis, RebinFactor, RebinSplit):
         return self.bin()._rebinsplit(edges, content, index)
 
     def _rebinfactor(self, factor, content, index):
-        return self.bin()._rebinfactor(edges, content, index)
+        return self.bin()._rebinfactor(factor, content, index)
 
     def _select(self, cmp, value, tolerance):
         if value == float("-inf") and cmp == ">=":
-            out = self.__class__.__new__(self.__class__)
-            out.__dict__.update(self.__dict__)
-            out._nanflow = False
+            out = self._copy()
             out._checktot()
-            return out, slice(0, self._numbins + (1 if self._underflow else 0) + (1 if self._overflow else 0)), None, False
+            return out, slice(0, self.numbins + (1 if self._underflow else 0) + (1 if self._overflow else 0)), None, False
 
         elif value == float("-inf") and cmp == ">":
-            out = self.__class__.__new__(self.__class__)
-            out.__dict__.update(self.__dict__)
-            out._nanflow = False
+            out = self._copy()
             out._checktot()
-            return out, slice(0, self._numbins + (1 if self._underflow else 0) + (1 if self._overflow else 0)), None, False
+            return out, slice(0, self.numbins + (1 if self._underflow else 0) + (1 if self._overflow else 0)), None, False
 
         elif value == float("inf") and cmp == "<=":
-            out = self.__class__.__new__(self.__class__)
-            out.__dict__.update(self.__dict__)
-            out._nanflow = False
+            out = self._copy()
             out._checktot()
-            return out, slice(0, self._numbins + (1 if self._underflow else 0) + (1 if self._overflow else 0)), None, False
+            return out, slice(0, self.numbins + (1 if self._underflow else 0) + (1 if self._overflow else 0)), None, False
 
         elif value == float("inf") and cmp == "<":
-            out = self.__class__.__new__(self.__class__)
-            out.__dict__.update(self.__dict__)
-            out._nanflow = False
+            out = self._copy()
             out._checktot()
-            return out, slice(0, self._numbins + (1 if self._underflow else 0) + (1 if self._overflow else 0)), None, False
+            return out, slice(0, self.numbins + (1 if self._underflow else 0) + (1 if self._overflow else 0)), None, False
 
         elif isinstance(value, (numbers.Real, numpy.floating, numpy.integer)):
             if value + tolerance < self._min:
@@ -693,34 +772,29 @@ class intbin(FixedAxis, RebinFactor, RebinSplit):
                 return None, None, self._max, False
 
             if abs(value - round(value)) < tolerance:
-                out = self.__class__.__new__(self.__class__)
-                out.__dict__.update(self.__dict__)
+                out = self._copy()
 
                 if cmp == "<":
                     out._max = int(round(value)) - 1
                     out._overflow = False
-                    out._nanflow = False
                     out._checktot()
                     return out, slice(None, out._max - self._min + (1 if self._underflow else 0) + 1), round(value), False
 
                 elif cmp == "<=":
                     out._max = int(round(value))
                     out._overflow = False
-                    out._nanflow = False
                     out._checktot()
                     return out, slice(None, out._max - self._min + (1 if self._underflow else 0) + 1), round(value), False
 
                 elif cmp == ">":
                     out._min = int(round(value)) + 1
                     out._underflow = False
-                    out._nanflow = False
                     out._checktot()
                     return out, slice(out._min - self._min + (1 if self._underflow else 0), None), round(value), False
 
                 elif cmp == ">=":
                     out._min = int(round(value))
                     out._underflow = False
-                    out._nanflow = False
                     out._checktot()
                     return out, slice(out._min - self._min + (1 if self._underflow else 0), None), round(value), False
 
@@ -736,7 +810,216 @@ class intbin(FixedAxis, RebinFactor, RebinSplit):
                              [i for i in range(int(self._min), int(self._max) + 1)] +
                              ([Interval(int(self._max), float("inf"), closedlow=False, closedhigh=True)] if self.overflow else []))
 
+class GrowAxis(FixedAxis):
+    __slots__ = ()
+
+    # one outlier far from the rest would otherwise allocate every bin in between (and overflow INDEXTYPE)
+    _defaultmaxbins = 100000
+
+    @staticmethod
+    def _maxbinsarg(maxbins):
+        if not isinstance(maxbins, (numbers.Integral, numpy.integer)) or not 0 < maxbins < numpy.iinfo(histbook.calc.INDEXTYPE).max:
+            raise TypeError("maxbins must be a positive integer less than {0}".format(numpy.iinfo(histbook.calc.INDEXTYPE).max))
+        return int(maxbins)
+
+    def _checkmaxbins(self, numbins):
+        if numbins > self._maxbins:
+            raise ValueError("{0}({1}) would need {2} bins, more than maxbins={3}; raise maxbins or filter out the outliers".format(self.__class__.__name__, repr(self._expr), numbins, self._maxbins))
+
+    def _grown(self, low, high):
+        if self.numbins > 0:
+            low, high = min(low, self._firstindex), max(high, self._firstindex + self.numbins)
+        if self.numbins > 0 and low == self._firstindex and high == self._firstindex + self.numbins:
+            return self
+        self._checkmaxbins(high - low)
+        out = self._copy()
+        out._setrange(low, high - low)
+        return out
+
+    def _union(self, other):
+        if other.numbins == 0:
+            return self
+        return self._grown(other._firstindex, other._firstindex + other.numbins)
+
+    def _growmap(self, new):
+        # positions of this axis's bins in a wider range: regular bins shift by whole bins, the nanflow bin stays last
+        out = numpy.arange(self.totbins, dtype=numpy.int64) + (self._firstindex - new._firstindex)
+        if self.totbins > self.numbins:
+            out[-1] = new.totbins - 1
+        return out
+
+class growbin(GrowAxis, bin):
+    __slots__ = ("_binwidth", "_origin", "_lowindex", "_maxbins")
+
+    def __init__(self, expr, binwidth, origin=0, low=None, high=None, nanflow=True, closedlow=True, maxbins=GrowAxis._defaultmaxbins):
+        self._expr = expr
+        self._maxbins = self._maxbinsarg(maxbins)
+        self._binwidth = self._real(binwidth, "binwidth")
+        if self._binwidth <= 0:
+            raise ValueError("binwidth must be positive")
+        self._origin = self._real(origin, "origin")
+        self._underflow = False
+        self._overflow = False
+        self._nanflow = self._bool(nanflow, "nanflow")
+        self._closedlow = self._bool(closedlow, "closedlow")
+        if (low is None) != (high is None):
+            raise ValueError("low and high must be given together")
+        if low is None:
+            self._setrange(0, 0)
+        else:
+            low, high = self._real(low, "low"), self._real(high, "high")
+            if low > high:
+                raise ValueError("low must not be greater than than high")
+            # the initial range is extended outward to whole bins (edges that are already bin boundaries are kept)
+            lowindex, highindex = (low - self._origin) / self._binwidth, (high - self._origin) / self._binwidth
+            lowindex = int(round(lowindex)) if abs(lowindex - round(lowindex)) < 1e-9 else int(math.floor(lowindex))
+            highindex = int(round(highindex)) if abs(highindex - round(highindex)) < 1e-9 else int(math.ceil(highindex))
+            self._checkmaxbins(highindex - lowindex)
+            self._setrange(lowindex, highindex - lowindex)
+
+    def _setrange(self, lowindex, numbins):
+        self._lowindex = lowindex
+        self._numbins = numbins
+        self._low = self._origin + lowindex*self._binwidth
+        self._high = self._origin + (lowindex + numbins)*self._binwidth
+
+    def _checktot(self):
+        pass
+
+    @property
+    def _firstindex(self):
+        return self._lowindex
+
+    def __repr__(self):
+        args = [repr(self._expr), repr(self._binwidth)]
+        if self._origin != 0:
+            args.append("origin={0}".format(repr(self._origin)))
+        if self._numbins > 0:
+            args.append("low={0}".format(repr(self._low)))
+            args.append("high={0}".format(repr(self._high)))
+        if self._nanflow is not True:
+            args.append("nanflow={0}".format(repr(self._nanflow)))
+        if self._closedlow is not True:
+            args.append("closedlow={0}".format(repr(self._closedlow)))
+        if self._maxbins != self._defaultmaxbins:
+            args.append("maxbins={0}".format(repr(self._maxbins)))
+        return "growbin({0})".format(", ".join(args))
+
+    @property
+    def maxbins(self):
+        return self._maxbins
+
+    @property
+    def binwidth(self):
+        return self._binwidth
+
+    @property
+    def origin(self):
+        return self._origin
+
+    @property
+    def edges(self):
+        return self._origin + numpy.arange(self._lowindex, self._lowindex + self._numbins + 1, dtype=numpy.float64)*self._binwidth
+
+    def relabel(self, label):
+        out = growbin(label, self._binwidth, origin=self._origin, nanflow=self._nanflow, closedlow=self._closedlow, maxbins=self._maxbins)
+        out._setrange(self._lowindex, self._numbins)
+        return out
+
+    def bin(self):
+        binaxis = bin(self._expr, self._numbins, self._low, self._high, underflow=False, overflow=False, nanflow=self._nanflow, closedlow=self._closedlow)
+        if hasattr(self, "_original"):
+            binaxis._original = self._original
+        if hasattr(self, "_parsed"):
+            binaxis._parsed = self._parsed
+        return binaxis
+
+    def split(self):
+        return self.bin().split()
+
+    def _goals(self, parsed=None):
+        if parsed is None:
+            parsed = histbook.expr.Expr.parse(self._expr)
+        return [histbook.instr.CallGraphGoal(histbook.expr.Call("histbook.growbin{0}".format("L" if self._closedlow else "H"), parsed, histbook.expr.Const(self._binwidth), histbook.expr.Const(self._origin)))]
+
+    def __eq__(self, other):
+        return self.__class__ is other.__class__ and self._expr == other._expr and self._binwidth == other._binwidth and self._origin == other._origin and self._nanflow == other._nanflow and self._closedlow == other._closedlow and self._maxbins == other._maxbins
+
+    def __hash__(self):
+        return hash((self.__class__, self._expr, self._binwidth, self._origin, self._nanflow, self._closedlow, self._maxbins))
+
+    def _rebinsplit(self, edges, content, index):
+        return self.bin()._rebinsplit(edges, content, index)
+
+    def _rebinfactor(self, factor, content, index):
+        return self.bin()._rebinfactor(factor, content, index)
+
+    def _select(self, cmp, value, tolerance):
+        return self.bin()._select(cmp, value, tolerance)
+
+class growintbin(GrowAxis, intbin):
+    __slots__ = ("_maxbins",)
+
+    def __init__(self, expr, min=None, max=None, maxbins=GrowAxis._defaultmaxbins):
+        self._expr = expr
+        self._maxbins = self._maxbinsarg(maxbins)
+        if (min is None) != (max is None):
+            raise ValueError("min and max must be given together")
+        if min is None:
+            self._min, self._max = 0, -1
+        else:
+            self._min = self._int(min, "min")
+            self._max = self._int(max, "max")
+        self._underflow = False
+        self._overflow = False
+        self._checktot()
+        self._checkmaxbins(self._max + 1 - self._min)
+
+    def _setrange(self, lowindex, numbins):
+        self._min = lowindex
+        self._max = lowindex + numbins - 1
+
+    def _checktot(self):
+        if self._min > self._max + 1:
+            raise ValueError("min must not be greater than max")
+
+    @property
+    def _firstindex(self):
+        return self._min
+
+    def __repr__(self):
+        args = [repr(self._expr)]
+        if self.numbins > 0:
+            args.append(repr(self._min))
+            args.append(repr(self._max))
+        if self._maxbins != self._defaultmaxbins:
+            args.append("maxbins={0}".format(repr(self._maxbins)))
+        return "growintbin({0})".format(", ".join(args))
+
+    @property
+    def maxbins(self):
+        return self._maxbins
+
+    def relabel(self, label):
+        if self.numbins == 0:
+            return growintbin(label, maxbins=self._maxbins)
+        else:
+            return growintbin(label, self._min, self._max, maxbins=self._maxbins)
+
+    def _goals(self, parsed=None):
+        if parsed is None:
+            parsed = histbook.expr.Expr.parse(self._expr)
+        return [histbook.instr.CallGraphGoal(histbook.expr.Call("histbook.growintbin", parsed))]
+
+    def __eq__(self, other):
+        return self.__class__ is other.__class__ and self._expr == other._expr and self._maxbins == other._maxbins
+
+    def __hash__(self):
+        return hash((self.__class__, self._expr, self._maxbins))
+
 class split(FixedAxis, RebinFactor, RebinSplit):
+    __slots__ = ("_edges", "_underflow", "_overflow", "_nanflow", "_closedlow")
+
     def __init__(self, expr, edges, underflow=True, overflow=True, nanflow=True, closedlow=True):
         self._expr = expr
         if isinstance(edges, (numbers.Real, numpy.floating)):
@@ -777,6 +1060,15 @@ class split(FixedAxis, RebinFactor, RebinSplit):
     def edges(self):
         return self._edges
 
+    @property
+    def centers(self):
+        edges = numpy.array(self._edges)
+        return 0.5*(edges[:-1] + edges[1:])
+
+    @property
+    def widths(self):
+        return numpy.diff(numpy.array(self._edges))
+
     @property
     def underflow(self):
         return self._underflow
@@ -888,33 +1180,29 @@ class split(FixedAxis, RebinFactor, RebinSplit):
 
     def _rebinfactor(self, factor, content, index):
         assert factor > 0
-        return self._rebinsplit(self.edges[0:-1:factor] + self.edges[-1], content, index)
+        return self._rebinsplit(self.edges[0:-1:factor] + (self.edges[-1],), content, index)
 
     def _select(self, cmp, value, tolerance):
         if value == float("-inf") and cmp == ">=":
-            out = self.__class__.__new__(self.__class__)
-            out.__dict__.update(self.__dict__)
+            out = self._copy()
             out._nanflow = False
             out._checktot()
             return out, slice(0, len(self._edges) - 1 + (1 if self._underflow else 0) + (1 if self._overflow else 0)), None, False
 
         elif value == float("inf") and cmp == "<=":
-            out = self.__class__.__new__(self.__class__)
-            out.__dict__.update(self.__dict__)
+            out = self._copy()
             out._nanflow = False
             out._checktot()
             return out, slice(0, len(self._edges) - 1 + (1 if self._underflow else 0) + (1 if self._overflow else 0)), None, False
 
         elif isinstance(value, (numbers.Real, numpy.floating, numpy.integer)) and numpy.isnan(value) and cmp == "!=":
-            out = self.__class__.__new__(self.__class__)
-            out.__dict__.update(self.__dict__)
+            out = self._copy()
             out._nanflow = False
             out._checktot()
             return out, slice(0, len(self._edges) - 1 + (1 if self._underflow else 0) + (1 if self._overflow else 0)), None, False
 
         elif isinstance(value, (numbers.Real, numpy.floating, numpy.integer)) and numpy.isnan(value) and cmp == "==":
-            out = self.__class__.__new__(self.__class__)
-            out.__dict__.update(self.__dict__)
+            out = self._copy()
             out._nanflow = False
             out._checktot()
             return out, slice(len(self._edges) - 1 + (1 if self._underflow else 0) + (1 if self._overflow else 0), len(self._edges) - 1 + (1 if self._underflow else 0) + (1 if self._overflow else 0) + 1), None, False
@@ -923,8 +1211,7 @@ class split(FixedAxis, RebinFactor, RebinSplit):
             dist, edgex, edgei = sorted((abs(value - x), x, i) for i, x in enumerate(self._edges))[0]
 
             if dist < tolerance:
-                out = self.__class__.__new__(self.__class__)
-                out.__dict__.update(self.__dict__)
+                out = self._copy()
 
                 cuti = edgei + (1 if self._underflow else 0)
 
@@ -970,6 +1257,8 @@ class split(FixedAxis, RebinFactor, RebinSplit):
                              ([IntervalNaN()] if self.nanflow else []))
 
 class cut(FixedAxis):
+    __slots__ = ()
+
     def __init__(self, expr):
         self._expr = expr
 
@@ -1019,6 +1308,8 @@ class cut(FixedAxis):
         return [False, True]
 
 class _nullaxis(FixedAxis):
+    __slots__ = ()
+
     def __repr__(self):
         return "_nullaxis()"
 
@@ -1053,6 +1344,8 @@ class _nullaxis(FixedAxis):
         return []
 
 class profile(ProfileAxis):
+    __slots__ = ()
+
     def __init__(self, expr):
         self._expr = expr
 
@@ -1077,3 +1370,84 @@ class profile(ProfileAxis):
 
     def __hash__(self):
         return hash((self.__class__, self._expr))
+
+class quantile(profile):
+    # a profile that also keeps a sketch of the distribution in each bin: weighted counts in logarithmic buckets of
+    # magnitude, so that quantiles have relative error at most relerr (for magnitudes between low and high) and merge by addition;
+    # every bin of the histogram carries numbuckets = 2*ceil(log(high/low)/log((1 + relerr)/(1 - relerr))) + 3 extra content
+    # columns, 281 with the defaults (2.2 kB per bin in float64), and about 10 times more for relerr=0.01 over 1e-6 to 1e6
+    __slots__ = ("_relerr", "_low", "_high")
+
+    def __init__(self, expr, relerr=0.05, low=1e-3, high=1e3):
+        self._expr = expr
+        self._relerr = self._real(relerr, "relerr")
+        if not 0 < self._relerr < 1:
+            raise ValueError("relerr must be between 0 and 1")
+        self._low = self._real(low, "low")
+        self._high = self._real(high, "high")
+        if not 0 < self._low < self._high:
+            raise ValueError("low must be positive and less than high")
+
+    def __repr__(self):
+        args = [repr(self._expr)]
+        if self._relerr != 0.05:
+            args.append("relerr={0}".format(repr(self._relerr)))
+        if self._low != 1e-3:
+            args.append("low={0}".format(repr(self._low)))
+        if self._high != 1e3:
+            args.append("high={0}".format(repr(self._high)))
+        return "quantile({0})".format(", ".join(args))
+
+    @property
+    def relerr(self):
+        return self._relerr
+
+    @property
+    def low(self):
+        return self._low
+
+    @property
+    def high(self):
+        return self._high
+
+    @property
+    def _gamma(self):
+        return (1.0 + self._relerr) / (1.0 - self._relerr)
+
+    @property
+    def _numpositive(self):
+        return int(math.ceil(math.log(self._high / self._low) / math.log(self._gamma))) + 1
+
+    @property
+    def numbuckets(self):
+        return 2*self._numpositive + 1
+
+    @property
+    def buckets(self):
+        # representative value of each bucket: negative magnitudes (decreasing), zero (for magnitudes below low), positive magnitudes
+        gamma = self._gamma
+        positive = 2.0 * self._low * numpy.power(gamma, numpy.arange(self._numpositive)) / (gamma + 1.0)
+        return numpy.concatenate((-positive[::-1], [0.0], positive))
+
+    def relabel(self, label):
+        return quantile(label, relerr=self._relerr, low=self._low, high=self._high)
+
+    def _goals(self, parsed=None):
+        if parsed is None:
+            parsed = histbook.expr.Expr.parse(self._expr)
+        return profile._goals(self, parsed) + [histbook.instr.CallGraphGoal(histbook.expr.Call("histbook.quantile", parsed, histbook.expr.Const(self._low), histbook.expr.Const(self._gamma), histbook.expr.Const(self._numpositive)))]
+
+    def _quantile(self, sketch, q):
+        cumulative = numpy.cumsum(sketch, axis=-1)
+        threshold = q * cumulative[..., -1:]
+        if q < 1:
+            index = numpy.argmax(cumulative > threshold, axis=-1)
+        else:
+            index = numpy.argmax(cumulative >= threshold, axis=-1)
+        return self.buckets[index]
+
+    def __eq__(self, other):
+        return self.__class__ is other.__class__ and self._expr == other._expr and self._relerr == other._relerr and self._low == other._low and self._high == other._high
+
+    def __hash__(self):
+        return hash((self.__class__, self._expr, self._relerr, self._low, self._high))
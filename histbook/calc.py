@@ -28,11 +28,26 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import math
+import re
+import sys
+
 import histbook.expr
 
 import numpy
 INDEXTYPE = numpy.int32
 
+def floattype(values):
+    # float32 (and wider) inputs are computed in their own precision; integers and half-precision are promoted
+    dtype = getattr(values, "dtype", None)
+    if dtype is not None and dtype.kind == "f":
+        if dtype.itemsize < 4:
+            return numpy.dtype(numpy.float32)
+        else:
+            return dtype
+    else:
+        return numpy.dtype(numpy.float64)
+
 library = {}
 
 library["numpy.add"] = numpy.add
@@ -113,7 +128,8 @@ def vectorized_erf(complement):
     a5 =  1.061405429
     p  =  0.3275911
     def erf(values):
-        sign = numpy.where(values < 0, -1.0, 1.0)
+        dtype = floattype(values)
+        sign = numpy.where(values < 0, dtype.type(-1.0), dtype.type(1.0))
         values = numpy.absolute(values)
         t = 1.0 / (values * p + 1)
         y = 1.0 - ((((a5*t + a4)*t + a3)*t + a2)*t + a1)*t * numpy.exp(numpy.negative(numpy.square(values)))
@@ -133,7 +149,7 @@ def vectorized_gamma(logarithm):
         x = values - 1.0
         tmp = x + 5.5
         tmp = (x + 0.5)*numpy.log(tmp) - tmp
-        ser = numpy.ones(len(values), dtype=numpy.dtype(numpy.float64))
+        ser = numpy.ones(len(values), dtype=floattype(values))
         for cof in cofs:
             numpy.add(x, 1.0, x)
             numpy.add(ser, cof/x, ser)
@@ -156,10 +172,11 @@ library["histbook.groupby"] = histbook_groupby
 
 def histbook_groupbin(nanflow, closedlow):
     def groupbin(values, binwidth, origin):
+        # always float64: group keys must not depend on the precision of the input
         if origin == 0:
-            indexes = numpy.multiply(values, 1.0/float(binwidth))
+            indexes = numpy.multiply(values, 1.0/float(binwidth), dtype=numpy.float64)
         else:
-            indexes = values - float(origin)
+            indexes = numpy.subtract(values, float(origin), dtype=numpy.float64)
             numpy.multiply(indexes, 1.0/float(binwidth), indexes)
 
         if closedlow:
@@ -213,7 +230,7 @@ def histbook_bin(underflow, overflow, nanflow, closedlow):
         shift = 0
 
     def bin(values, numbins, low, high):
-        indexes = values - float(low)
+        indexes = numpy.subtract(values, float(low), dtype=floattype(values))
         numpy.multiply(indexes, float(numbins) / float(high - low), indexes)
 
         if closedlow:
@@ -284,6 +301,30 @@ library["histbook.intbinU_"] = histbook_intbin(True, False)
 library["histbook.intbin_O"] = histbook_intbin(False, True)
 library["histbook.intbin__"] = histbook_intbin(False, False)
 
+def histbook_growbin(closedlow):
+    def growbin(values, binwidth, origin):
+        # global bin numbers counted from origin (NaN and infinities pass through); the Hist maps them onto its current range
+        indexes = numpy.subtract(values, float(origin), dtype=numpy.float64)
+        numpy.multiply(indexes, 1.0/float(binwidth), indexes)
+
+        if closedlow:
+            numpy.floor(indexes, indexes)
+        else:
+            numpy.ceil(indexes, indexes)
+            numpy.subtract(indexes, 1, indexes)
+
+        return indexes
+
+    return growbin
+
+library["histbook.growbinL"] = histbook_growbin(True)
+library["histbook.growbinH"] = histbook_growbin(False)
+
+def histbook_growintbin(values):
+    return numpy.trunc(numpy.asarray(values, dtype=numpy.float64))
+
+library["histbook.growintbin"] = histbook_growintbin
+
 def histbook_split(underflow, overflow, nanflow, closedlow):
     def split(values, edges):
         indexes = numpy.ma.array(numpy.digitize(values, edges), dtype=INDEXTYPE)
@@ -325,6 +366,47 @@ library["histbook.split___H"] = histbook_split(False, False, False, False)
 
 library["histbook.cut"] = lambda values: numpy.ma.array(values, dtype=INDEXTYPE)
 
+def histbook_quantile(values, low, gamma, numpositive):
+    # bucket of each value in a quantile sketch: numpositive negative buckets, one for magnitudes below low, numpositive positive buckets
+    values = numpy.asarray(values)
+    magnitude = numpy.absolute(values)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        bucket = numpy.ceil(numpy.log(magnitude / low) / math.log(gamma))
+    numpy.clip(bucket, 0, numpositive - 1, bucket)
+    nan = numpy.isnan(bucket)
+    bucket[nan] = 0
+    bucket = bucket.astype(INDEXTYPE)
+    out = numpy.where(values > 0, numpositive + 1 + bucket, numpositive - 1 - bucket).astype(INDEXTYPE)
+    out[magnitude < low] = numpositive
+    out[nan] = -1                  # NaN values aren't put in any bucket
+    return out
+
+library["histbook.quantile"] = histbook_quantile
+
+_registered = set()
+
+def register(name, fcn, numargs=None):
+    if not ((sys.version_info[0] < 3 and isinstance(name, basestring)) or (sys.version_info[0] >= 3 and isinstance(name, str))) or not re.match(r"^[A-Za-z_][A-Za-z_0-9]*$", name):
+        raise ValueError("registered function names must be identifiers, not {0}".format(repr(name)))
+    name = str(name)
+    if name in library and name not in _registered:
+        raise ValueError("{0} is a built-in function and can't be replaced".format(repr(name)))
+    if not callable(fcn):
+        raise TypeError("registered functions must be callable, not {0}".format(repr(fcn)))
+    if numargs is None:
+        numargs = getattr(fcn, "nin", None)     # NumPy and Numba ufuncs declare their number of arguments
+
+    library[name] = fcn
+    _registered.add(name)
+    try:
+        histbook.expr.Expr.recognized[fcn] = name
+    except TypeError:
+        pass                                    # unhashable callables are only recognized by name
+    if numargs is None:
+        histbook.expr.Expr.numargs.pop(name, None)
+    else:
+        histbook.expr.Expr.numargs[name] = numargs
+
 def calculate(expr, symbols):
     if isinstance(expr, (histbook.expr.Name, histbook.expr.Predicate)):
         return symbols[expr.value]
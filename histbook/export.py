@@ -28,9 +28,63 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import collections
+import json
+
 import numpy
 
 import histbook.axis
+import histbook.expr
+
+def _groupblocks(groupaxis, content):
+    out = []
+    def recurse(j, content, key):
+        if j == len(groupaxis):
+            out.append((key, content))
+        else:
+            if isinstance(groupaxis[j], histbook.axis.groupbin):
+                keys = sorted(content, key=lambda n: (n == "NaN", 0.0 if n == "NaN" else n))
+            else:
+                keys = sorted(content)
+            for n in keys:
+                recurse(j + 1, content[n], key + (n,))
+    recurse(0, content, ())
+    return out
+
+_axisargs = {"groupby": (),
+             "groupbin": ("binwidth", "origin", "nanflow", "closedlow"),
+             "bin": ("numbins", "low", "high", "underflow", "overflow", "nanflow", "closedlow"),
+             "intbin": ("min", "max", "underflow", "overflow"),
+             "growbin": ("binwidth", "origin", "low", "high", "nanflow", "closedlow", "maxbins"),
+             "growintbin": ("min", "max", "maxbins"),
+             "split": ("edges", "underflow", "overflow", "nanflow", "closedlow"),
+             "cut": (),
+             "profile": (),
+             "quantile": ("relerr", "low", "high")}
+
+def _exprspec(expr, what):
+    if isinstance(expr, histbook.expr.Expr):
+        return str(expr)
+    elif isinstance(expr, str) or (isinstance(expr, (int, float)) and not isinstance(expr, bool)):
+        return expr
+    else:
+        raise TypeError("cannot serialize {0} {1}: only strings, numbers, and parsed expressions can be written".format(what, repr(expr)))
+
+def _axisspec(axis):
+    if isinstance(axis, histbook.axis._nullaxis):
+        return {"axis": "_nullaxis"}
+    out = {"axis": axis.__class__.__name__, "expr": _exprspec(getattr(axis, "_original", axis._expr), "axis expression")}
+    for n in _axisargs[out["axis"]]:
+        x = getattr(axis, n)
+        out[n] = list(x) if isinstance(x, tuple) else x
+    return out
+
+def _axisfromspec(spec):
+    if spec["axis"] == "_nullaxis":
+        return histbook.axis._nullaxis()
+    cls = getattr(histbook.axis, spec["axis"])
+    # arguments missing from older files take their defaults
+    return cls(spec["expr"], **dict((n, tuple(spec[n]) if isinstance(spec[n], list) else spec[n]) for n in _axisargs[spec["axis"]] if n in spec))
 
 class Exportable(object):
     def pandas(self, *axis, **opts):
@@ -50,86 +104,407 @@ class Exportable(object):
         else:
             raise TypeError("selected axis must be all profiles (for table) or all cuts (for fraction)")
 
-        names = [None for x in allaxis]
-        arrays = []
-        keys = [[] for x in allaxis]
+        groupaxis = [x for x in allaxis if isinstance(x, histbook.axis.GroupAxis)]
+        fixedaxis = [x for x in allaxis if not isinstance(x, histbook.axis.GroupAxis)]
+        names = [str(x.expr) for x in groupaxis + fixedaxis]
+
+        # group keys are collected per block (one block per combination of groups), fixed-axis labels once per axis
+        blockkeys = []
+        blocks = []
+        for key, leaf in _groupblocks(groupaxis, content):
+            label = []
+            for axis, n in zip(groupaxis, key):
+                if not isinstance(axis, histbook.axis.groupbin):
+                    label.append(n)
+                elif n == "NaN":
+                    label.append("{NaN}")
+                else:
+                    label.append(pd.Interval(n, n + float(axis.binwidth), closed=("left" if axis.closedlow else "right")))
+            blockkeys.append(tuple(label))
+            blocks.append(numpy.asarray(leaf).reshape(-1))
+
+        levels = []
+        codes = []
+        for j in range(len(groupaxis)):
+            uniques = {}
+            level = []
+            for key in blockkeys:
+                if key[j] not in uniques:
+                    uniques[key[j]] = len(level)
+                    level.append(key[j])
+            levels.append(level)
+            codes.append(numpy.repeat(numpy.array([uniques[key[j]] for key in blockkeys], dtype=numpy.int64), int(numpy.prod([x.totbins for x in fixedaxis]))))
+
+        for j, axis in enumerate(fixedaxis):
+            levels.append(self._pandaslabels(pd, axis))
+            inner = int(numpy.prod([x.totbins for x in fixedaxis[j + 1:]]))
+            outer = len(blocks) * int(numpy.prod([x.totbins for x in fixedaxis[:j]]))
+            codes.append(numpy.tile(numpy.repeat(numpy.arange(axis.totbins, dtype=numpy.int64), inner), outer))
+
+        if len(levels) == 0:
+            index = None
+        else:
+            try:
+                index = pd.MultiIndex(levels=levels, codes=codes, names=names)
+            except TypeError:
+                index = pd.MultiIndex(levels=levels, labels=codes, names=names)    # pandas < 0.24
 
-        def index(j, content, key):
-            if j == len(allaxis):
-                if len(self._fixed) == 0:
-                    arrays.append(numpy.array([content]))
+        if len(blocks) == 0:
+            return pd.DataFrame(index=index)
 
-                for j, k in enumerate(key):
-                    keys[j].append(k)
+        arrays = numpy.concatenate(blocks)
+        return pd.DataFrame(index=index,
+                            columns=arrays.dtype.names,
+                            data=arrays.view(arrays.dtype[arrays.dtype.names[0]]).reshape(len(arrays), -1))
+
+    @staticmethod
+    def _pandaslabels(pd, axis):
+        if isinstance(axis, (histbook.axis.bin, histbook.axis.split)):
+            closed = "left" if axis.closedlow else "right"
+            breaks = numpy.asarray(axis.edges, dtype=numpy.float64)
+            if axis.underflow:
+                breaks = numpy.concatenate([[-numpy.inf], breaks])
+            if axis.overflow:
+                breaks = numpy.concatenate([breaks, [numpy.inf]])
+            out = pd.IntervalIndex.from_breaks(breaks, closed=closed)
+            if axis.nanflow:
+                out = out.astype(object).append(pd.Index(["{NaN}"], dtype=object))
+            return out
+
+        elif isinstance(axis, histbook.axis.intbin):
+            out = [str(i) for i in range(int(axis.min), int(axis.max) + 1)]
+            if axis.underflow:
+                out.insert(0, pd.Interval(float("-inf"), int(axis.min), closed="left"))
+            if axis.overflow:
+                out.append(pd.Interval(int(axis.max), float("inf"), closed="right"))
+            return pd.Index(out, dtype=object)
+
+        elif isinstance(axis, histbook.axis.cut):
+            return pd.Index([False, True], dtype=object)
+
+        elif isinstance(axis, histbook.axis._nullaxis):
+            return pd.Index([""], dtype=object)
 
+        else:
+            raise AssertionError(axis)
+
+    def arrow(self):
+        import pyarrow
+
+        if self._content is None:
+            # an unfilled histogram is exported from a zero-filled copy, so exporting does not allocate its content
+            return self._zerocopy().arrow()
+
+        blocksize = int(numpy.prod([x.totbins for x in self._fixed]))
+        keys = [key for key, leaf in _groupblocks(self._group, self._content)]
+
+        names = []
+        columns = []
+        keycolumns = []
+        for j, axis in enumerate(self._group):
+            level = []
+            uniques = {}
+            for key in keys:
+                if key[j] not in uniques:
+                    uniques[key[j]] = len(level)
+                    level.append(key[j])
+            if isinstance(axis, histbook.axis.groupbin):
+                dictionary = pyarrow.array([float("nan") if n == "NaN" else float(n) for n in level], type=pyarrow.float64())
+            else:
+                dictionary = pyarrow.array(level)
+            indices = numpy.repeat(numpy.array([uniques[key[j]] for key in keys], dtype=numpy.int32), blocksize)
+            keycolumns.append(len(names))
+            names.append(str(axis.expr))
+            columns.append(pyarrow.DictionaryArray.from_arrays(pyarrow.array(indices, type=pyarrow.int32()), dictionary))
+
+        for j, axis in enumerate(self._fixed):
+            inner = int(numpy.prod([x.totbins for x in self._fixed[j + 1:]]))
+            outer = len(keys) * int(numpy.prod([x.totbins for x in self._fixed[:j]]))
+            expand = lambda x: numpy.tile(numpy.repeat(x, inner), outer)
+
+            if isinstance(axis, (histbook.axis.bin, histbook.axis.intbin, histbook.axis.split)):
+                edges = numpy.asarray(axis.edges, dtype=numpy.float64)
+                low, high = edges[:-1], edges[1:]
+                if axis.underflow:
+                    low, high = numpy.concatenate([[-numpy.inf], low]), numpy.concatenate([[edges[0]], high])
+                if axis.overflow:
+                    low, high = numpy.concatenate([low, [edges[-1]]]), numpy.concatenate([high, [numpy.inf]])
+                if getattr(axis, "nanflow", False):
+                    low, high = numpy.concatenate([low, [numpy.nan]]), numpy.concatenate([high, [numpy.nan]])
+                names.extend(["low({0})".format(axis.expr), "high({0})".format(axis.expr)])
+                columns.extend([pyarrow.array(expand(low)), pyarrow.array(expand(high))])
+
+            elif isinstance(axis, histbook.axis.cut):
+                keycolumns.append(len(names))
+                names.append(str(axis.expr))
+                columns.append(pyarrow.array(expand(numpy.array([False, True]))))
+
+        def flatten(content, width):
+            leaves = [numpy.asarray(leaf).reshape(-1, width) for key, leaf in _groupblocks(self._group, content)]
+            if len(leaves) == 0:
+                return numpy.empty((0, width))
             else:
-                axis = allaxis[j]
-                names[j] = str(axis.expr)
+                return numpy.concatenate(leaves)
+
+        table = self.table(*self._profile, quantiles=(), recarray=False)
+        tablenames = ["count()", "err(count())"]
+        for prof in self._profile:
+            tablenames.extend([str(prof.expr), "err({0})".format(prof.expr)])
+        data = flatten(table, len(tablenames))
+        names.extend(tablenames)
+        columns.extend(pyarrow.array(data[:, i]) for i in range(len(tablenames)))
+
+        contentnames = [None] * self._shape[-1]
+        for prof in self._profile:
+            contentnames[prof._sumwxindex] = "sumwx({0})".format(prof.expr)
+            contentnames[prof._sumwx2index] = "sumwx2({0})".format(prof.expr)
+            if isinstance(prof, histbook.axis.quantile):
+                for i in range(prof.numbuckets):
+                    contentnames[prof._sketchindex + i] = "sketch({0}, {1})".format(prof.expr, i)
+        contentnames[self._sumwindex] = "sumw()"
+        if self._weightparsed is not None:
+            contentnames[self._sumw2index] = "sumw2()"
+        for name, parsed, label, offset in self._variations:
+            for i in range(self._sumwindex):
+                contentnames[offset + i] = "{0}[{1}]".format(contentnames[i], name)
+            contentnames[offset + self._sumwindex] = "sumw()[{0}]".format(name)
+            contentnames[offset + self._sumwindex + 1] = "sumw2()[{0}]".format(name)
+        data = flatten(self._content, len(contentnames)).astype(self._contenttype, copy=False)
+        names.extend(contentnames)
+        columns.extend(pyarrow.array(data[:, i]) for i in range(len(contentnames)))
+
+        # Parquet readers select fields by name, so a key column that has the same name as a profile column is renamed
+        for i in keycolumns:
+            if names.count(names[i]) > 1:
+                names[i] = "key({0})".format(names[i])
+
+        spec = {"axis": [_axisspec(x) for x in self._group + self._fixed + self._profile],
+                "weight": None if self._weight is None else _exprspec(self._weight, "weight"),
+                "weights": None if self._weights is None else dict((n, _exprspec(x, "weight")) for n, x in self._weights.items()),
+                "filter": None if self._filter is None else _exprspec(self._filter, "filter"),
+                "defs": dict((n, _exprspec(x, "definition")) for n, x in self._defs.items()),
+                "dtype": None if self._dtype is None else self._contenttype.name,
+                "compensated": self._compensated,
+                "checknan": self._checknan,
+                "content": contentnames}
+
+        return pyarrow.Table.from_arrays(columns, names=names).replace_schema_metadata({"histbook": json.dumps(spec)})
+
+    @classmethod
+    def fromarrow(cls, table):
+        metadata = table.schema.metadata
+        if metadata is None or b"histbook" not in metadata:
+            raise ValueError("Arrow table has no histbook metadata")
+        spec = json.loads(metadata[b"histbook"].decode("utf-8"))
+
+        out = cls(*[_axisfromspec(x) for x in spec["axis"]], weight=spec["weight"], weights=spec.get("weights"), filter=spec.get("filter"), defs=spec["defs"], dtype=spec["dtype"], compensated=spec.get("compensated", False), checknan=spec["checknan"])
+
+        # content columns are the last ones; group-key columns are the first
+        ncolumns = len(spec["content"])
+        data = numpy.empty((table.num_rows, ncolumns), dtype=out._contenttype)
+        for i in range(ncolumns):
+            data[:, i] = table.column(table.num_columns - ncolumns + i).to_numpy()
+
+        if len(out._group) == 0:
+            out._content = data.reshape(out._shape)
+
+        else:
+            blocksize = int(numpy.prod([x.totbins for x in out._fixed]))
+            keys = [table.column(j).to_pylist()[::blocksize] for j in range(len(out._group))]
+            out._content = {}
+            for b in range(table.num_rows // blocksize):
+                node = out._content
+                for j, axis in enumerate(out._group):
+                    n = keys[j][b]
+                    if isinstance(axis, histbook.axis.groupbin) and n != n:
+                        n = "NaN"
+                    if j + 1 == len(out._group):
+                        node[n] = data[b * blocksize : (b + 1) * blocksize].reshape(out._shape)
+                    else:
+                        node = node.setdefault(n, {})
+
+        return out
 
-                if isinstance(axis, histbook.axis.groupby):
-                    for n in sorted(content):
-                        index(j + 1, content[n], key + (n,))
+    def toparquet(self, path, **opts):
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(self.arrow(), path, **opts)
 
-                elif isinstance(axis, histbook.axis.groupbin):
-                    closed = "left" if axis.closedlow else "right"
-                    for n in sorted(content):
-                        index(j + 1, content[n], key + (pd.Interval(n, n + float(axis.binwidth), closed=closed),))
+    @classmethod
+    def fromparquet(cls, path):
+        import pyarrow.parquet
+        return cls.fromarrow(pyarrow.parquet.read_table(path))
 
+    def _rootaxes(self, axis):
+        if len(axis) == 0:
+            axis = self._group + self._fixed + (self._profile if len(self._profile) == 1 else ())
+        axis = [x if isinstance(x, histbook.axis.Axis) else self.axis[x] for x in axis]
+        for x in axis:
+            if x not in self._group + self._fixed + self._profile:
+                raise IndexError("no such axis: {0}".format(x))
+
+        binaxis = []
+        profile = None
+        for x in axis:
+            if isinstance(x, histbook.axis.ProfileAxis):
+                if profile is None:
+                    profile = x
                 else:
-                    if content is not None:
-                        arrays.append(content)
-
-                    if isinstance(axis, histbook.axis.bin):
-                        closed = "left" if axis.closedlow else "right"
-                        if axis.underflow:
-                            index(j + 1, None, key + (pd.Interval(float("-inf"), axis.low, closed=closed),))
-                        last = axis.low
-                        for i in range(axis.numbins):
-                            this = (float(i + 1) / float(axis.numbins)) * float(axis.high - axis.low) + float(axis.low)
-                            index(j + 1, None, key + (pd.Interval(last, this, closed=closed),))
-                            last = this
-                        if axis.overflow:
-                            index(j + 1, None, key + (pd.Interval(axis.high, float("inf"), closed=closed),))
-                        if axis.nanflow:
-                            index(j + 1, None, key + ("{NaN}",))
-
-                    elif isinstance(axis, histbook.axis.intbin):
-                        if axis.underflow:
-                            index(j + 1, None, key + (pd.Interval(float("-inf"), int(axis.min), closed="left"),))
-                        for i in range(int(axis.min), int(axis.max) + 1):
-                            index(j + 1, None, key + (str(i),))
-                        if axis.overflow:
-                            index(j + 1, None, key + (pd.Interval(int(axis.max), float("inf"), closed="right"),))
-
-                    elif isinstance(axis, histbook.axis.split):
-                        closed = "left" if axis.closedlow else "right"
-                        if axis.underflow:
-                            index(j + 1, None, key + (pd.Interval(float("-inf"), axis.edges[0], closed=closed),))
-                        last = axis.edges[0]
-                        for this in axis.edges[1:]:
-                            index(j + 1, None, key + (pd.Interval(last, this, closed=closed),))
-                            last = this
-                        if axis.overflow:
-                            index(j + 1, None, key + (pd.Interval(last, float("inf"), closed=closed),))
-                        if axis.nanflow:
-                            index(j + 1, None, key + ("{NaN}",))
-
-                    elif isinstance(axis, histbook.axis.cut):
-                        index(j + 1, None, key + (False,))
-                        index(j + 1, None, key + (True,))
-
-                    elif isinstance(axis, histbook.axis._nullaxis):
-                        index(j + 1, None, key + ("",))
+                    raise ValueError("only one profile axis allowed: {0}, {1}".format(profile, x))
+            else:
+                binaxis.append(x)
 
-                    else:
-                        raise AssertionError(axis)
+        return self.project(*binaxis), profile
+
+    def _rootblocks(self):
+        # groupby keys become directories; groupbin keys are laid out as regular bins over the range that was filled
+        ranges = {}
+        def findranges(j, content):
+            if j < len(self._group):
+                if isinstance(self._group[j], histbook.axis.groupbin):
+                    for n in content:
+                        if n != "NaN":
+                            low, high = ranges.get(j, (n, n))
+                            ranges[j] = (min(low, n), max(high, n))
+                for x in content.values():
+                    findranges(j + 1, x)
+
+        if self._content is None:
+            return self._zerocopy()._rootblocks()
+
+        findranges(0, self._content)
+
+        rootaxes = []
+        for j, axis in enumerate(self._group):
+            if isinstance(axis, histbook.axis.groupbin):
+                low, high = ranges.get(j, (float(axis.origin), float(axis.origin)))
+                numbins = int(round((high - low) / float(axis.binwidth))) + 1
+                rootaxes.append((axis, numbins, low, low + numbins * float(axis.binwidth), None, [-1] + list(range(numbins)) + [-1]))
+
+        for axis in self._fixed:
+            if isinstance(axis, histbook.axis.bin):
+                numbins, low, high, edges = axis.numbins, axis.low, axis.high, None
+            elif isinstance(axis, histbook.axis.split):
+                numbins, low, high, edges = len(axis.edges) - 1, axis.edges[0], axis.edges[-1], numpy.array(axis.edges, dtype=numpy.float64)
+            elif isinstance(axis, histbook.axis.intbin):
+                numbins, low, high, edges = axis.max - axis.min + 1, axis.min - 0.5, axis.max + 0.5, None
+            elif isinstance(axis, histbook.axis.cut):
+                rootaxes.append((axis, 2, 0.0, 2.0, None, [-1, 0, 1, -1]))
+                continue
+            else:
+                continue
+            start = 1 if axis.underflow else 0
+            sources = [0 if axis.underflow else -1] + list(range(start, start + numbins)) + [start + numbins if axis.overflow else -1]
+            rootaxes.append((axis, numbins, float(low), float(high), edges, sources))
 
-        index(0, content, ())
+        if len(rootaxes) == 0:
+            raise TypeError("cannot present zero-axis data in ROOT")
+        if len(rootaxes) > 3:
+            raise TypeError("cannot present more than 3-dimensional data in ROOT")
+
+        nullaxes = tuple(len(rootaxes) - len(self._fixed) + i for i, x in enumerate(self._fixed) if isinstance(x, histbook.axis._nullaxis))
+        blocks = collections.OrderedDict()
+        def fill(j, content, path, index):
+            if j == len(self._group):
+                if path not in blocks:
+                    blocks[path] = numpy.zeros(tuple(x[1] for x in rootaxes[:len(index)]) + content.shape, dtype=content.dtype)
+                blocks[path][index] += content
+            elif isinstance(self._group[j], histbook.axis.groupbin):
+                for n in sorted(x for x in content if x != "NaN"):
+                    fill(j + 1, content[n], path, index + (int(round((n - rootaxes[len(index)][2]) / float(self._group[j].binwidth))),))
+            else:
+                for n in sorted(content):
+                    fill(j + 1, content[n], path + (str(n),), index)
 
-        arrays = numpy.concatenate(arrays)
-        return pd.DataFrame(index=pd.MultiIndex.from_arrays(keys, names=names),
-                            columns=arrays.dtype.names,
-                            data=arrays.view(arrays.dtype[arrays.dtype.names[0]]).reshape(len(keys[0]), -1))
+        fill(0, self._content, (), ())
+
+        for path, dense in blocks.items():
+            dense = numpy.squeeze(dense, axis=nullaxes)
+            # one zero slot at the end of each dimension stands in for flow bins that the histbook axis does not have
+            dense = numpy.pad(dense, [(0, 1)] * len(rootaxes) + [(0, 0)], "constant")
+            for d, x in enumerate(rootaxes):
+                dense = numpy.take(dense, x[5], axis=d)
+            blocks[path] = dense
+
+        return rootaxes, blocks
+
+    def _uprootmodel(self, name, title, rootaxes, dense, profile):
+        import uproot.writing.identify
+
+        ndim = len(rootaxes)
+        sumw = dense[..., self._sumwindex].astype(numpy.float64)
+        if self._weightparsed is None:
+            sumw2 = sumw
+        else:
+            sumw2 = dense[..., self._sumw2index].astype(numpy.float64)
+
+        taxes = []
+        centers = []
+        for d, (axis, numbins, low, high, edges, sources) in enumerate(rootaxes):
+            taxes.append(uproot.writing.identify.to_TAxis("xyz"[d] + "axis", str(axis.expr), numbins, low, high, fXbins=edges))
+            if edges is None:
+                edges = numpy.linspace(low, high, numbins + 1)
+            center = numpy.zeros(numbins + 2, dtype=numpy.float64)
+            center[1:-1] = (edges[1:] + edges[:-1]) / 2.0
+            centers.append(center.reshape([-1 if i == d else 1 for i in range(ndim)]))
+
+        inrange = numpy.zeros(sumw.shape, dtype=numpy.bool_)
+        inrange[(slice(1, -1),) * ndim] = True
+        def total(x, *factors):
+            for factor in factors:
+                x = x * factor
+            return float(x[inrange].sum())
+
+        stats = [total(sumw), total(sumw2)]
+        for d in range(ndim):
+            stats.extend([total(sumw, centers[d]), total(sumw, centers[d], centers[d])])
+            stats.extend([total(sumw, centers[e], centers[d]) for e in range(d)])
+
+        entries = float(sumw.sum())
+        flat = lambda x: numpy.ascontiguousarray(x.ravel(order="F"))
+
+        if profile is None:
+            maker = [uproot.writing.identify.to_TH1x, uproot.writing.identify.to_TH2x, uproot.writing.identify.to_TH3x][ndim - 1]
+            return maker(name, title, flat(sumw), entries, *(stats + [flat(sumw2)] + taxes))
+
+        else:
+            sumwx = dense[..., profile._sumwxindex].astype(numpy.float64)
+            sumwx2 = dense[..., profile._sumwx2index].astype(numpy.float64)
+            stats.extend([total(sumwx), total(sumwx2)])
+            binsumw2 = numpy.array([], dtype=numpy.float64) if self._weightparsed is None else flat(sumw2)
+            maker = [uproot.writing.identify.to_TProfile, uproot.writing.identify.to_TProfile2D, uproot.writing.identify.to_TProfile3D][ndim - 1]
+            return maker(name, title, flat(sumwx), entries, *(stats + [flat(sumwx2), flat(sumw), binsumw2] + taxes))
+
+    def uproot(self, *axis, **opts):
+        name = opts.pop("name", "")
+        title = opts.pop("title", "")
+        if len(opts) > 0:
+            raise TypeError("unrecognized options for Hist.uproot: {0}".format(" ".join(opts)))
+
+        projected, profile = self._rootaxes(axis)
+        if any(isinstance(x, histbook.axis.groupby) for x in projected._group):
+            raise TypeError("groupby axes can't be presented as a single ROOT histogram; use toroot to write them as directories")
+
+        rootaxes, blocks = projected._rootblocks()
+        if len(blocks) == 0:
+            blocks[()] = numpy.zeros(tuple(x[1] + 2 for x in rootaxes) + (projected._shape[-1],), dtype=projected._contenttype)
+        return projected._uprootmodel(name, title, rootaxes, blocks[()], profile)
+
+    def toroot(self, file, name, *axis, **opts):
+        import uproot
+
+        title = opts.pop("title", "")
+        if len(opts) > 0:
+            raise TypeError("unrecognized options for Hist.toroot: {0}".format(" ".join(opts)))
+
+        if not hasattr(file, "mkdir"):
+            with uproot.recreate(file) as directory:
+                return self.toroot(directory, name, *axis, title=title)
+
+        projected, profile = self._rootaxes(axis)
+        rootaxes, blocks = projected._rootblocks()
+        for path, dense in blocks.items():
+            leafname = (name,) + path
+            file["/".join(leafname)] = projected._uprootmodel(leafname[-1], title, rootaxes, dense, profile)
 
     def root(self, *axis, **opts):
         import ROOT
@@ -162,7 +537,7 @@ class Exportable(object):
         if profile is None:
             content = projected.table(count=True, error=(self._weightparsed is not None))
         else:
-            content = projected.table(profile, count=True, error=True)
+            content = projected.table(profile, count=True, error=True, quantiles=())
 
         if len(binaxis) == 0:
             raise TypeError("cannot present zero-axis data in ROOT")
@@ -29,26 +29,86 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import ast
+import collections
 import functools
 import itertools
 import math
 import sys
 import types
+import weakref
 try:
     import cPickle as pickle
 except ImportError:
     import pickle
 
-import meta
 import numpy
 
+def _meta():
+    # the decompiler is slow to import and only needed for lambda expressions and error messages
+    import meta
+    return meta
+
 class ExpressionError(Exception): pass
 
+def _typedkey(key):
+    if isinstance(key, Expr):
+        return (Expr, id(key))
+    elif isinstance(key, tuple):
+        return tuple(_typedkey(x) for x in key)
+    else:
+        return (type(key), key)
+
 class Expr(object):
+    # expressions are immutable and hash-consed: identical nodes are one shared instance, so
+    # equality is mostly identity and the hash is computed once. Nodes are interned by type as
+    # well as value (1 and 1.0 compute differently) but still compare equal, as numbers do.
+    # Nodes with unhashable constants are left uninterned and compared by structure.
+    __slots__ = ("_hash", "__weakref__")
+    _interned = weakref.WeakValueDictionary()
+
+    @classmethod
+    def _make(cls, key, **attrs):
+        try:
+            hashed = hash((cls,) + key)
+        except TypeError:
+            hashed = None
+        else:
+            key = (cls, _typedkey(key), key)    # the last item keeps interned children (and their ids) alive
+            out = Expr._interned.get(key, None)
+            if out is not None:
+                return out
+
+        out = object.__new__(cls)
+        for n, x in attrs.items():
+            object.__setattr__(out, n, x)
+        object.__setattr__(out, "_hash", hashed)
+        if hashed is not None:
+            Expr._interned[key] = out
+        return out
+
+    def __setattr__(self, n, x):
+        raise AttributeError("expressions are immutable")
+
+    def __reduce__(self):
+        return (self.__class__, self._args())
+
     def __repr__(self):
         return "{0}({1})".format(self.__class__.__name__, ", ".join(self._reprargs()))
 
-    # assumes __eq__ and __lt__ have been defined
+    def __hash__(self):
+        if self._hash is None:
+            raise TypeError("unhashable expression: {0}".format(repr(self)))
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        elif self._hash is not None and isinstance(other, Expr) and other._hash is not None and self._hash != other._hash:
+            return False
+        else:
+            return self._equal(other)
+
+    # assumes _equal and __lt__ have been defined
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -70,8 +130,58 @@ class Expr(object):
         else:
             return 1
 
+    _parsecache = collections.OrderedDict()
+    parsecachesize = 1024
+
+    @staticmethod
+    def _parsecachekey(expression, defs, returnlabel):
+        if not ((sys.version_info[0] < 3 and isinstance(expression, basestring)) or (sys.version_info[0] >= 3 and isinstance(expression, str))):
+            return None   # functions are not cached: equal-looking lambdas may close over different values
+
+        if defs is None:
+            defs = {}
+        frozendefs = []
+        for n, x in defs.items():
+            if isinstance(x, Expr):
+                frozendefs.append((n, x))
+            elif (sys.version_info[0] < 3 and isinstance(x, basestring)) or (sys.version_info[0] >= 3 and isinstance(x, str)):
+                frozendefs.append((n, (str, x)))
+            else:
+                try:
+                    frozendefs.append((n, (pickle, pickle.dumps(x))))
+                except:
+                    return None
+        frozendefs.sort(key=lambda x: x[0])
+
+        key = (expression, tuple(frozendefs), returnlabel)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        else:
+            return key
+
     @staticmethod
     def parse(expression, defs=None, returnlabel=False):
+        key = Expr._parsecachekey(expression, defs, returnlabel)
+        if key is None:
+            return Expr._parse(expression, defs, returnlabel)
+
+        try:
+            out = Expr._parsecache.pop(key)          # re-inserted below as the most recently used
+        except KeyError:
+            out = Expr._parse(expression, defs, returnlabel)
+
+        Expr._parsecache[key] = out
+        while len(Expr._parsecache) > Expr.parsecachesize:
+            try:
+                Expr._parsecache.popitem(last=False)
+            except KeyError:
+                break
+        return out
+
+    @staticmethod
+    def _parse(expression, defs=None, returnlabel=False):
         _defs = {"pi": Const(math.pi), "e": Const(math.e), "inf": Const(float("inf")), "nan": Const(float("nan"))}
         if defs is not None:
             for n, x in defs.items():
@@ -91,13 +201,13 @@ class Expr(object):
         label = None
         params = None
         if isinstance(expression, types.FunctionType):   # more specific than callable(...)
-            fcn = meta.decompiler.decompile_func(expression)
+            fcn = _meta().decompiler.decompile_func(expression)
             if isinstance(fcn, ast.FunctionDef) and len(fcn.body) == 1 and isinstance(fcn.body[0], ast.Return):
                 pyast = fcn.body[0].value
                 label = expression.__name__
             elif isinstance(fcn, ast.Lambda):
                 pyast = fcn.body.value
-                label = meta.dump_python_source(pyast).strip()
+                label = _meta().dump_python_source(pyast).strip()
             params = expression.__code__.co_varnames[:expression.__code__.co_argcount]
 
         elif (sys.version_info[0] < 3 and isinstance(expression, basestring)) or (sys.version_info[0] >= 3 and isinstance(expression, str)):
@@ -127,7 +237,7 @@ class Expr(object):
             elif isinstance(node, ast.Name):
                 return env.get(node.id, None)
             else:
-                raise ExpressionError("functions must be named, not constructed: {0}".format(meta.dump_python_source(node).strip()))
+                raise ExpressionError("functions must be named, not constructed: {0}".format(_meta().dump_python_source(node).strip()))
 
         def recurse(node, relations=False):
             if isinstance(node, ast.Num):
@@ -144,7 +254,7 @@ class Expr(object):
                 if all(isinstance(x, Const) for x in content):
                     return Const(set(x.value for x in content))
                 else:
-                    raise ExpressionError("sets in expressions may not contain variable contents: {0}".format(meta.dump_python_source(node).strip()))
+                    raise ExpressionError("sets in expressions may not contain variable contents: {0}".format(_meta().dump_python_source(node).strip()))
 
             elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
                 if node.id == "None":
@@ -186,7 +296,7 @@ class Expr(object):
                 elif isinstance(node.ops[0], ast.In):    cmp, swap = "in",     False
                 elif isinstance(node.ops[0], ast.NotIn): cmp, swap = "not in", False
                 else:
-                    raise ExpressionError("only comparision relations supported: '==', '!=', '<', '<=', '>', '>=', 'in', and 'not in': {0}".format(meta.dump_python_source(node).strip()))
+                    raise ExpressionError("only comparision relations supported: '==', '!=', '<', '<=', '>', '>=', 'in', and 'not in': {0}".format(_meta().dump_python_source(node).strip()))
                 
                 left = recurse(node.left)
                 right = recurse(node.comparators[0])
@@ -196,7 +306,7 @@ class Expr(object):
                     left, right = sorted([left, right])
 
                 if (cmp == "in" or cmp == "not in") and not (isinstance(right, Const) and isinstance(right.value, set)):
-                    raise ExpressionError("comparisons 'in' and 'not in' can only be used with a set: {0}".format(meta.dump_python_source(node).strip()))
+                    raise ExpressionError("comparisons 'in' and 'not in' can only be used with a set: {0}".format(_meta().dump_python_source(node).strip()))
 
                 return Relation(cmp, left, right)
 
@@ -204,7 +314,7 @@ class Expr(object):
                 return recurse(ast.BoolOp(ast.And(), [ast.Compare(node.left if i == 0 else node.comparators[i - 1], [node.ops[i]], [node.comparators[i]]) for i in range(len(node.ops))]), relations=True)
 
             elif isinstance(node, ast.Compare):
-                raise ExpressionError("comparison operators are only allowed at the top of an expression: {0}".format(meta.dump_python_source(node).strip()))
+                raise ExpressionError("comparison operators are only allowed at the top of an expression: {0}".format(_meta().dump_python_source(node).strip()))
 
             elif relations and isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
                 content = recurse(node.operand, relations=True)
@@ -220,7 +330,7 @@ class Expr(object):
                 return functools.reduce(LogicalOr.combine, [Logical.normalform(recurse(x, relations=True)) for x in node.values]).simplify()
 
             elif isinstance(node, ast.BoolOp):
-                raise ExpressionError("logical operators are only allowed at the top of an expression: {0}".format(meta.dump_python_source(node).strip()))
+                raise ExpressionError("logical operators are only allowed at the top of an expression: {0}".format(_meta().dump_python_source(node).strip()))
                 
             elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
                 content = recurse(node.operand)
@@ -240,7 +350,7 @@ class Expr(object):
                     return BitAnd.negate(content).simplify()
 
             elif isinstance(node, ast.UnaryOp):
-                raise ExpressionError("only unary operators supported: 'not', '-', '+', and '~': {0}".format(meta.dump_python_source(node).strip()))
+                raise ExpressionError("only unary operators supported: 'not', '-', '+', and '~': {0}".format(_meta().dump_python_source(node).strip()))
 
             elif isinstance(node, ast.BinOp):
                 if   isinstance(node.op, ast.Add):      fcn = "+"
@@ -254,7 +364,7 @@ class Expr(object):
                 elif isinstance(node.op, ast.BitAnd):   fcn = "&"
                 elif isinstance(node.op, ast.BitXor):   op, fcn = "^",  "xor"
                 else:
-                    raise ExpressionError("only binary operators supported: '+', '-', '*', '/', '//', '%', '**', '|', '&', and '^': {0}".format(meta.dump_python_source(node).strip()))
+                    raise ExpressionError("only binary operators supported: '+', '-', '*', '/', '//', '%', '**', '|', '&', and '^': {0}".format(_meta().dump_python_source(node).strip()))
 
                 left = recurse(node.left)
                 right = recurse(node.right)
@@ -278,7 +388,7 @@ class Expr(object):
                         negation = TimesDiv.negate(right.pos[0])
                     elif right.const == PlusMinus.identity and len(right.pos) == 0 and len(right.neg) == 1:
                         negation = TimesDiv.negate(right.neg[0])
-                        negation.const = PlusMinus.negateval(negation.const)
+                        negation = TimesDiv(PlusMinus.negateval(negation.const), negation.pos, negation.neg)
                     else:
                         negation = TimesDiv.negate(right)   # additive terms in the denominator
 
@@ -330,11 +440,13 @@ class Expr(object):
                             break
                     
                 if fcn is None:
-                    raise ExpressionError("unhandled function in expression: {0}".format(meta.dump_python_source(node).strip()))
+                    raise ExpressionError("unhandled function in expression: {0}".format(_meta().dump_python_source(node).strip()))
+                if Expr.numargs.get(fcn, len(node.args)) != len(node.args):
+                    raise ExpressionError("function {0} takes {1} arguments, not {2}".format(repr(fcn), Expr.numargs[fcn], len(node.args)))
                 return Call(fcn, *(recurse(x) for x in node.args))
 
             else:
-                ExpressionError("unhandled syntax in expression: {0}".format(meta.dump_python_source(node).strip()))
+                ExpressionError("unhandled syntax in expression: {0}".format(_meta().dump_python_source(node).strip()))
 
         if returnlabel:
             return recurse(pyast, relations=True), label
@@ -342,6 +454,7 @@ class Expr(object):
             return recurse(pyast, relations=True)
         
     recognized = {abs: "abs", max: "max", min: "min"}
+    numargs = {}     # only for functions added by histbook.calc.register
 
 class _Placeholder(object):
     count = 0
@@ -449,8 +562,17 @@ _recognize(numpy, "tan", "tan")
 _recognize(numpy, "trunc", "trunc")
 
 class Const(Expr):
-    def __init__(self, value):
-        self.value = value
+    __slots__ = ("value",)
+
+    def __new__(cls, value):
+        if isinstance(value, set):
+            key = (set, frozenset(value))
+        else:
+            key = (value,)        # numerically equal constants (1, 1.0, True) are the same expression
+        return cls._make(key, value=value)
+
+    def _args(self):
+        return (self.value,)
 
     def _reprargs(self):
         return (repr(self.value),)
@@ -458,14 +580,7 @@ class Const(Expr):
     def __str__(self):
         return str(self.value)
 
-    def __hash__(self):
-        if isinstance(self.value, set):
-            value = (set, tuple(sorted(self.value)))
-        else:
-            value = self.value
-        return hash((Const, value))
-
-    def __eq__(self, other):
+    def _equal(self, other):
         return self.__class__.__name__ == other.__class__.__name__ and self.value == other.value
 
     def __lt__(self, other):
@@ -481,8 +596,13 @@ class Const(Expr):
         return self
 
 class Name(Expr):
-    def __init__(self, value):
-        self.value = value
+    __slots__ = ("value",)
+
+    def __new__(cls, value):
+        return cls._make((value,), value=value)
+
+    def _args(self):
+        return (self.value,)
 
     def _reprargs(self):
         return (repr(self.value),)
@@ -490,10 +610,7 @@ class Name(Expr):
     def __str__(self):
         return self.value
 
-    def __hash__(self):
-        return hash((Name, self.value))
-
-    def __eq__(self, other):
+    def _equal(self, other):
         return self.__class__.__name__ == other.__class__.__name__ and self.value == other.value
 
     def __lt__(self, other):
@@ -507,9 +624,13 @@ class Name(Expr):
         return Name(names[self])
 
 class Call(Expr):
-    def __init__(self, fcn, *args):
-        self.fcn = fcn
-        self.args = args
+    __slots__ = ("fcn", "args")
+
+    def __new__(cls, fcn, *args):
+        return cls._make((fcn, args), fcn=fcn, args=args)
+
+    def _args(self):
+        return (self.fcn,) + self.args
 
     def _reprargs(self):
         return (repr(self.fcn),) + tuple(repr(x) for x in self.args)
@@ -517,10 +638,7 @@ class Call(Expr):
     def __str__(self):
         return "{0}({1})".format(self.fcn, ", ".join(str(x) for x in self.args))
 
-    def __hash__(self):
-        return hash((Call, self.fcn, self.args))
-
-    def __eq__(self, other):
+    def _equal(self, other):
         return self.__class__.__name__ == other.__class__.__name__ and self.fcn == other.fcn and self.args == other.args
 
     def __lt__(self, other):
@@ -536,26 +654,31 @@ class Call(Expr):
             return self.__class__(self.fcn, *(x.rename(names) for x in self.args))
 
 class BinOp(Call):
-    def __init__(self, fcn, left, right, op):
-        super(BinOp, self).__init__(fcn, left, right)
-        self.op = op
+    __slots__ = ("op",)
+
+    def __new__(cls, fcn, left, right, op):
+        return cls._make((fcn, (left, right), op), fcn=fcn, args=(left, right), op=op)
+
+    def _args(self):
+        return (self.fcn,) + self.args + (self.op,)
 
     def __str__(self):
         return (" " + self.op + " ").join(("(" + str(x) + ")") if isinstance(x, BinOp) else str(x) for x in self.args)
 
 class RingAlgebra(Expr):
-    def __init__(self, const, pos, neg):
-        self.const = const
-        self.pos = pos
-        self.neg = neg
+    __slots__ = ("const", "pos", "neg")
+
+    def __new__(cls, const, pos, neg):
+        pos, neg = tuple(pos), tuple(neg)
+        return cls._make((const, pos, neg), const=const, pos=pos, neg=neg)
+
+    def _args(self):
+        return (self.const, self.pos, self.neg)
 
     def _reprargs(self):
         return (repr(self.const), repr(self.pos), repr(self.neg))
 
-    def __hash__(self):
-        return hash((self.__class__, self.const, self.pos, self.neg))
-
-    def __eq__(self, other):
+    def _equal(self, other):
         return self.__class__.__name__ == other.__class__.__name__ and self.const == other.const and self.pos == other.pos and self.neg == other.neg
 
     def __lt__(self, other):
@@ -595,6 +718,8 @@ class RingAlgebra(Expr):
             return self.__class__(self.const, tuple(x.rename(names) for x in self.pos), tuple(x.rename(names) for x in self.neg))
 
 class RingAlgebraMultLike(RingAlgebra):
+    __slots__ = ()
+
     @classmethod
     def normalform(op, arg):
         if isinstance(arg, op):
@@ -608,6 +733,8 @@ class RingAlgebraMultLike(RingAlgebra):
         return isinstance(other, self.__class__) and self.pos == other.pos and self.neg == other.neg
         
 class RingAlgebraAddLike(RingAlgebra):
+    __slots__ = ()
+
     @classmethod
     def normalform(op, arg):
         if isinstance(arg, op):
@@ -644,9 +771,9 @@ class RingAlgebraAddLike(RingAlgebra):
             elif len(x.pos) == len(x.neg) == 0:
                 const = op.calcval(const, x.const)
             else:
-                for y in terms:
+                for i, y in enumerate(terms):
                     if x.similar(y):
-                        y.const = op.calcval(x.const, y.const)
+                        terms[i] = op.subop(op.calcval(x.const, y.const), y.pos, y.neg)
                         break
                 else:
                     terms.append(x)
@@ -658,9 +785,9 @@ class RingAlgebraAddLike(RingAlgebra):
             elif len(x.pos) == len(x.neg) == 0:
                 const = op.calcval(const, op.negateval(x.const))
             else:
-                for y in terms:
+                for i, y in enumerate(terms):
                     if x.similar(y):
-                        y.const = op.calcval(op.negateval(x.const), y.const)
+                        terms[i] = op.subop(op.calcval(op.negateval(x.const), y.const), y.pos, y.neg)
                         break
                 else:
                     terms.append(op.subop(op.negateval(x.const), x.pos, x.neg))
@@ -670,8 +797,7 @@ class RingAlgebraAddLike(RingAlgebra):
             if x.const == op.identity:
                 pass
             elif op.isnegval(x.const):
-                x.const = op.negateval(x.const)
-                negterms.append(x)
+                negterms.append(op.subop(op.negateval(x.const), x.pos, x.neg))
             else:
                 posterms.append(x)
 
@@ -699,7 +825,7 @@ class RingAlgebraAddLike(RingAlgebra):
         return op.collect(op(op.identity, tuple(pos), tuple(neg)))
 
     def simplify(self):
-        out = self.__class__(self.const, self.pos, self.neg)
+        out = self
 
         if len(out.pos) == len(out.neg) == 0:
             return Const(out.const)
@@ -718,6 +844,8 @@ class RingAlgebraAddLike(RingAlgebra):
         return out
 
 class RingAlgebraBinOp(object):
+    __slots__ = ()
+
     def __str__(self):
         out = []
         if self.const != self.identity or len(self.pos) == 0:
@@ -732,6 +860,7 @@ class RingAlgebraBinOp(object):
         return "".join(out)
 
 class TimesDiv(RingAlgebraBinOp, RingAlgebraMultLike):
+    __slots__ = ()
     posop = "*"
     negop = "/"
 
@@ -747,6 +876,7 @@ class TimesDiv(RingAlgebraBinOp, RingAlgebraMultLike):
         return left * right
 
 class PlusMinus(RingAlgebraBinOp, RingAlgebraAddLike):
+    __slots__ = ()
     posop = " + "
     negop = " - "
 
@@ -798,18 +928,20 @@ class PlusMinus(RingAlgebraBinOp, RingAlgebraAddLike):
 #         return numpy.uint64(left) | numpy.uint64(right)
 
 class Logical(object):
+    __slots__ = ()
     commutative = True
 
-    def __init__(self, *args):
-        self.args = tuple(sorted(set(args)))
+    def __new__(cls, *args):
+        args = tuple(sorted(set(args)))
+        return cls._make((args,), args=args)
+
+    def _args(self):
+        return self.args
 
     def _reprargs(self):
         return tuple(repr(x) for x in self.args)
 
-    def __hash__(self):
-        return hash((self.__class__, self.args))
-
-    def __eq__(self, other):
+    def _equal(self, other):
         return self.__class__.__name__ == other.__class__.__name__ and self.args == other.args
 
     def __lt__(self, other):
@@ -846,6 +978,8 @@ class Logical(object):
             return self.__class__(*(x.rename(names) for x in self.args))
 
 class LogicalAnd(Logical, RingAlgebraMultLike):
+    __slots__ = ("args",)
+
     @classmethod
     def combine(op, left, right):
         left, right = op.normalform(left), op.normalform(right)
@@ -862,6 +996,8 @@ class LogicalAnd(Logical, RingAlgebraMultLike):
             return self
 
 class LogicalOr(Logical, RingAlgebraAddLike):
+    __slots__ = ("args",)
+
     @classmethod
     def combine(op, left, right):
         left, right = op.normalform(left), op.normalform(right)
@@ -878,10 +1014,13 @@ class LogicalOr(Logical, RingAlgebraAddLike):
             return self
 
 class Relation(Expr):
-    def __init__(self, cmp, left, right):
-        self.cmp = cmp
-        self.left = left
-        self.right = right
+    __slots__ = ("cmp", "left", "right")
+
+    def __new__(cls, cmp, left, right):
+        return cls._make((cmp, left, right), cmp=cmp, left=left, right=right)
+
+    def _args(self):
+        return (self.cmp, self.left, self.right)
 
     def _reprargs(self):
         return (repr(self.cmp), repr(self.left), repr(self.right))
@@ -889,10 +1028,7 @@ class Relation(Expr):
     def __str__(self):
         return "{0} {1} {2}".format(str(self.left), self.cmp, str(self.right))
 
-    def __hash__(self):
-        return hash((Relation, self.cmp, self.left, self.right))
-
-    def __eq__(self, other):
+    def _equal(self, other):
         return self.__class__.__name__ == other.__class__.__name__ and self.cmp == other.cmp and self.left == other.left and self.right == other.right
 
     def __lt__(self, other):
@@ -918,9 +1054,13 @@ class Relation(Expr):
             raise AssertionError(self.cmp)
 
 class Predicate(Expr):
-    def __init__(self, value, positive=True):
-        self.value = value
-        self.positive = positive
+    __slots__ = ("value", "positive")
+
+    def __new__(cls, value, positive=True):
+        return cls._make((value, positive), value=value, positive=positive)
+
+    def _args(self):
+        return (self.value, self.positive)
 
     def _reprargs(self):
         return (repr(self.value), repr(self.positive))
@@ -931,10 +1071,7 @@ class Predicate(Expr):
         else:
             return "not " + self.value
 
-    def __hash__(self):
-        return hash((Predicate, self.value, self.positive))
-
-    def __eq__(self, other):
+    def _equal(self, other):
         return self.__class__.__name__ == other.__class__.__name__ and self.value == other.value and self.positive == other.positive
 
     def __lt__(self, other):
@@ -31,15 +31,19 @@
 import collections
 import functools
 import numbers
+import os
 import sys
+import timeit
 
 import numpy
 COUNTTYPE = numpy.float64
+INTCOUNTTYPE = numpy.int64
 
 import histbook.axis
 import histbook.calc
 import histbook.export
 import histbook.expr
+import histbook.monitor
 import histbook.proj
 import histbook.instr
 import histbook.vega
@@ -54,8 +58,145 @@ class _ChainedDict(object):
             return self._two[n]    # and it has precedence
         else:
             return self._one[n]    # self._one might only have __getitem__
+
+class _StructuredFields(object):
+    def __init__(self, array):
+        self._array = array
+
+    def __getitem__(self, n):
+        if n not in self._array.dtype.names:
+            raise KeyError(n)
+        return self._array[n]     # a view, not a copy
+
+def _fieldsource(arrays):
+    # dicts, pandas DataFrames, and Arrow Tables/RecordBatches are already indexed by column name
+    if isinstance(arrays, numpy.ndarray) and arrays.dtype.names is not None:
+        return _StructuredFields(arrays)
+    else:
+        return arrays
+
+def _fillarguments(arrays, more):
+    if arrays is None:
+        return more
+    elif len(more) == 0:
+        return _fieldsource(arrays)
+    else:
+        return _ChainedDict(_fieldsource(arrays), more)
+
+def _fillblock(template, arrays, metrics=False):
+    out = template._emptyclone()
+    if metrics:
+        out.startmetrics()
+    out.fill(arrays)
+    return out
+
+def _blockmetrics(block):
+    # Metrics hold a lock, so partitions report them as plain dicts
+    return block._metrics.asdict()
+
+def _addblocks(partials):
+    out = partials[0]
+    for x in partials[1:]:
+        out += x
+    return out
         
 class Fillable(object):
+    def __getstate__(self):
+        out = dict(self.__dict__)
+        for n in "_profiler", "_metrics", "_asynclock":
+            out.pop(n, None)
+        return out
+
+    _profiler = None
+
+    def startprofile(self):
+        if self._profiler is None:
+            self._profiler = histbook.monitor.Profiler()
+        return self._profiler
+
+    def stopprofile(self):
+        out, self._profiler = self._profiler, None
+        return out
+
+    @property
+    def profiler(self):
+        return self._profiler
+
+    _metrics = None
+
+    def startmetrics(self):
+        if self._metrics is None:
+            self._metrics = histbook.monitor.Metrics()
+        return self._metrics
+
+    def stopmetrics(self):
+        out, self._metrics = self._metrics, None
+        return out
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    _asynclock = None
+
+    def afill(self, arrays=None, **more):
+        import histbook.aio
+        arrays = _fillarguments(arrays, more)
+        return histbook.aio.afill(self, arrays)
+
+    def afillstream(self, source, executor=None):
+        import histbook.aio
+        return histbook.aio.afillstream(self, source, executor=executor)
+
+    def filldask(self, arrays=None, scheduler=None, splitevery=8, **more):
+        import dask
+        import dask.array
+
+        arrays = _fillarguments(arrays, more)
+
+        columns = {}
+        chunks = None
+        for n in self.fields:
+            try:
+                columns[n] = arrays[n]
+            except KeyError:
+                raise ValueError("required field {0} not found in fill arguments".format(repr(n)))
+            if isinstance(columns[n], dask.array.Array):
+                if columns[n].ndim != 1:
+                    raise ValueError("dask array {0} must be one-dimensional".format(repr(n)))
+                if chunks is None:
+                    chunks = columns[n].chunks
+
+        if chunks is None:
+            raise TypeError("filldask requires at least one of the fields {0} to be a dask array".format(", ".join(map(repr, self.fields))))
+
+        for n, x in columns.items():
+            if not isinstance(x, dask.array.Array):
+                x = dask.array.from_array(numpy.asarray(x), chunks=chunks)
+            elif x.chunks != chunks:
+                x = x.rechunk(chunks)
+            columns[n] = x.to_delayed().ravel()
+
+        template = self._emptyclone()
+        blocks = [dask.delayed(_fillblock)(template, dict((n, x[i]) for n, x in columns.items()), self._metrics is not None) for i in range(len(chunks[0]))]
+        partials = blocks
+        while len(partials) > 1:
+            partials = [dask.delayed(_addblocks)(partials[i : i + splitevery]) for i in range(0, len(partials), splitevery)]
+
+        if self._metrics is None:
+            total, = dask.compute(partials[0], scheduler=scheduler)
+            self.__iadd__(total)
+        else:
+            total, blockmetrics = dask.compute(partials[0], [dask.delayed(_blockmetrics)(x) for x in blocks], scheduler=scheduler)
+            self.__iadd__(total)
+            for x in blockmetrics:
+                self._metrics._merge(x)
+
+    def fillfrom(self, path, chunksize=None):
+        import histbook.source
+        for arrays in histbook.source.iterate(path, self.fields, chunksize=chunksize):
+            self.fill(arrays)
+
     @property
     def fields(self):
         if self._fields is None:
@@ -69,7 +210,7 @@ class Fillable(object):
             
             fields = histbook.instr.sources(goals, table)
 
-            self._instructions = self._streamline(0, list(histbook.instr.instructions(fields, goals)))
+            self._instructions = self._streamline(0, list(histbook.instr.instructions(fields, goals, self._selection)))
             self._fields = sorted(x.goal.value for x in fields)
 
         return self._fields
@@ -102,8 +243,19 @@ class Fillable(object):
         self.fields  # for the side-effect of creating self._instructions
 
         length = None
+        selection = None
         symbols = {}
+        profiler = self._profiler
+        metrics = self._metrics
+        if metrics is not None:
+            starttime = timeit.default_timer()
+            inputbytes = 0
+
         for instruction in self._instructions:
+            if profiler is not None:
+                start = profiler.start()
+                nbytes = 0
+
             if isinstance(instruction, histbook.instr.Param):
                 try:
                     array = arrays[instruction.extern]
@@ -111,32 +263,73 @@ class Fillable(object):
                     raise ValueError("required field {0} not found in fill arguments".format(repr(instruction.extern)))
 
                 if not isinstance(array, numpy.ndarray):
-                    array = numpy.array(array)
+                    # views rather than copies of pandas Series, Arrow arrays, memoryviews, and other buffers
+                    array = numpy.asarray(array)
+                    if profiler is not None:
+                        nbytes = array.nbytes
                 if array.shape == ():
-                    array.shape = (1,)
+                    array = array.reshape(1)
 
                 if length is None:
                     length = len(array)
                 elif length != len(array):
                     raise ValueError("array {0} has len {1} but other arrays have len {2}".format(repr(instruction.extern), len(array), length))
+                if selection is not None:
+                    array = array[selection]
 
                 symbols[instruction.name] = array
+                if metrics is not None:
+                    inputbytes += array.nbytes
 
             elif isinstance(instruction, histbook.instr.Assign):
                 symbols[instruction.name] = histbook.calc.calculate(instruction.expr, symbols)
+                if profiler is not None:
+                    nbytes = getattr(symbols[instruction.name], "nbytes", 0)
 
             elif isinstance(instruction, histbook.instr.Export):
                 data = symbols[instruction.name]
                 for i, j in instruction.destination:
                     self._destination[i][j] = data
 
+            elif isinstance(instruction, histbook.instr.Compress):
+                selection = numpy.nonzero(symbols[instruction.name])[0]
+                for n, x in symbols.items():
+                    symbols[n] = x[selection]
+                if profiler is not None:
+                    nbytes = selection.nbytes
+
             elif isinstance(instruction, histbook.instr.Delete):
                 del symbols[instruction.name]
 
             else:
                 raise AssertionError(instruction)
 
-        return length
+            if profiler is not None:
+                profiler.record(instruction.__class__.__name__, str(instruction), start, nbytes, length)
+
+        if metrics is not None:
+            metrics._evaluated(inputbytes, timeit.default_timer() - starttime)
+
+        if selection is None:
+            return length
+        else:
+            return len(selection)
+
+    def _monitoredpostfill(self, name, hist, arrays, length):
+        if self._profiler is None and hist._metrics is None:
+            hist._postfill(arrays, length)
+
+        else:
+            if self._profiler is not None:
+                start = self._profiler.start()
+            starttime = timeit.default_timer()
+
+            hist._postfill(arrays, length)
+
+            if hist._metrics is not None:
+                hist._metrics._filled(1 if length is None else length, timeit.default_timer() - starttime, hist._contentbytes())
+            if self._profiler is not None:
+                self._profiler.record("postfill", repr(hist) if name is None else name, start, None, length)
 
 class Book(collections.MutableMapping, Fillable):
     def __init__(self, hists={}, **keywords):
@@ -165,22 +358,36 @@ class Book(collections.MutableMapping, Fillable):
     def __setitem__(self, name, value):
         if isinstance(value, Book):
             for n, x in value.items():
-                self._hists[name + "/" + n] = x.copyonfill()
-                self._fields = None
+                self._sethist(name + "/" + n, x)
         elif isinstance(value, Hist):
-            self._hists[name] = value.copyonfill()
-            self._fields = None
+            self._sethist(name, value)
         else:
             raise TypeError("histogram books can only be filled with histograms or other histogram books, not {0}".format(type(value)))
 
+        if self._metrics is not None:
+            for n, x in self._hists.items():
+                if n not in self._metrics.hists:
+                    self._metrics.hists[n] = x.startmetrics()
+
+    def _sethist(self, name, hist):
+        hist = hist.copyonfill()
+        # a histogram that replaces one in a monitored book (e.g. book[name] += other) keeps counting in the same Metrics
+        if self._metrics is not None and name in self._metrics.hists:
+            hist._metrics = self._metrics.hists[name]
+        self._hists[name] = hist
+        self._fields = None
+
     def __delitem__(self, name):
         del self._hists[name]
+        self._fields = None
+        if self._metrics is not None:
+            self._metrics.hists.pop(name, None)
 
     def __iter__(self):
         if sys.version_info[0] < 3:
             return self._hists.iterkeys()
         else:
-            return self._hists.keys()
+            return iter(self._hists.keys())
 
     def keys(self):
         return self._hists.keys()
@@ -188,10 +395,36 @@ class Book(collections.MutableMapping, Fillable):
     def values(self):
         return self._hists.values()
 
+    def startmetrics(self):
+        if self._metrics is None:
+            self._metrics = histbook.monitor.Metrics(collections.OrderedDict((n, x.startmetrics()) for n, x in self._hists.items()))
+        return self._metrics
+
+    def stopmetrics(self):
+        for x in self._hists.values():
+            x.stopmetrics()
+        return Fillable.stopmetrics(self)
+
     @property
     def _goals(self):
         return functools.reduce(set.union, (x._goals for x in self.values()))
 
+    @property
+    def _selection(self):
+        # only a filter that every histogram shares can be applied before the other expressions
+        filters = set(x._filtergoal for x in self._hists.values())
+        if len(filters) == 1:
+            return filters.pop()
+        else:
+            return None
+
+    def _emptyclone(self):
+        out = self.__class__.__new__(self.__class__)
+        out.__dict__.update(self.__getstate__())
+        out._hists = collections.OrderedDict((n, x._emptyclone()) for n, x in self._hists.items())
+        out._destination = [x._destination[0] for x in out._hists.values()]
+        return out
+
     def _streamline(self, i, instructions):
         self._destination = []
         for i, x in enumerate(self._hists.values()):
@@ -200,18 +433,19 @@ class Book(collections.MutableMapping, Fillable):
         return instructions
 
     def fill(self, arrays=None, **more):
-        if arrays is None:
-            arrays = more
-        elif len(more) == 0:
-            pass
-        else:
-            arrays = _ChainedDict(arrays, more)
+        arrays = _fillarguments(arrays, more)
 
         for x in self._hists.values():
             x._prefill()
         length = self._fill(arrays)
-        for x in self._hists.values():
-            x._postfill(arrays, length)
+        if self._metrics is not None:
+            starttime = timeit.default_timer()
+
+        for n, x in self._hists.items():
+            self._monitoredpostfill(n, x, arrays, length)
+
+        if self._metrics is not None:
+            self._metrics._filled(1 if length is None else length, timeit.default_timer() - starttime, sum(x._contentbytes() for x in self._hists.values()))
 
     def __add__(self, other):
         if not isinstance(other, Book):
@@ -238,6 +472,30 @@ class Book(collections.MutableMapping, Fillable):
 
         return self
 
+    def toparquet(self, path, **opts):
+        for n, x in self._hists.items():
+            filename = os.path.join(path, *(n.split("/"))) + ".parquet"
+            if not os.path.exists(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+            x.toparquet(filename, **opts)
+
+    def toroot(self, path, **opts):
+        import uproot
+        with uproot.recreate(path) as file:
+            for n, x in self._hists.items():
+                x.toroot(file, n, **opts)
+
+    @staticmethod
+    def fromparquet(path):
+        out = Book()
+        for directory, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.endswith(".parquet"):
+                    name = os.path.relpath(os.path.join(directory, filename[:-len(".parquet")]), path)
+                    out._hists["/".join(name.split(os.sep))] = Hist.fromparquet(os.path.join(directory, filename))
+        return out
+
     @staticmethod
     def group(by="source", **books):
         if any(not isinstance(x, Book) for x in books.values()):
@@ -256,8 +514,13 @@ class Hist(Fillable, histbook.proj.Projectable, histbook.export.Exportable, hist
     def _chain(self):
         return ()
 
+    def _opts(self):
+        return {"weight": self._weight, "weights": self._weights, "filter": self._filter, "defs": self._defs, "dtype": self._dtype, "compensated": self._compensated, "checknan": self._checknan}
+
     def weight(self, expr):
-        return Hist(*[x.relabel(x._original) for x in self._group + self._fixed + self._profile], weight=expr, defs=self._defs)
+        opts = self._opts()
+        opts["weight"] = expr
+        return Hist(*[x.relabel(x._original) for x in self._group + self._fixed + self._profile], **opts)
 
     @staticmethod
     def _copycontent(content):
@@ -268,22 +531,65 @@ class Hist(Fillable, histbook.proj.Projectable, histbook.export.Exportable, hist
         else:
             return dict((n, Hist._copycontent(x)) for n, x in content.items())
 
+    @staticmethod
+    def _addcontent(content, compensation):
+        if isinstance(content, numpy.ndarray):
+            return content.astype(COUNTTYPE) + compensation
+        else:
+            return dict((n, Hist._addcontent(x, compensation[n])) for n, x in content.items())
+
+    @staticmethod
+    def _zeroslike(content):
+        if content is None:
+            return None
+        elif isinstance(content, numpy.ndarray):
+            return numpy.zeros_like(content)
+        else:
+            return dict((n, Hist._zeroslike(x)) for n, x in content.items())
+
     def copy(self):
         out = self.__class__.__new__(self.__class__)
         out.__dict__.update(self.__dict__)
         out._content = Hist._copycontent(self._content)
+        out._compensation = Hist._copycontent(self._compensation)
+        out._profiler = out._metrics = out._asynclock = None
         return out
 
     def copyonfill(self):
         out = self.__class__.__new__(self.__class__)
         out.__dict__.update(self.__dict__)
         out._copyonfill = True
+        out._profiler = out._metrics = out._asynclock = None
+        return out
+
+    def _emptyclone(self):
+        out = self.__class__.__new__(self.__class__)
+        out.__dict__.update(self.__getstate__())
+        out._content = None
+        out._compensation = None
+        out._copyonfill = False
+        out._destination = [[None] * len(self._destination[0])]
         return out
 
+    def _contentbytes(self):
+        def recurse(content):
+            if content is None:
+                return 0
+            elif isinstance(content, numpy.ndarray):
+                return content.nbytes
+            else:
+                return sum(recurse(x) for x in content.values())
+        return recurse(self._content) + recurse(self._compensation)
+
     def __init__(self, *axis, **opts):
         weight = opts.pop("weight", None)
+        weights = opts.pop("weights", None)
+        filter = opts.pop("filter", None)
         defs = opts.pop("defs", {})
         fill = opts.pop("fill", None)
+        dtype = opts.pop("dtype", None)
+        compensated = opts.pop("compensated", False)
+        checknan = opts.pop("checknan", True)
         if len(opts) > 0:
             raise TypeError("unrecognized options for Hist: {0}".format(" ".join(opts)))
 
@@ -338,6 +644,9 @@ class Hist(Fillable, histbook.proj.Projectable, histbook.export.Exportable, hist
                 new._sumwxindex = self._shape[-1]
                 new._sumwx2index = self._shape[-1] + 1
                 self._shape[-1] += 2
+                if isinstance(new, histbook.axis.quantile):
+                    new._sketchindex = self._shape[-1]
+                    self._shape[-1] += new.numbuckets
                 dest(new._goals(new._parsed))
 
         if weight is None:
@@ -356,14 +665,60 @@ class Hist(Fillable, histbook.proj.Projectable, histbook.export.Exportable, hist
             self._shape[-1] += 2
             dest([histbook.instr.CallGraphGoal(self._weightparsed),
                   histbook.instr.CallGraphGoal(histbook.expr.Call("numpy.multiply", self._weightparsed, self._weightparsed))])
+
+        # each weight variation is a block of columns laid out like a weighted histogram's: profile sums, then sumw and sumw2
+        self._variations = []
+        if weights is not None:
+            if not isinstance(weights, dict) or len(weights) == 0:
+                raise TypeError("weights must be a non-empty dict from variation names to weight expressions")
+            for name in sorted(weights):
+                if isinstance(weights[name], (numbers.Real, numpy.integer, numpy.floating)):
+                    parsed, label = histbook.expr.Const(weights[name]), str(weights[name])
+                else:
+                    parsed, label = histbook.expr.Expr.parse(weights[name], defs=self._defs, returnlabel=True)
+                self._variations.append((name, parsed, label, self._shape[-1]))
+                self._shape[-1] += self._sumwindex + 2
+                dest([histbook.instr.CallGraphGoal(parsed),
+                      histbook.instr.CallGraphGoal(histbook.expr.Call("numpy.multiply", parsed, parsed))])
+
+        if filter is None:
+            self._filterparsed, self._filterlabel, self._filtergoal = None, None, None
+        else:
+            self._filterparsed, self._filterlabel = histbook.expr.Expr.parse(filter, defs=self._defs, returnlabel=True)
+            if isinstance(self._filterparsed, histbook.expr.Const):
+                raise ValueError("filter must depend on at least one field, not the constant {0}".format(repr(filter)))
+            self._filtergoal = histbook.instr.CallGraphGoal(self._filterparsed)
+            dest([self._filtergoal])
             
         self._group = tuple(self._group)
         self._fixed = tuple(self._fixed)
         self._profile = tuple(self._profile)
 
         self._weight = weight
+        self._weights = weights
+        self._filter = filter
         self._shape = tuple(self._shape)
+
+        self._dtype = dtype
+        self._compensated = bool(compensated)
+        self._checknan = bool(checknan)
+        if dtype is None and self._compensated:
+            self._contenttype = numpy.dtype(numpy.float32)
+        elif dtype is None and weight is None and weights is None and len(self._profile) == 0:
+            self._contenttype = numpy.dtype(INTCOUNTTYPE)     # exact counts; converted to float by table/fraction
+        elif dtype is None:
+            self._contenttype = numpy.dtype(COUNTTYPE)
+        else:
+            self._contenttype = numpy.dtype(dtype)
+            if self._contenttype.kind not in ("i", "u", "f"):
+                raise TypeError("content dtype must be an integer or floating point type, not {0}".format(self._contenttype))
+            if self._contenttype.kind != "f" and (weight is not None or weights is not None or len(self._profile) > 0):
+                raise ValueError("integer content dtype is only allowed for unweighted histograms without profiles")
+            if self._compensated and (self._contenttype.kind != "f" or self._contenttype.itemsize >= numpy.dtype(COUNTTYPE).itemsize):
+                raise ValueError("compensated content must be narrower than {0}, not {1}".format(numpy.dtype(COUNTTYPE).name, self._contenttype))
+
         self._content = None
+        self._compensation = None
         self._fields = None
         self._copyonfill = False
 
@@ -379,6 +734,16 @@ class Hist(Fillable, histbook.proj.Projectable, histbook.export.Exportable, hist
         out = [repr(x) for x in self._group + self._fixed + self._profile]
         if self._weightlabel is not None:
             out.append("weight={0}".format(repr(self._weightlabel)))
+        if len(self._variations) > 0:
+            out.append("weights={" + ", ".join("{0}: {1}".format(repr(name), repr(label)) for name, parsed, label, offset in self._variations) + "}")
+        if self._filterlabel is not None:
+            out.append("filter={0}".format(repr(self._filterlabel)))
+        if self._dtype is not None:
+            out.append("dtype={0}".format(repr(self._contenttype.name)))
+        if self._compensated:
+            out.append("compensated=True")
+        if not self._checknan:
+            out.append("checknan=False")
         if len(self._defs) > 0:
             out.append("defs={" + ", ".join("{0}: {1}".format(repr(n), repr(str(x)) if isinstance(x, histbook.expr.Expr) else repr(x)) for n, x in self._defs.items()) + "}")
         return "Hist(" + indent.join(out) + ")"
@@ -390,41 +755,116 @@ class Hist(Fillable, histbook.proj.Projectable, histbook.export.Exportable, hist
     def shape(self):
         return self._shape
 
+    @property
+    def variations(self):
+        return tuple(name for name, parsed, label, offset in self._variations)
+
+    def variation(self, name):
+        for n, parsed, label, offset in self._variations:
+            if n == name:
+                break
+        else:
+            raise IndexError("no such weight variation: {0}".format(repr(name)))
+
+        opts = self._opts()
+        opts["weight"] = self._weights[name]
+        opts["weights"] = None
+        out = Hist(*[x.relabel(x._original) for x in self._group + self._fixed + self._profile], **opts)
+
+        def block(content):
+            if content is None:
+                return None
+            elif isinstance(content, numpy.ndarray):
+                return content[..., offset : offset + out._shape[-1]].copy()
+            else:
+                return dict((n, block(x)) for n, x in content.items())
+
+        out._content = block(self._content)
+        out._compensation = block(self._compensation)
+        return out
+
+    @property
+    def _selection(self):
+        return self._filtergoal
+
     def _streamline(self, i, instructions):
+        # a filter that was applied to all arrays by a Compress instruction doesn't need to be applied again
+        compressed = self._filtergoal is not None and any(isinstance(x, histbook.instr.Compress) and x.goal == self._filtergoal.goal for x in instructions)
         for instruction in instructions:
             if isinstance(instruction, histbook.instr.Export):
                 if not hasattr(instruction, "destination"):
                     instruction.destination = []
                 if instruction.goal in self._lookup:
                     for j in self._lookup[instruction.goal]:
-                        instruction.destination.append((i, j))
+                        if not (compressed and j == len(self._destination[0]) - 1):
+                            instruction.destination.append((i, j))
 
         return instructions
 
     def fill(self, arrays=None, **more):
         if self._copyonfill:
             self._content = Hist._copycontent(self._content)
+            self._compensation = Hist._copycontent(self._compensation)
             self._copyonfill = False
 
-        if arrays is None:
-            arrays = more
-        elif len(more) == 0:
-            pass
-        else:
-            arrays = _ChainedDict(arrays, more)
+        arrays = _fillarguments(arrays, more)
 
         self._prefill()
         length = self._fill(arrays)
-        self._postfill(arrays, length)
+        self._monitoredpostfill(None, self, arrays, length)
 
     def _prefill(self):
         if self._content is None:
             if len(self._group) == 0:
-                self._content = numpy.zeros(self._shape, dtype=COUNTTYPE)
+                self._content = numpy.zeros(self._shape, dtype=self._contenttype)
             else:
                 self._content = {}
 
+    def _zerocopy(self):
+        out = self.copy()
+        out._prefill()
+        return out
+
+    def _residuals(self):
+        # derived histograms (projections, selections, files) start with zero residuals: their content is already rounded
+        if self._compensation is None:
+            self._compensation = Hist._zeroslike(self._content)
+        return self._compensation
+
+    @staticmethod
+    def _compensatedadd(total, compensation, addend, addendcompensation=None):
+        # the pair (total, compensation) holds the sum to about twice the precision of the content type: the new sum is formed
+        # in float64, total is set to its nearest representable value and compensation keeps what rounding left out
+        exact = total.astype(COUNTTYPE)
+        exact += compensation
+        exact += addend
+        if addendcompensation is not None:
+            exact += addendcompensation
+        total[...] = exact
+        exact -= total
+        compensation[...] = exact
+
     def _postfill(self, arrays, length):
+        if self._filtergoal is not None and self._destination[0][-1] is not None:
+            selection = numpy.nonzero(self._destination[0][-1])[0]
+            length = len(selection)
+            for j, x in enumerate(self._destination[0][:-1]):
+                if isinstance(x, tuple):
+                    uniques, inverse = x
+                    used, inverse = numpy.unique(inverse[selection], return_inverse=True)
+                    self._destination[0][j] = [uniques[k] for k in used], inverse
+                elif x is not None:
+                    self._destination[0][j] = x[selection]
+
+        # every growable axis is checked against its maxbins before any content is reallocated
+        if any(isinstance(axis, histbook.axis.GrowAxis) for axis in self._fixed):
+            fixed = tuple(self._grown(axis, self._destination[0][j]) if isinstance(axis, histbook.axis.GrowAxis) else axis for j, axis in enumerate(self._fixed, len(self._group)))
+            if any(x is not y for x, y in zip(self._fixed, fixed)):
+                self._growto(fixed)
+            for j, axis in enumerate(self._fixed, len(self._group)):
+                if isinstance(axis, histbook.axis.GrowAxis):
+                    self._destination[0][j] = self._growindexes(axis, self._destination[0][j])
+
         j = len(self._group)
         step = 0
         indexes = None
@@ -439,60 +879,182 @@ class Hist(Fillable, histbook.proj.Projectable, histbook.export.Exportable, hist
             j += 1
             step += 1
 
-        axissumx, axissumx2 = [], []
+        axissumx, axissumx2, axissketch = [], [], []
         for axis in self._profile:
-            axissumx.append(self._destination[0][j])
-            axissumx2.append(self._destination[0][j + 1])
+            if isinstance(axis._parsed, histbook.expr.Const):
+                # scalar-broadcast profile: multiplied in at accumulation time
+                axissumx.append(axis._parsed.value)
+                axissumx2.append(axis._parsed.value**2)
+            else:
+                axissumx.append(self._destination[0][j])
+                axissumx2.append(self._destination[0][j + 1])
             j += 2
+            if not isinstance(axis, histbook.axis.quantile):
+                axissketch.append(None)
+            else:
+                if isinstance(axis._parsed, histbook.expr.Const):
+                    bucket = histbook.calc.library["histbook.quantile"](axis._parsed.value, axis.low, axis._gamma, axis._numpositive)
+                    axissketch.append(numpy.full(1 if length is None else length, bucket, dtype=histbook.calc.INDEXTYPE))
+                else:
+                    axissketch.append(self._destination[0][j])
+                j += 1
+
+        variations = []
+        k = j + (0 if self._weightparsed is None else 2)
+        for name, parsed, label, offset in self._variations:
+            if isinstance(parsed, histbook.expr.Const):
+                variations.append((offset, parsed.value, parsed.value**2))
+            else:
+                variationweight = self._destination[0][k]
+                variationweight2 = self._destination[0][k + 1]
+                if self._checknan and variationweight.dtype.kind == "f":
+                    # a NaN weight drops the entry from its own variation only; every column of a block is proportional to the weight
+                    selection = numpy.isnan(variationweight)
+                    if selection.any():
+                        variationweight = numpy.where(selection, 0, variationweight)
+                        variationweight2 = numpy.where(selection, 0, variationweight2)
+                variations.append((offset, variationweight, variationweight2))
+            k += 2
 
         if self._weightparsed is None:
             weight = 1
             weight2 = None
         elif isinstance(self._weightparsed, histbook.expr.Const):
-            weight = numpy.ones(length) * self._weightparsed.value
-            weight2 = numpy.ones(length) * self._weightparsed.value**2
+            # scalar weight: counts are accumulated once and scaled, never broadcast to arrays
+            weight = self._weightparsed.value
+            weight2 = self._weightparsed.value**2
         else:
             weight = self._destination[0][j]
             weight2 = self._destination[0][j + 1]
-            selection = numpy.isnan(weight)
-            if selection.any():
-                weight = weight.copy()
-                weight2 = weight2.copy()
-                weight[selection] = 0.0
-                weight2[selection] = 0.0
-
-        def fillblock(content, indexes, axissumx, axissumx2, weight, weight2):
-            for sumx, sumx2, axis in zip(axissumx, axissumx2, self._profile):
-                if indexes is None:
-                    indexes = numpy.ma.zeros(len(sumx), dtype=histbook.calc.INDEXTYPE)
-                if weight2 is not None:
-                    selection = numpy.ma.getmask(indexes)
-                    if selection is not numpy.ma.nomask:
-                        selection = numpy.bitwise_not(selection)
-                        weight = weight[selection]
-                        weight2 = weight2[selection]
-                numpy.add.at(content.reshape((-1, self._shape[-1]))[:, axis._sumwxindex], indexes.compressed(), sumx * weight)
-                numpy.add.at(content.reshape((-1, self._shape[-1]))[:, axis._sumwx2index], indexes.compressed(), sumx2 * weight)
-
-            if weight2 is None:
-                if indexes is None:
-                    content.reshape((-1, self._shape[-1]))[:, self._sumwindex] += (1 if length is None else length) * weight
-                else:
-                    numpy.add.at(content.reshape((-1, self._shape[-1]))[:, self._sumwindex], indexes.compressed(), weight)
+            if self._checknan and weight.dtype.kind == "f":
+                # NaN weights reject the event through the index mask, rather than zeroing copies of the weights,
+                # unless weight variations share those indexes: then the entry is dropped from the nominal block only
+                selection = numpy.isnan(weight)
+                if selection.any() and len(variations) > 0:
+                    weight = numpy.where(selection, 0, weight)
+                    weight2 = numpy.where(selection, 0, weight2)
+                elif selection.any():
+                    if indexes is None:
+                        indexes = numpy.ma.array(numpy.zeros(len(weight), dtype=histbook.calc.INDEXTYPE), mask=selection)
+                    else:
+                        numpy.bitwise_or(selection, numpy.ma.getmaskarray(indexes), selection)
+                        indexes = numpy.ma.array(indexes.data, mask=selection)
+
+        def fillblock(content, compensation, indexes, axissumx, axissumx2, axissketch, weight, weight2, variations):
+            content = content.reshape((-1, self._shape[-1]))
+            if compensation is not None:
+                compensation = compensation.reshape((-1, self._shape[-1]))
+
+            if indexes is None:
+                compressed = None
+                selection = numpy.ma.nomask
             else:
-                if indexes is None:
-                    indexes = numpy.ma.zeros(len(weight), dtype=histbook.calc.INDEXTYPE)
+                compressed = indexes.compressed()
                 selection = numpy.ma.getmask(indexes)
                 if selection is not numpy.ma.nomask:
                     selection = numpy.bitwise_not(selection)
-                    weight = weight[selection]
-                    weight2 = weight2[selection]
-                numpy.add.at(content.reshape((-1, self._shape[-1]))[:, self._sumwindex], indexes.compressed(), weight)
-                numpy.add.at(content.reshape((-1, self._shape[-1]))[:, self._sumw2index], indexes.compressed(), weight2)
 
-        def filldict(j, content, indexes, axissumx, axissumx2, weight, weight2, allselection):
+            counts = []
+            def accumulate(index, factors):
+                arrays = [x for x in factors if numpy.ndim(x) != 0]
+                scalar = 1
+                for x in factors:
+                    if numpy.ndim(x) == 0:
+                        scalar = scalar * x
+
+                if len(arrays) == 0:
+                    if len(counts) == 0:
+                        if compressed is None:
+                            counts.append(numpy.array([1 if length is None else length]))
+                        else:
+                            counts.append(numpy.bincount(compressed, minlength=len(content)))
+                    total = counts[0]
+
+                else:
+                    if selection is not numpy.ma.nomask:
+                        arrays = [x[selection] for x in arrays]
+                    weights = arrays[0]
+                    for x in arrays[1:]:
+                        weights = weights * x
+                    if compressed is None:
+                        total = numpy.array([weights.sum()])
+                    else:
+                        total = numpy.bincount(compressed, weights=weights, minlength=len(content))
+
+                if scalar != 1:
+                    total = total * scalar
+                if compensation is None:
+                    column = content[:, index]
+                    column += total
+                elif compressed is None or 4*len(compressed) > len(total):
+                    Hist._compensatedadd(content[:, index], compensation[:, index], total)
+                else:
+                    # adding zero leaves a compensated sum unchanged, so with few entries per bin only the bins that were hit are summed in float64
+                    touched = numpy.flatnonzero(total)
+                    cells, residuals = content[touched, index], compensation[touched, index]
+                    Hist._compensatedadd(cells, residuals, total[touched])
+                    content[touched, index] = cells
+                    compensation[touched, index] = residuals
+
+            # the weight variations reuse the flattened indexes and selection; only their weights differ
+            def accumulateblock(offset, weight, weight2):
+                for sumx, sumx2, axis in zip(axissumx, axissumx2, self._profile):
+                    accumulate(offset + axis._sumwxindex, [sumx, weight])
+                    accumulate(offset + axis._sumwx2index, [sumx2, weight])
+
+                accumulate(offset + self._sumwindex, [weight])
+                if weight2 is not None:
+                    accumulate(offset + self._sumwindex + 1, [weight2])
+
+                for buckets, axis in zip(axissketch, self._profile):
+                    if buckets is not None:
+                        # every entry goes to one of the sketch's columns, so the sketch is filled with one bincount over the flattened content
+                        weights = weight
+                        if selection is not numpy.ma.nomask:
+                            buckets = buckets[selection]
+                            if numpy.ndim(weights) != 0:
+                                weights = weights[selection]
+                        flat = buckets + (offset + axis._sketchindex)
+                        if compressed is not None:
+                            flat = flat + compressed * self._shape[-1]
+                        good = (buckets >= 0)
+                        if not good.all():
+                            flat = flat[good]
+                            if numpy.ndim(weights) != 0:
+                                weights = weights[good]
+                        flatcontent = content.reshape(-1)
+                        if len(flat) < flatcontent.size:
+                            # fewer entries than cells: add only to the cells that were hit, rather than to the whole content
+                            touched, flat = numpy.unique(flat, return_inverse=True)
+                        else:
+                            touched = None
+                        if numpy.ndim(weights) == 0:
+                            total = numpy.bincount(flat, minlength=flatcontent.size if touched is None else len(touched))
+                            if weights != 1:
+                                total = total * weights
+                        else:
+                            total = numpy.bincount(flat, weights=weights, minlength=flatcontent.size if touched is None else len(touched))
+                        if touched is None:
+                            if compensation is None:
+                                flatcontent += total
+                            else:
+                                Hist._compensatedadd(flatcontent, compensation.reshape(-1), total)
+                        elif compensation is None:
+                            flatcontent[touched] += total
+                        else:
+                            flatcompensation = compensation.reshape(-1)
+                            cells, residuals = flatcontent[touched], flatcompensation[touched]
+                            Hist._compensatedadd(cells, residuals, total)
+                            flatcontent[touched] = cells
+                            flatcompensation[touched] = residuals
+
+            accumulateblock(0, weight, weight2)
+            for offset, variationweight, variationweight2 in variations:
+                accumulateblock(offset, variationweight, variationweight2)
+
+        def filldict(j, content, compensation, indexes, axissumx, axissumx2, axissketch, weight, weight2, variations, allselection):
             if j == len(self._group):
-                fillblock(content, indexes, axissumx, axissumx2, weight, weight2)
+                fillblock(content, compensation, indexes, axissumx, axissumx2, axissketch, weight, weight2, variations)
 
             else:
                 uniques, inverse = self._destination[0][j]
@@ -504,22 +1066,27 @@ class Hist(Fillable, histbook.proj.Projectable, histbook.export.Exportable, hist
                     
                     if unique not in content:
                         if j + 1 == len(self._group):
-                            content[unique] = numpy.zeros(self._shape, dtype=COUNTTYPE)
+                            content[unique] = numpy.zeros(self._shape, dtype=self._contenttype)
                         else:
                             content[unique] = {}
+                        if compensation is not None:
+                            compensation[unique] = Hist._zeroslike(content[unique])
 
                     subcontent = content[unique]
+                    subcompensation = None if compensation is None else compensation[unique]
                     if indexes is None:
                         subindexes = numpy.ma.zeros(numpy.count_nonzero(selection), dtype=histbook.calc.INDEXTYPE)
                     else:
                         subindexes = indexes[selection]
-                    subaxissumx = [x[selection] for x in axissumx]
-                    subaxissumx2 = [x[selection] for x in axissumx2]
-                    if weight2 is None:
+                    subaxissumx = [x if numpy.ndim(x) == 0 else x[selection] for x in axissumx]
+                    subaxissumx2 = [x if numpy.ndim(x) == 0 else x[selection] for x in axissumx2]
+                    subaxissketch = [None if x is None else x[selection] for x in axissketch]
+                    if numpy.ndim(weight) == 0:
                         subweight, subweight2 = weight, weight2
                     else:
                         subweight = weight[selection]
                         subweight2 = weight2[selection]
+                    subvariations = [(offset, w, w2) if numpy.ndim(w) == 0 else (offset, w[selection], w2[selection]) for offset, w, w2 in variations]
 
                     if allselection is None:
                         suballselection = selection
@@ -527,13 +1094,57 @@ class Hist(Fillable, histbook.proj.Projectable, histbook.export.Exportable, hist
                         suballselection = allselection.copy()
                         suballselection[inverse != idx] = False
 
-                    filldict(j + 1, subcontent, subindexes, subaxissumx, subaxissumx2, subweight, subweight2, suballselection)
+                    filldict(j + 1, subcontent, subcompensation, subindexes, subaxissumx, subaxissumx2, subaxissketch, subweight, subweight2, subvariations, suballselection)
 
-        filldict(0, self._content, indexes, axissumx, axissumx2, weight, weight2, None)
+        filldict(0, self._content, self._residuals() if self._compensated else None, indexes, axissumx, axissumx2, axissketch, weight, weight2, variations, None)
             
         for j in range(len(self._destination[0])):
             self._destination[0][j] = None
 
+    @staticmethod
+    def _grown(axis, values):
+        finite = numpy.isfinite(values)
+        if finite.any():
+            found = values[finite]
+            return axis._grown(int(found.min()), int(found.max()) + 1)
+        else:
+            return axis
+
+    @staticmethod
+    def _growindexes(axis, values):
+        finite = numpy.isfinite(values)
+        indexes = numpy.ma.array(numpy.where(finite, values - axis._firstindex, 0).astype(histbook.calc.INDEXTYPE), mask=numpy.logical_not(finite))
+        if axis.totbins > axis.numbins:
+            indexes[numpy.isnan(values)] = axis.numbins
+        return indexes
+
+    def _growcontent(self, content, fixed):
+        # growable axes only gain whole bins, so existing bins are moved (not redistributed) into the wider content
+        grows = [isinstance(x, histbook.axis.GrowAxis) and x.totbins != y.totbins for x, y in zip(self._fixed, fixed)]
+        if content is None or not any(grows):
+            return content
+
+        shape = tuple(x.totbins for x in fixed) + self._shape[-1:]
+        index = numpy.ix_(*([x._growmap(y) if grow else numpy.arange(x.totbins) for x, y, grow in zip(self._fixed, fixed, grows)] + [numpy.arange(self._shape[-1])]))
+        def recurse(content):
+            if isinstance(content, numpy.ndarray):
+                out = numpy.zeros(shape, dtype=content.dtype)
+                out[index] = content
+                return out
+            else:
+                return dict((n, recurse(x)) for n, x in content.items())
+
+        return recurse(content)
+
+    def _growto(self, fixed):
+        self._content = self._growcontent(self._content, fixed)
+        self._compensation = self._growcontent(self._compensation, fixed)
+        self._fixed = fixed
+        self._shape = tuple(x.totbins for x in fixed) + self._shape[-1:]
+
+    def _growunion(self, other):
+        return tuple(x._union(y) if isinstance(x, histbook.axis.GrowAxis) else x for x, y in zip(self._fixed, other._fixed))
+
     def __add__(self, other):
         if not isinstance(other, Hist):
             raise TypeError("histograms can only be added to other histograms")
@@ -541,6 +1152,20 @@ class Hist(Fillable, histbook.proj.Projectable, histbook.export.Exportable, hist
         if self._group + self._fixed + self._profile != other._group + other._fixed + other._profile:
             raise TypeError("histograms can only be added to other histograms with the same axis specifications")
 
+        if self.variations != other.variations:
+            raise TypeError("histograms can only be added to other histograms with the same weight variations")
+
+        if self._weightparsed != other._weightparsed:
+            raise ValueError("histograms can only be added to other histograms with the same weight: {0} vs {1}".format(repr(self._weightlabel), repr(other._weightlabel)))
+
+        if self._filterparsed != other._filterparsed:
+            raise ValueError("histograms can only be added to other histograms with the same filter: {0} vs {1}".format(repr(self._filterlabel), repr(other._filterlabel)))
+
+        if self._compensated:
+            out = self.copy()
+            out += other
+            return out
+
         def add(selfcontent, othercontent):
             if selfcontent is None and othercontent is None:
                 return None
@@ -567,11 +1192,38 @@ class Hist(Fillable, histbook.proj.Projectable, histbook.export.Exportable, hist
                         out[n] = othercontent[n]
                 return out
 
+        fixed = self._growunion(other)
+        othercontent = other._growcontent(other._content, fixed)
+        othercompensation = other._growcontent(other._compensation, fixed)
+        if othercompensation is not None:
+            # a compensated histogram added to an ordinary one contributes its full-precision sums
+            othercontent = Hist._addcontent(othercontent, othercompensation)
+
         out = self.__class__.__new__(self.__class__)
         out.__dict__.update(self.__dict__)
-        out._content = add(self._content, other._content)
+        out._profiler = out._metrics = out._asynclock = None
+        out._content = add(self._growcontent(self._content, fixed), othercontent)
+        out._promote(other._contenttype if othercompensation is None else COUNTTYPE)
+        out._fixed = fixed
+        out._shape = tuple(x.totbins for x in fixed) + self._shape[-1:]
         return out
 
+    def _promote(self, contenttype):
+        # the dtype option follows the content so that copies and derived histograms keep the promoted type
+        contenttype = numpy.result_type(self._contenttype, contenttype)
+        if contenttype != self._contenttype:
+            self._contenttype = contenttype
+            self._dtype = contenttype.name
+
+    @staticmethod
+    def _iaddarray(selfarray, otherarray):
+        # integer counts added to floating point sums are promoted rather than truncated
+        if numpy.can_cast(otherarray.dtype, selfarray.dtype, "same_kind"):
+            selfarray += otherarray
+            return selfarray
+        else:
+            return selfarray + otherarray
+
     def __iadd__(self, other):
         if not isinstance(other, Hist):
             raise TypeError("histograms can only be added to other histograms")
@@ -579,29 +1231,69 @@ class Hist(Fillable, histbook.proj.Projectable, histbook.export.Exportable, hist
         if self._group + self._fixed + self._profile != other._group + other._fixed + other._profile:
             raise TypeError("histograms can only be added to other histograms with the same axis specifications")
 
+        if self.variations != other.variations:
+            raise TypeError("histograms can only be added to other histograms with the same weight variations")
+
+        if self._weightparsed != other._weightparsed:
+            raise ValueError("histograms can only be added to other histograms with the same weight: {0} vs {1}".format(repr(self._weightlabel), repr(other._weightlabel)))
+
+        if self._filterparsed != other._filterparsed:
+            raise ValueError("histograms can only be added to other histograms with the same filter: {0} vs {1}".format(repr(self._filterlabel), repr(other._filterlabel)))
+
         def add(selfcontent, othercontent):
             assert isinstance(selfcontent, dict) and isinstance(othercontent, dict)
             for n in selfcontent:
                 if n in othercontent:
                     if isinstance(selfcontent[n], numpy.ndarray):
-                        selfcontent[n] += othercontent[n]
+                        selfcontent[n] = Hist._iaddarray(selfcontent[n], othercontent[n])
                     else:
                         add(selfcontent[n], othercontent[n])
             for n in othercontent:
                 if n not in selfcontent:
                     selfcontent[n] = Hist._copycontent(othercontent[n])
 
-        if other._content is None:
-            pass
+        fixed = self._growunion(other)
+        self._growto(fixed)
+        othercontent = other._growcontent(other._content, fixed)
+        othercompensation = other._growcontent(other._compensation, fixed)
+
+        def addcompensated(selfcontent, selfcompensation, othercontent, othercompensation):
+            for n in othercontent:
+                if n not in selfcontent:
+                    selfcontent[n] = Hist._zeroslike(othercontent[n]).astype(self._contenttype)
+                    selfcompensation[n] = Hist._zeroslike(selfcontent[n])
+                if isinstance(othercontent[n], numpy.ndarray):
+                    Hist._compensatedadd(selfcontent[n], selfcompensation[n], othercontent[n], None if othercompensation is None else othercompensation[n])
+                else:
+                    addcompensated(selfcontent[n], selfcompensation[n], othercontent[n], None if othercompensation is None else othercompensation[n])
 
-        elif self._content is None:
-            self._content = Hist._copycontent(other._content)
+        if othercontent is None:
+            pass
 
-        elif isinstance(self._content, numpy.ndarray):
-            self._content += other._content
+        elif self._compensated:
+            self._prefill()
+            if isinstance(self._content, numpy.ndarray):
+                Hist._compensatedadd(self._content, self._residuals(), othercontent, othercompensation)
+            else:
+                addcompensated(self._content, self._residuals(), othercontent, othercompensation)
 
         else:
-            add(self._content, other._content)
+            if othercompensation is not None:
+                # a compensated histogram added to an ordinary one contributes its full-precision sums
+                othercontent = Hist._addcontent(othercontent, othercompensation)
+
+            if self._content is None:
+                self._content = Hist._copycontent(othercontent)
+
+            elif isinstance(self._content, numpy.ndarray):
+                self._content = Hist._iaddarray(self._content, othercontent)
+
+            else:
+                add(self._content, othercontent)
+
+            self._promote(other._contenttype if othercompensation is None else COUNTTYPE)
+
+        return self
 
     @staticmethod
     def group(by="source", **hists):
@@ -623,23 +1315,29 @@ class Hist(Fillable, histbook.proj.Projectable, histbook.export.Exportable, hist
         if histbook.axis.groupby(by) in axis:
             raise ValueError("groupby({0}) already exists in these histograms; use hist.togroup(other) to add to a group".format(repr(by)))
 
-        weight = None
-        for x in hists.values():
-            if weight is None:
-                weight = x._weight
-            elif x._weight is None:
-                raise TypeError("histograms can only be grouped with the same weight specifications")
-            elif weight != x._weight:
-                weight = 1.0
+        if any(x._weightparsed != hist._weightparsed for x in hists.values()):
+            raise ValueError("histograms can only be grouped with the same weight")
+
+        if len(set(x.variations for x in hists.values())) != 1:
+            raise TypeError("histograms can only be grouped with the same weight variations")
+
+        if any(x._filterparsed != hist._filterparsed for x in hists.values()):
+            raise ValueError("histograms can only be grouped with the same filter")
 
         defs = {}
         for x in hists.values():
             defs.update(x._defs)
 
-        out = Hist(*([histbook.axis.groupby(by)] + [x.relabel(x._original) for x in hist._group + hist._fixed + hist._profile]), weight=weight, defs=defs)
+        fixed = hist._fixed
+        for x in hists.values():
+            fixed = tuple(y._union(z) if isinstance(y, histbook.axis.GrowAxis) else y for y, z in zip(fixed, x._fixed))
+
+        out = Hist(*([histbook.axis.groupby(by)] + [x.relabel(x._original) for x in hist._group + fixed + hist._profile]), weight=hist._weight, weights=hist._weights, filter=hist._filter, defs=defs, dtype=hist._dtype, compensated=all(x._compensated for x in hists.values()), checknan=all(x._checknan for x in hists.values()))
         out._content = {}
         for n, x in hists.items():
-            out._content[n] = Hist._copycontent(x._content)
+            out._content[n] = Hist._copycontent(x._growcontent(x._content, fixed))
+        if out._compensated:
+            out._compensation = dict((n, Hist._copycontent(x._growcontent(x._residuals(), fixed))) for n, x in hists.items())
         return out
 
     def togroup(**hists):
@@ -41,6 +41,14 @@ class CallGraphNode(object):
         self.requires = set()
         self.requiredby = set()
         self.numrequiredby = 0
+
+    # the requires/requiredby links are cyclic and only needed while compiling; they're rebuilt by grow
+    def __getstate__(self):
+        return {"goal": self.goal}
+
+    def __setstate__(self, state):
+        self.goal = state["goal"]
+        self.clear()
         
     def __repr__(self):
         return "<CallGraphNode for {0}>".format(repr(str(self.goal)))
@@ -305,6 +313,17 @@ class Export(Instruction):
     def __str__(self):
         return "export {0} as {1}".format(self.name, repr(str(self.goal)))
 
+class Compress(Instruction):
+    def __init__(self, name, goal):
+        self.name = name
+        self.goal = goal
+
+    def __repr__(self):
+        return "Compress({0}, {1})".format(repr(self.name), repr(str(self.goal)))
+
+    def __str__(self):
+        return "keep only entries where {0} ({1})".format(self.name, repr(str(self.goal)))
+
 class Delete(Instruction):
     def __init__(self, name):
         self.name = name
@@ -315,7 +334,7 @@ class Delete(Instruction):
     def __str__(self):
         return "delete {0}".format(self.name)
 
-def instructions(sources, goals):
+def instructions(sources, goals, selection=None):
     live = {}
     names = {}
     namenum = [0]
@@ -326,6 +345,24 @@ def instructions(sources, goals):
         return name
 
     nodes = list(walkdown(sources))
+
+    # a selection shared by everything being filled is computed first, so that nothing else is computed for failing entries
+    numbefore = 0
+    if selection is not None:
+        for x in goals:
+            if x == selection:
+                selection = x
+        required = set()
+        def recurse(node):
+            if node not in required:
+                required.add(node)
+                for x in node.requires:
+                    recurse(x)
+        recurse(selection)
+        nodes = [x for x in nodes if x in required] + [x for x in nodes if x not in required]
+        numbefore = len(required)
+
+    exports = []
     for i, node in enumerate(nodes):
         if isinstance(node.goal, histbook.expr.Const):
             pass
@@ -344,11 +381,19 @@ def instructions(sources, goals):
             raise NotImplementedError
 
         if node in goals:
-            yield Export(name, node.goal)
+            exports.append(Export(name, node.goal))
+
+        # exports before the selection wait until after it, so that they're compressed too
+        if i + 1 == numbefore:
+            yield Compress(names[selection.goal], selection.goal)
+        if i + 1 >= numbefore:
+            for x in exports:
+                yield x
+            del exports[:]
 
         dead = []
         for n, x in live.items():
-            if not any(x in nodes[j].requires for j in range(i + 1, len(nodes))):
+            if not any(x in nodes[j].requires for j in range(i + 1, len(nodes))) and not any(n == y.name for y in exports):
                 dead.append(n)
         for n in dead:
             del live[n]
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2018, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import collections
+import sys
+import threading
+import timeit
+
+class Profiler(object):
+    COLUMNS = ("kind", "step", "calls", "time", "bytes", "events")
+
+    def __init__(self):
+        self._records = collections.OrderedDict()
+
+    def __repr__(self):
+        return "<Profiler with {0} step{1}>".format(len(self._records), "" if len(self._records) == 1 else "s")
+
+    def __str__(self):
+        out = ["{0:>8s} {1:>12s} {2:>14s} {3:>12s}  {4}".format("calls", "time", "bytes", "events", "step")]
+        for record in self.report():
+            out.append("{0:>8d} {1:>12.6f} {2:>14s} {3:>12s}  {4}: {5}".format(record["calls"], record["time"], "" if record["bytes"] is None else str(record["bytes"]), "" if record["events"] is None else str(record["events"]), record["kind"], record["step"]))
+        return "\n".join(out)
+
+    def clear(self):
+        self._records.clear()
+
+    @staticmethod
+    def _traced():
+        # only someone who has imported tracemalloc can have started it
+        tracemalloc = sys.modules.get("tracemalloc", None)
+        if tracemalloc is not None and tracemalloc.is_tracing():
+            return tracemalloc.get_traced_memory()[0]
+        else:
+            return None
+
+    def start(self):
+        return timeit.default_timer(), self._traced()
+
+    def record(self, kind, step, start, nbytes, events):
+        stop = timeit.default_timer()
+        starttime, starttraced = start
+        if starttraced is not None:
+            # with tracemalloc running, report the net allocation of the step instead of the estimate
+            nbytes = max(0, self._traced() - starttraced)
+
+        key = (kind, step)
+        record = self._records.get(key, None)
+        if record is None:
+            record = self._records[key] = {"kind": kind, "step": step, "calls": 0, "time": 0.0, "bytes": None, "events": None}
+
+        record["calls"] += 1
+        record["time"] += stop - starttime
+        if nbytes is not None:
+            record["bytes"] = (record["bytes"] or 0) + nbytes
+        if events is not None:
+            record["events"] = (record["events"] or 0) + events
+
+    def report(self):
+        return [dict(x) for x in self._records.values()]
+
+    def pandas(self):
+        import pandas
+        return pandas.DataFrame(self.report(), columns=self.COLUMNS)
+
+class Metrics(object):
+    def __init__(self, hists=None):
+        self._lock = threading.Lock()
+        self._started = timeit.default_timer()
+        self._hists = hists
+        self.fills = 0
+        self.events = 0
+        self.inputbytes = 0
+        self.evaltime = 0.0
+        self.filltime = 0.0
+        self.contentbytes = 0
+
+    def __repr__(self):
+        return "<Metrics {0} events in {1} fills>".format(self.events, self.fills)
+
+    @property
+    def hists(self):
+        return self._hists
+
+    def _evaluated(self, inputbytes, seconds):
+        with self._lock:
+            self.inputbytes += inputbytes
+            self.evaltime += seconds
+
+    def _filled(self, events, seconds, contentbytes):
+        with self._lock:
+            self.fills += 1
+            self.events += events
+            self.filltime += seconds
+            self.contentbytes = contentbytes
+
+    def _merge(self, other):
+        # other is the asdict() of metrics collected elsewhere, such as in a dask partition
+        with self._lock:
+            self.fills += other["fills"]
+            self.events += other["events"]
+            self.inputbytes += other["inputbytes"]
+            self.evaltime += other["evaltime"]
+            self.filltime += other["filltime"]
+        if self._hists is not None:
+            for n, x in other.get("hists", {}).items():
+                if n in self._hists:
+                    self._hists[n]._merge(x)
+
+    def asdict(self):
+        with self._lock:
+            out = {"fills": self.fills,
+                   "events": self.events,
+                   "inputbytes": self.inputbytes,
+                   "contentbytes": self.contentbytes,
+                   "evaltime": self.evaltime,
+                   "filltime": self.filltime,
+                   "walltime": timeit.default_timer() - self._started}
+
+        busy = out["evaltime"] + out["filltime"]
+        out["eventrate"] = out["events"] / busy if busy > 0 else 0.0
+        out["byterate"] = out["inputbytes"] / busy if busy > 0 else 0.0
+        if self._hists is not None:
+            out["hists"] = collections.OrderedDict((n, x.asdict()) for n, x in list(self._hists.items()))
+        return out
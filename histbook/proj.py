@@ -66,6 +66,12 @@ class AxisTuple(tuple):
     def intbin(self, expr, **kwargs):
         return self._findbyclass(expr, histbook.axis.intbin, kwargs)
 
+    def growbin(self, expr, **kwargs):
+        return self._findbyclass(expr, histbook.axis.growbin, kwargs)
+
+    def growintbin(self, expr, **kwargs):
+        return self._findbyclass(expr, histbook.axis.growintbin, kwargs)
+
     def split(self, expr, **kwargs):
         return self._findbyclass(expr, histbook.axis.split, kwargs)
 
@@ -75,6 +81,9 @@ class AxisTuple(tuple):
     def profile(self, expr, **kwargs):
         return self._findbyclass(expr, histbook.axis.profile, kwargs)
 
+    def quantile(self, expr, **kwargs):
+        return self._findbyclass(expr, histbook.axis.quantile, kwargs)
+
 class Projectable(object):
     @property
     def axis(self):
@@ -103,7 +112,7 @@ class Projectable(object):
             newaxis, newcontent = axis._rebinsplit(edges, self._content, index - len(self._group))
 
         outaxis = [newaxis if i == index else x for i, x in enumerate(self._group + self._fixed + self._profile)]
-        out = self.__class__(*outaxis, weight=self._weight, defs=self._defs)
+        out = self.__class__(*outaxis, **self._opts())
         out._content = newcontent
         return out
 
@@ -126,12 +135,12 @@ class Projectable(object):
             raise IndexError("no such rebinnable axis: {0}".format(axis))
 
         if isinstance(axis, histbook.axis.GroupAxis):
-            newaxis, newcontent = axis._rebinsplit(factor, self._content, index)
+            newaxis, newcontent = axis._rebinfactor(factor, self._content, index)
         else:
-            newaxis, newcontent = axis._rebinsplit(factor, self._content, index - len(self._group))
+            newaxis, newcontent = axis._rebinfactor(factor, self._content, index - len(self._group))
 
         outaxis = [newaxis if i == index else x for i, x in enumerate(self._group + self._fixed + self._profile)]
-        out = self.__class__(*outaxis, weight=self._weight, defs=self._defs)
+        out = self.__class__(*outaxis, **self._opts())
         out._content = newcontent
         return out
 
@@ -143,15 +152,22 @@ class Projectable(object):
 
         axis = []
         index = []
-        for i, prof in enumerate(self._profile):
+        for prof in self._profile:
             if prof not in profile:
                 axis.append(prof)
-                index.append(i)
+                index.append(prof._sumwxindex)
+                index.append(prof._sumwx2index)
+                if isinstance(prof, histbook.axis.quantile):
+                    index.extend(range(prof._sketchindex, prof._sketchindex + prof.numbuckets))
 
+        profileindex = list(index)
         index.append(self._sumwindex)
         if self._weight is not None:
             index.append(self._sumw2index)
 
+        for name, parsed, label, offset in self._variations:
+            index.extend([offset + i for i in profileindex] + [offset + self._sumwindex, offset + self._sumwindex + 1])
+
         slc = (slice(None),) * (len(self._shape) - 1) + (index,)
 
         def dropcontent(content):
@@ -160,7 +176,7 @@ class Projectable(object):
             else:
                 return content[slc]
 
-        out = self.__class__(*(self._group + self._fixed + tuple(axis)), weight=self._weight, defs=self._defs)
+        out = self.__class__(*[x.relabel(x._original) for x in self._group + self._fixed + tuple(axis)], **self._opts())
         if self._content is not None:
             out._content = dropcontent(self._content)
         return out
@@ -188,16 +204,11 @@ class Projectable(object):
 
         def addall(values):
             assert len(values) != 0
+            if len(values) == 1:
+                return values[0]
             left = values[:len(values) // 2]
             right = values[len(values) // 2:]
-            if len(left) == 0:
-                return right
-            elif len(right) == 0:
-                return left
-            elif len(left) == 1 and len(right) == 1:
-                return addany(left[0], right[0])
-            else:
-                return addall([addall(left)] + [addall(right)])
+            return addany(addall(left), addall(right))
             
         def projcontent(j, content):
             if j < len(self._group):
@@ -209,7 +220,7 @@ class Projectable(object):
                 return projarray(content)
 
         outaxis = [x.relabel(x._original) for x in allaxis if x in axis] + [x.relabel(x._original) for x in self._profile]
-        out = self.__class__(*outaxis, weight=self._weight, defs=self._defs)
+        out = self.__class__(*outaxis, **self._opts())
         if self._content is not None:
             out._content = projcontent(0, self._content)
         return out
@@ -356,7 +367,7 @@ class Projectable(object):
         axis = [newaxis if x is cutaxis else x.relabel(x._original) for x in self._group + self._fixed + self._profile]
         if dropnull:
             axis = [x for x in axis if not isinstance(x, histbook.axis._nullaxis)]
-        out = self.__class__(*axis, weight=self._weight, defs=self._defs)
+        out = self.__class__(*axis, **self._opts())
         if self._content is not None:
             out._content = cutcontent(0, self._content)
         return out
@@ -365,6 +376,11 @@ class Projectable(object):
         count = opts.pop("count", True)
         effcount = opts.pop("effcount", False)
         error = opts.pop("error", True)
+        quantiles = opts.pop("quantiles", (0.5,))
+        if isinstance(quantiles, (numbers.Real, numpy.floating)):
+            quantiles = (quantiles,)
+        if any(not 0 <= q <= 1 for q in quantiles):
+            raise ValueError("quantiles must be between 0 and 1")
         recarray = opts.pop("recarray", True)
         if len(opts) > 0:
             raise TypeError("unrecognized options for Hist.table: {0}".format(" ".join(opts)))
@@ -392,11 +408,14 @@ class Projectable(object):
             columns.append(str(prof.expr))
             if error:
                 columns.append("err({0})".format(str(prof.expr)))
+            if isinstance(prof, histbook.axis.quantile):
+                for q in quantiles:
+                    columns.append("quantile({0}, {1})".format(str(prof.expr), q))
 
         def handlearray(content):
             content = content.reshape((-1, self._shape[-1]))
 
-            out = numpy.zeros((content.shape[0], len(columns)), dtype=content.dtype)
+            out = numpy.zeros((content.shape[0], len(columns)), dtype=numpy.result_type(content.dtype, numpy.float32))
             outindex = 0
 
             sumw = content[:, self._sumwindex]
@@ -428,9 +447,13 @@ class Projectable(object):
                 if error:
                     out[good, outindex] = numpy.sqrt(((content[good, prof._sumwx2index] / sumw) - numpy.square(out[good, outindex - 1])) / effcnt)
                     outindex += 1
+                if isinstance(prof, histbook.axis.quantile):
+                    for q in quantiles:
+                        out[good, outindex] = prof._quantile(content[good, prof._sketchindex : prof._sketchindex + prof.numbuckets], q)
+                        outindex += 1
 
             if recarray:
-                return out.view([(x, content.dtype) for x in columns]).reshape(self._shape[:-1])
+                return out.view([(x, out.dtype) for x in columns]).reshape(self._shape[:-1])
             else:
                 return out.reshape(self._shape[:-1] + (outindex,))
 
@@ -0,0 +1,97 @@
+
+# Copyright (c) 2018, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# chunked readers of local columnar files that only touch the requested fields (Fillable.fields)
+
+import os.path
+
+import numpy
+
+def _missing(field, path):
+    return ValueError("required field {0} not found in {1}".format(repr(field), repr(path)))
+
+def _chunks(path, columns, chunksize):
+    length = None
+    for n, x in columns.items():
+        if length is None:
+            length = len(x)
+        elif length != len(x):
+            raise ValueError("column {0} in {1} has len {2} but other columns have len {3}".format(repr(n), repr(path), len(x), length))
+
+    if length is None:
+        return
+    if chunksize is None:
+        chunksize = max(length, 1)
+    for start in range(0, length, chunksize):
+        yield dict((n, x[start : start + chunksize]) for n, x in columns.items())
+
+def npydir(path, fields, chunksize=None):
+    # memory-mapped, so only the pages that are filled get read
+    columns = {}
+    for n in fields:
+        filename = os.path.join(path, n + ".npy")
+        if not os.path.exists(filename):
+            raise _missing(n, path)
+        columns[n] = numpy.load(filename, mmap_mode="r")
+    return _chunks(path, columns, chunksize)
+
+def npz(path, fields, chunksize=None):
+    # zip members can't be memory-mapped, but members for other fields are never decompressed
+    with numpy.load(path) as file:
+        columns = {}
+        for n in fields:
+            if n not in file.files:
+                raise _missing(n, path)
+            columns[n] = file[n]
+    return _chunks(path, columns, chunksize)
+
+def parquet(path, fields, chunksize=None):
+    # one chunk per row group unless a chunksize is given; other columns are never read
+    import pyarrow.parquet
+    file = pyarrow.parquet.ParquetFile(path)
+    for n in fields:
+        if n not in file.schema_arrow.names:
+            raise _missing(n, path)
+    fields = list(fields)
+    if chunksize is None:
+        for i in range(file.num_row_groups):
+            yield file.read_row_group(i, columns=fields)
+    else:
+        for batch in file.iter_batches(batch_size=chunksize, columns=fields):
+            yield batch
+
+def iterate(path, fields, chunksize=None):
+    if os.path.isdir(path):
+        return npydir(path, fields, chunksize=chunksize)
+    elif path.endswith(".npz"):
+        return npz(path, fields, chunksize=chunksize)
+    elif path.endswith(".parquet") or path.endswith(".parq"):
+        return parquet(path, fields, chunksize=chunksize)
+    else:
+        raise ValueError("unrecognized columnar file (expecting a directory of .npy files, a .npz file, or a .parquet file): {0}".format(repr(path)))
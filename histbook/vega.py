@@ -28,11 +28,14 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import collections
+import json
 import numbers
 
 import numpy
 
 import histbook.axis
+import histbook.export
 
 class Channel(object):
     def __init__(self, axis):
@@ -196,7 +199,54 @@ class PlottingChain(object):
             raise NotImplementedError("error bars are currently incompatible with splitting beside or below")
         return Plotable(self, MarkerChannel(self._asaxis(self._singleaxis(axis)), self._asaxis(profile), error, width, height, title, config, xscale, yscale, colorscale, shapescale))
 
-class Plotable(object):
+def _rows(columnsets):
+    for columns in columnsets:
+        names = list(columns)
+        for row in zip(*columns.values()):
+            yield dict(zip(names, row))
+
+class Renderable(object):
+    def vegalite(self, maxbins=None):
+        spec, columnsets = self._spec(maxbins)
+        spec["data"] = {"values": list(_rows(columnsets))}
+        return spec
+
+    def tojson(self, file=None, maxbins=None, batchsize=1024):
+        spec, columnsets = self._spec(maxbins)
+
+        # the spec is small; only the data values are streamed, in batches of rows
+        marker = "histbook-data-values"
+        spec["data"] = {"values": marker}
+        head, tail = json.dumps(spec).split(json.dumps(marker), 1)
+
+        def chunks():
+            yield head + "["
+            batch = []
+            first = True
+            for row in _rows(columnsets):
+                batch.append(row)
+                if len(batch) == batchsize:
+                    yield ("" if first else ", ") + json.dumps(batch)[1:-1]
+                    batch = []
+                    first = False
+            if len(batch) > 0:
+                yield ("" if first else ", ") + json.dumps(batch)[1:-1]
+            yield "]" + tail
+
+        if file is None:
+            return "".join(chunks())
+        elif hasattr(file, "write"):
+            for chunk in chunks():
+                file.write(chunk)
+        else:
+            with open(file, "w") as f:
+                for chunk in chunks():
+                    f.write(chunk)
+
+    def to(self, fcn):
+        return fcn(self.vegalite())
+
+class Plotable(Renderable):
     def __init__(self, source, item):
         if isinstance(source, PlottingChain):
             self._source = source._source
@@ -215,7 +265,7 @@ class Plotable(object):
     def _last(self):
         return self._chain[-1]
 
-    def _data(self, prefix, varname):
+    def _data(self, prefix, varname, maxbins=None):
         error = self._last.error
         baseline = isinstance(self._last, (StepChannel, AreaChannel))
         if isinstance(self._last.axis, (histbook.axis.bin, histbook.axis.intbin, histbook.axis.split)):
@@ -233,68 +283,113 @@ class Plotable(object):
             profiles = (profile,)
 
         projected = self._source.project(*(x.axis for x in self._chain))
-        table = projected.table(*profiles, count=(profile is None), error=error, recarray=False)
 
         projectedorder = [x for x in projected.axis if not isinstance(x, histbook.axis.ProfileAxis)]
         lastj = projectedorder.index(self._last.axis)
 
-        data = []
-        domains = {}
-        if error and baseline:
-            shifts = {}
-
-        def recurse(j, content, row, base):
-            if j == len(projectedorder):
-                if base:
-                    row = row + ((0.0, 0.0) if error else (0.0,))
-                else:
-                    row = row + tuple(float(x) for x in content)
+        # rebin to screen resolution; the original axis still labels the plot
+        if maxbins is not None and isinstance(projectedorder[lastj], histbook.axis.FixedAxis) and isinstance(projectedorder[lastj], histbook.axis.RebinFactor):
+            numbins = projectedorder[lastj].numbins
+            if numbins > maxbins:
+                projected = projected.rebinby(projectedorder[lastj], int(numpy.ceil(float(numbins) / float(maxbins))))
+        binorder = [x for x in projected.axis if not isinstance(x, histbook.axis.ProfileAxis)]
 
-                datum = dict(prefix + tuple(zip([varname + str(i) for i in range(len(row))], row)))
-                if datum[varname + str(j)] > 0 or (self._last.yscale != "log" and not (isinstance(self._last.yscale, dict) and self._last.yscale.get("type", None) == "log")):
-                    data.append(datum)
+        table = projected.table(*profiles, count=(profile is None), error=error, quantiles=(), recarray=False)
+        logscale = self._last.yscale == "log" or (isinstance(self._last.yscale, dict) and self._last.yscale.get("type", None) == "log")
 
-            else:
-                axis = projectedorder[j]
-                if axis not in domains:
-                    domains[axis] = set()
-                domains[axis].update(axis.keys(content))
+        domains = {}
+        groupaxis = [x for x in binorder if isinstance(x, histbook.axis.GroupAxis)]
+        fixedaxis = [x for x in binorder if not isinstance(x, histbook.axis.GroupAxis)]
+
+        # each fixed axis contributes a list of rows (bin index, label, baseline flag, error-bar position) computed once
+        fixedrows = []
+        for j, axis in enumerate(fixedaxis, len(groupaxis)):
+            domains[projectedorder[j]] = set(axis.keys())
+            if isinstance(axis, histbook.axis.intbin):
+                axis = axis.bin()
+
+            index, label, base, center = [], [], [], []
+            def add(i, x, isbase, c):
+                index.append(i)
+                label.append(x)
+                base.append(isbase)
+                center.append(c)
+
+            for i, n in enumerate(axis.keys()):
+                if isinstance(n, histbook.axis.Interval):
+                    if j == lastj and xtype == "quantitative":
+                        if numpy.isfinite(n.low) and numpy.isfinite(n.high):
+                            low = n.low
+                            if baseline and isinstance(axis, (histbook.axis.bin, histbook.axis.split)) and n.low == axis.low:
+                                add(i, n.low, True, n.low)
+                                low += 1e-10*(axis.high - axis.low)
+
+                            add(i, low, False, 0.5*(n.low + n.high))
+
+                            if baseline and isinstance(axis, (histbook.axis.bin, histbook.axis.split)) and n.high == axis.high:
+                                add(i, n.high, True, n.high)
 
-                if isinstance(axis, histbook.axis.intbin):
-                    axis = axis.bin()
+                    else:
+                        add(i, str(n), False, str(n))
 
-                for i, (n, x) in enumerate(axis.items(content)):
-                    if isinstance(n, histbook.axis.Interval):
-                        if j == lastj and xtype == "quantitative":
-                            if numpy.isfinite(n.low) and numpy.isfinite(n.high):
-                                low = n.low
-                                if baseline and isinstance(axis, (histbook.axis.bin, histbook.axis.split)) and n.low == axis.low:
-                                    recurse(j + 1, x, row + (n.low,), True)
-                                    low += 1e-10*(axis.high - axis.low)
+                elif isinstance(n, (bool, numpy.bool_, numpy.bool)):
+                    add(i, "pass" if n else "fail", False, "pass" if n else "fail")
 
-                                recurse(j + 1, x, row + (low,), base)
+                else:
+                    add(i, str(n), False, str(n))
 
-                                if error and baseline:
-                                    shifts[low] = 0.5*(n.low + n.high)
+            labels = numpy.empty(len(label), dtype=object)
+            labels[:] = label
+            centers = numpy.empty(len(center), dtype=object)
+            centers[:] = center
+            fixedrows.append((numpy.array(index, dtype=numpy.int64), labels, numpy.array(base, dtype=numpy.bool_), centers))
 
-                                if baseline and isinstance(axis, (histbook.axis.bin, histbook.axis.split)) and n.high == axis.high:
-                                    recurse(j + 1, x, row + (n.high,), True)
+        if len(fixedrows) == 0:
+            grid = numpy.zeros((0, 1), dtype=numpy.int64)
+        else:
+            grid = numpy.indices([len(x[0]) for x in fixedrows]).reshape(len(fixedrows), -1)
+        isbase = numpy.zeros(grid.shape[1], dtype=numpy.bool_)
+        for (index, label, base, center), g in zip(fixedrows, grid):
+            isbase |= base[g]
 
-                        else:
-                            recurse(j + 1, x, row + (str(n),), base)
+        names = [n for n, x in prefix] + [varname + str(i) for i in range(len(binorder) + (2 if error else 1))]
+        columns = collections.OrderedDict((n, []) for n in names)
+        if error and baseline:
+            columns[varname + str(lastj) + "c"] = []
 
-                    elif isinstance(n, (bool, numpy.bool_, numpy.bool)):
-                        recurse(j + 1, x, row + ("pass" if n else "fail",), base)
+        for key, leaf in histbook.export._groupblocks(groupaxis, table):
+            values = numpy.asarray(leaf)[tuple(x[0][g] for x, g in zip(fixedrows, grid))].reshape(grid.shape[1], -1).astype(numpy.float64)
+            values[isbase] = 0.0
+            if logscale:
+                keep = values[:, 0] > 0
+            else:
+                keep = slice(None)
+            numrows = len(values[keep])
+
+            row = [x for n, x in prefix]
+            for axis, n in zip(groupaxis, key):
+                if isinstance(axis, histbook.axis.groupbin):
+                    n = histbook.axis.IntervalNaN() if n == "NaN" else histbook.axis.Interval(n, n + float(axis.binwidth), closedlow=axis.closedlow, closedhigh=(not axis.closedlow))
+                domains.setdefault(projectedorder[binorder.index(axis)], set()).add(n)
+                row.append(str(n))
+            for n, x in zip(names, row):
+                columns[n].extend([x] * numrows)
+
+            for j, ((index, label, base, center), g) in enumerate(zip(fixedrows, grid), len(prefix) + len(groupaxis)):
+                columns[names[j]].extend(label[g][keep].tolist())
+            for i in range(values.shape[1]):
+                columns[names[len(prefix) + len(binorder) + i]].extend(values[keep, i].tolist())
 
-                    else:
-                        recurse(j + 1, x, row + (str(n),), base)
+            if error and baseline:
+                if lastj < len(groupaxis):
+                    columns[varname + str(lastj) + "c"].extend([row[len(prefix) + lastj]] * numrows)
+                else:
+                    columns[varname + str(lastj) + "c"].extend(fixedrows[lastj - len(groupaxis)][3][grid[lastj - len(groupaxis)]][keep].tolist())
 
-        recurse(0, table, (), False)
-        if error and baseline:
-            for x in data:
-                x[varname + str(lastj) + "c"] = shifts.get(x[varname + str(lastj)], x[varname + str(lastj)])
+        for axis in projectedorder:
+            domains.setdefault(axis, set())
 
-        return projectedorder, data, domains
+        return projectedorder, columns, domains
 
     def _vegalite(self, axis, domains, varname):
         error = self._last.error
@@ -408,8 +503,8 @@ class Plotable(object):
 
             return [mark, "rule"], [encoding, encoding2], [transform, transform2]
         
-    def vegalite(self):
-        axis, data, domains = self._data((), "a")
+    def _spec(self, maxbins):
+        axis, data, domains = self._data((), "a", maxbins)
         marks, encodings, transforms = self._vegalite(axis, domains, "a")
 
         if len(marks) == 1:
@@ -418,10 +513,10 @@ class Plotable(object):
                     "height": self._last.height,
                     "title": self._last.title,
                     "config": self._last.config,
-                    "data": {"values": data},
+                    "data": None,
                     "mark": marks[0],
                     "encoding": encodings[0],
-                    "transform": transforms[0]}
+                    "transform": transforms[0]}, [data]
 
         else:
             return {"$schema": "https://vega.github.io/schema/vega-lite/v2.json",
@@ -429,13 +524,10 @@ class Plotable(object):
                     "height": self._last.height,
                     "title": self._last.title,
                     "config": self._last.config,
-                    "data": {"values": data},
-                    "layer": [{"mark": m, "encoding": e, "transform": t} for m, e, t in zip(marks, encodings, transforms)]}
+                    "data": None,
+                    "layer": [{"mark": m, "encoding": e, "transform": t} for m, e, t in zip(marks, encodings, transforms)]}, [data]
 
-    def to(self, fcn):
-        return fcn(self.vegalite())
-
-class Combination(object):
+class Combination(Renderable):
     def __init__(self, *plotables):
         self._plotables = []
         for arg in plotables:           # first level: for varargs
@@ -462,23 +554,24 @@ class Combination(object):
             i //= 26
         return "".join(reversed(out))
 
-    def to(self, fcn):
-        return fcn(self.vegalite())
-
-class overlay(Combination):
-    def vegalite(self):
+    def _alldata(self, maxbins):
         allaxis = []
         alldata = []
         alldomains = []
         for i, plotable in enumerate(self._plotables):
             varname = self._varname(i)
-            axis, data, domains = plotable._data((("id", varname),), varname)
+            axis, data, domains = plotable._data((("id", varname),), varname, maxbins)
             allaxis.append(axis)
-            alldata.extend(data)
+            alldata.append(data)
             alldomains.append(domains)
+        return allaxis, alldata, alldomains
+
+class overlay(Combination):
+    def _spec(self, maxbins):
+        allaxis, alldata, alldomains = self._alldata(maxbins)
 
         out = {"$schema": "https://vega.github.io/schema/vega-lite/v2.json",
-               "data": {"values": alldata},
+               "data": None,
                "layer": []}
 
         for i, plotable in enumerate(self._plotables):
@@ -495,7 +588,7 @@ class overlay(Combination):
                 for m, e, t in zip(marks, encodings, transforms):
                     out["layer"].append({"mark": m, "encoding": e, "transform": t + thislayer})
 
-        return out
+        return out, alldata
 
 class beside(Combination):
     def __init__(self, *plotables):
@@ -503,19 +596,11 @@ class beside(Combination):
         if any(isinstance(x, BesideChannel) for x in self._plotables):
             raise TypeError("cannot place plots beside each other that are already split with beside (can do beside and below)")
 
-    def vegalite(self):
-        allaxis = []
-        alldata = []
-        alldomains = []
-        for i, plotable in enumerate(self._plotables):
-            varname = self._varname(i)
-            axis, data, domains = plotable._data((("id", varname),), varname)
-            allaxis.append(axis)
-            alldata.extend(data)
-            alldomains.append(domains)
+    def _spec(self, maxbins):
+        allaxis, alldata, alldomains = self._alldata(maxbins)
 
         out = {"$schema": "https://vega.github.io/schema/vega-lite/v2.json",
-               "data": {"values": alldata},
+               "data": None,
                "hconcat": []}
 
         for i, plotable in enumerate(self._plotables):
@@ -529,7 +614,7 @@ class beside(Combination):
             else:
                 out["hconcat"].append({"layer": [{"mark": m, "encoding": e, "transform": t} for m, e, t in zip(marks, encodings, transforms)]})
 
-        return out
+        return out, alldata
 
 class below(Combination):
     def __init__(self, *plotables):
@@ -537,19 +622,11 @@ class below(Combination):
         if any(isinstance(x, BelowChannel) for x in self._plotables):
             raise TypeError("cannot place plots below each other that are already split with below (can do beside and below)")
 
-    def vegalite(self):
-        allaxis = []
-        alldata = []
-        alldomains = []
-        for i, plotable in enumerate(self._plotables):
-            varname = self._varname(i)
-            axis, data, domains = plotable._data((("id", varname),), varname)
-            allaxis.append(axis)
-            alldata.extend(data)
-            alldomains.append(domains)
+    def _spec(self, maxbins):
+        allaxis, alldata, alldomains = self._alldata(maxbins)
 
         out = {"$schema": "https://vega.github.io/schema/vega-lite/v2.json",
-               "data": {"values": alldata},
+               "data": None,
                "vconcat": []}
 
         for i, plotable in enumerate(self._plotables):
@@ -563,4 +640,4 @@ class below(Combination):
             else:
                 out["vconcat"].append({"layer": [{"mark": m, "encoding": e, "transform": t} for m, e, t in zip(marks, encodings, transforms)]})
 
-        return out
+        return out, alldata
@@ -30,9 +30,19 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import os.path
+import sys
 
 from setuptools import find_packages
 from setuptools import setup
+from setuptools.command.build_py import build_py
+
+class build_py_skipping_async(build_py):
+    # histbook/aio.py uses async/await syntax, which cannot be byte-compiled before Python 3.5
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info < (3, 5):
+            modules = [x for x in modules if (x[0], x[1]) != ("histbook", "aio")]
+        return modules
 
 def get_version():
     g = {}
@@ -52,7 +62,8 @@ See the `project homepage <https://github.com/diana-hep/histbook>`__ for a `tuto
 
 setup(name = "histbook",
       version = get_version(),
-      packages = find_packages(exclude = ["tests"]),
+      packages = find_packages(exclude = ["tests", "benchmarks"]),
+      cmdclass = {"build_py": build_py_skipping_async},
       scripts = [],
       data_files = ["README.rst"],
       description = "Versatile, high-performance histogram toolkit for Numpy.",
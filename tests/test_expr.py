@@ -28,6 +28,8 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import subprocess
+import sys
 import unittest
 
 from histbook.expr import *
@@ -247,3 +249,46 @@ class TestExpr(unittest.TestCase):
 
     def test_function(self):
         self.assertEqual(Expr.parse("sqrt(x)"), Call("sqrt", Name("x")))
+
+    def test_lazyimport(self):
+        modules = subprocess.check_output([sys.executable, "-c", "import sys, histbook; histbook.Hist(histbook.bin('x', 10, 0, 1)).fill(x=[0.5]); print(' '.join(sys.modules))"]).decode().split()
+        self.assertNotIn("meta", modules)
+        self.assertNotIn("pandas", modules)
+        self.assertNotIn("tracemalloc", modules)
+
+    def test_parsecache(self):
+        self.assertTrue(Expr.parse("x + y*2") is Expr.parse("x + y*2"))
+        self.assertEqual(Expr.parse("x + y*2", returnlabel=True), (Expr.parse("x + y*2"), "x + y*2"))
+        self.assertEqual(Expr.parse("x + a", defs={"a": 1}), Expr.parse("x + 1"))
+        self.assertEqual(Expr.parse("x + a", defs={"a": 2}), Expr.parse("x + 2"))
+        self.assertEqual(Expr.parse("x + a", defs={"a": "y"}), Expr.parse("x + y"))
+        self.assertEqual(Expr.parse("x + a", defs={"a": Expr.parse("z")}), Expr.parse("x + z"))
+
+        size = Expr.parsecachesize
+        try:
+            Expr.parsecachesize = 10
+            for i in range(20):
+                Expr.parse("x + {0}".format(i))
+            self.assertEqual(len(Expr._parsecache), 10)
+        finally:
+            Expr.parsecachesize = size
+
+    def test_interning(self):
+        import copy
+        import pickle
+        self.assertTrue(Name("x") is Name("x"))
+        self.assertTrue(Call("sqrt", Name("x")) is Call("sqrt", Name("x")))
+        self.assertTrue(Expr.parse("x + y > 3 and z") is Expr.parse("z and y + x > 3"))
+        self.assertTrue(Const(set([1, 2])) is Const(set([2, 1])))
+
+        # numerically equal constants are equal, but keep their own types for calculation
+        self.assertEqual(Const(1), Const(1.0))
+        self.assertEqual(hash(Const(1)), hash(Const(1.0)))
+        self.assertFalse(Const(1) is Const(1.0))
+        self.assertTrue(isinstance(Call("numpy.add", Name("x"), Const(1)).args[1].value, int))
+        self.assertTrue(isinstance(Call("numpy.add", Name("x"), Const(1.0)).args[1].value, float))
+
+        expr = Expr.parse("sqrt(x**2 + y**2) > 3 and z in {1, 2}")
+        self.assertTrue(pickle.loads(pickle.dumps(expr)) is expr)
+        self.assertTrue(copy.deepcopy(expr) is expr)
+        self.assertRaises(AttributeError, lambda: setattr(Name("x"), "value", "y"))
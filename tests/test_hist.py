@@ -28,12 +28,21 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import json
+import os.path
+import pickle
+import sys
+import tempfile
 import unittest
 
 import numpy
 
+import histbook.calc
+import histbook.expr
+import histbook.instr
 from histbook.axis import *
 from histbook.hist import *
+from histbook.vega import *
 
 class TestHist(unittest.TestCase):
     def runTest(self):
@@ -420,3 +429,687 @@ class TestHist(unittest.TestCase):
         b.fill(x=[1, 1, 1, 2, 2], y=[1, 1, 1, 2, 2])
         self.assertEqual(b["one"]._content.tolist(), [[3], [2]])
         self.assertEqual(b["two"]._content.tolist(), [[3], [2]])
+
+    def test_dtype(self):
+        h = Hist(bin("x * 2", 10, 0, 1), weight="w", dtype=numpy.float32)
+        h.fill(x=numpy.array([0.05, 0.1, 0.15, 0.3], dtype=numpy.float32), w=numpy.array([1, 2, 3, 4], dtype=numpy.float32))
+        self.assertEqual(h._content.dtype, numpy.dtype(numpy.float32))
+        self.assertEqual(h._content[:, 0].tolist(), [0, 0, 1, 2, 3, 0, 0, 4, 0, 0, 0, 0, 0])
+        self.assertEqual(h.project(h.axis[0])._content.dtype, numpy.dtype(numpy.float32))
+
+        h = Hist(bin("x", 2, 0, 2), dtype=numpy.int64)
+        h.fill(x=[0.5, 1.5, 1.5])
+        self.assertEqual(h._content.dtype, numpy.dtype(numpy.int64))
+        self.assertEqual(h.table()["err(count())"].tolist(), [0.0, 1.0, numpy.sqrt(2), 0.0, 0.0])
+
+        self.assertRaises(ValueError, lambda: Hist(bin("x", 2, 0, 2), weight="w", dtype=numpy.int64))
+        self.assertRaises(TypeError, lambda: Hist(bin("x", 2, 0, 2), dtype=numpy.bool_))
+
+    def test_compensated(self):
+        random = numpy.random.RandomState(12345)
+        x = random.uniform(0, 1, 100000)
+        w = random.uniform(0, 1, 100000)
+        exact = Hist(bin("x", 2, 0, 1), weight="w")
+        plain = Hist(bin("x", 2, 0, 1), weight="w", dtype=numpy.float32)
+        h = Hist(bin("x", 2, 0, 1), weight="w", compensated=True)
+        for i in range(100):
+            for hist in exact, plain, h:
+                hist.fill(x=x, w=w)
+        self.assertEqual(h._content.dtype, numpy.dtype(numpy.float32))
+        self.assertEqual(h._contentbytes(), plain._contentbytes() * 2)
+        error = abs(h._content[1, 0] + numpy.float64(h._compensation[1, 0]) - exact._content[1, 0])
+        self.assertTrue(error < 1e-6 * abs(plain._content[1, 0] - exact._content[1, 0]))
+        self.assertEqual(h._content[1, 0], numpy.float32(exact._content[1, 0]))
+
+        total = h + h
+        self.assertTrue(numpy.allclose(total._content + total._compensation.astype(numpy.float64), 2 * exact._content, rtol=1e-12, atol=0))
+        total = Hist(bin("x", 2, 0, 1), weight="w")
+        total += h
+        self.assertTrue(numpy.allclose(total._content, exact._content, rtol=1e-12, atol=0))
+        total = Hist(bin("x", 2, 0, 1), weight="w") + h
+        self.assertEqual(total._content.dtype, numpy.dtype(numpy.float64))
+        self.assertTrue(numpy.allclose(total._content, exact._content, rtol=1e-12, atol=0))
+        total = exact + h
+        self.assertTrue(numpy.allclose(total._content, 2 * exact._content, rtol=1e-12, atol=0))
+        total = h + exact
+        self.assertTrue(numpy.allclose(total._content + total._compensation.astype(numpy.float64), 2 * exact._content, rtol=1e-12, atol=0))
+        self.assertTrue(h.copy()._compensation is not h._compensation)
+        self.assertEqual(h.project()._content.dtype, numpy.dtype(numpy.float32))
+        self.assertEqual(Hist.fromarrow(h.arrow())._compensated, True)
+
+        sparse = Hist(bin("x", 1000, 0, 1), weight="w", compensated=True)
+        exact = Hist(bin("x", 1000, 0, 1), weight="w")
+        for i in range(1000):
+            for hist in exact, sparse:
+                hist.fill(x=x[i:i + 1] * 0.01, w=w[i:i + 1] * 1e-3 + 1e4)
+        self.assertTrue(numpy.allclose(sparse._content + sparse._compensation.astype(numpy.float64), exact._content, rtol=1e-12, atol=0))
+        self.assertEqual(sparse._content.tolist(), exact._content.astype(numpy.float32).tolist())
+
+        h = Hist(groupby("c"), bin("x", 2, 0, 1), compensated=True)
+        h.fill(c=[1, 2, 2], x=[0.1, 0.2, 0.9])
+        h.fill(c=[3], x=[0.6])
+        self.assertEqual(sorted(h._compensation), [1, 2, 3])
+        self.assertEqual(h._content[2][:, 0].tolist(), [0, 1, 1, 0, 0])
+
+        self.assertRaises(ValueError, lambda: Hist(bin("x", 2, 0, 2), dtype=numpy.float64, compensated=True))
+        self.assertRaises(ValueError, lambda: Hist(bin("x", 2, 0, 2), dtype=numpy.int32, compensated=True))
+
+    def test_variations(self):
+        x = numpy.array([0.5, 1.5, 1.5, 0.2])
+        y = numpy.array([1.0, 2.0, 3.0, 4.0])
+        w = numpy.array([1.0, 2.0, 3.0, 4.0])
+        up = numpy.array([1.1, 1.2, numpy.nan, 1.0])
+        h = Hist(bin("x", 2, 0, 2, underflow=False, overflow=False, nanflow=False), profile("y"), weight="w", weights={"up": "w*up", "double": 2})
+        h.fill(x=x, y=y, w=w, up=up)
+        self.assertEqual(h.variations, ("double", "up"))
+        self.assertEqual(h.shape, (2, 12))
+        self.assertEqual(h.table("y")["count()"].tolist(), [5.0, 5.0])
+
+        expected = Hist(bin("x", 2, 0, 2, underflow=False, overflow=False, nanflow=False), profile("y"), weight="w*up")
+        expected.fill(x=x[[0, 1, 3]], y=y[[0, 1, 3]], w=w[[0, 1, 3]], up=up[[0, 1, 3]])
+        self.assertTrue(numpy.allclose(h.variation("up")._content, expected._content))
+        self.assertEqual(h.variation("double").table("y")["count()"].tolist(), [4.0, 4.0])
+        self.assertTrue(numpy.allclose(h.project().variation("up")._content, expected.project()._content))
+        self.assertTrue(numpy.allclose(h.select("x < 1").variation("up")._content, expected.select("x < 1")._content))
+        self.assertTrue(numpy.allclose(h.drop("y").variation("up")._content, expected.drop("y")._content))
+        self.assertTrue(numpy.allclose((h + h).variation("up")._content, 2 * expected._content))
+        self.assertTrue(numpy.allclose(Hist.fromarrow(h.arrow()).variation("up")._content, expected._content))
+        self.assertRaises(IndexError, lambda: h.variation("down"))
+        self.assertRaises(TypeError, lambda: h + Hist(bin("x", 2, 0, 2, underflow=False, overflow=False, nanflow=False), profile("y"), weight="w"))
+
+        nominal = numpy.array([1.0, numpy.nan, 3.0, 4.0])
+        h = Hist(bin("x", 2, 0, 2, underflow=False, overflow=False, nanflow=False), profile("y"), weight="w", weights={"alt": "v", "flat": 1})
+        h.fill(x=x, y=y, w=nominal, v=w)
+        expected = Hist(bin("x", 2, 0, 2, underflow=False, overflow=False, nanflow=False), profile("y"), weight="w")
+        expected.fill(x=x[[0, 2, 3]], y=y[[0, 2, 3]], w=nominal[[0, 2, 3]])
+        self.assertEqual(h._content[:, :expected._shape[-1]].tolist(), expected._content.tolist())
+        expected = Hist(bin("x", 2, 0, 2, underflow=False, overflow=False, nanflow=False), profile("y"), weight="w")
+        expected.fill(x=x, y=y, w=w)
+        self.assertEqual(h.variation("alt")._content.tolist(), expected._content.tolist())
+        self.assertEqual(h.variation("flat").table("y")["count()"].tolist(), [2.0, 2.0])
+
+        h = Hist(groupby("c"), quantile("y"), weights={"w": "w"}, filter="y > 1")
+        h.fill(c=[1, 1, 2, 2], y=y, w=w)
+        expected = Hist(groupby("c"), quantile("y"), weight="w", filter="y > 1")
+        expected.fill(c=[1, 1, 2, 2], y=y, w=w)
+        self.assertEqual(h.table("y")[1]["count()"], 1)
+        self.assertEqual(h.variation("w")._content[1].tolist(), expected._content[1].tolist())
+        self.assertEqual(h.variation("w")._content[2].tolist(), expected._content[2].tolist())
+
+    def test_intcounts(self):
+        h = Hist(bin("x", 2, 0, 2))
+        h.fill(x=[0.5, 1.5, 1.5, numpy.nan])
+        self.assertEqual(h._content.dtype, numpy.dtype(numpy.int64))
+        self.assertEqual(h._content.tolist(), [[0], [1], [2], [0], [1]])
+        self.assertEqual(h.table()["count()"].dtype, numpy.dtype(numpy.float64))
+        self.assertEqual((h + h)._content.tolist(), [[0], [2], [4], [0], [2]])
+
+        self.assertEqual(Hist(bin("x", 2, 0, 2), weight="w")._contenttype, numpy.dtype(numpy.float64))
+        self.assertEqual(Hist(bin("x", 2, 0, 2), profile("y"))._contenttype, numpy.dtype(numpy.float64))
+
+        g = Hist(bin("x", 2, 0, 2), dtype=numpy.float64)
+        g.fill(x=[0.5])
+        h += g
+        self.assertEqual(h._content.dtype, numpy.dtype(numpy.float64))
+        self.assertEqual(h._content.tolist(), [[0], [2], [2], [0], [1]])
+        self.assertEqual(h._opts()["dtype"], "float64")
+        self.assertEqual(Hist(bin("x", 2, 0, 2), **h._opts())._contenttype, numpy.dtype(numpy.float64))
+        self.assertEqual((h + h).copy()._contenttype, numpy.dtype(numpy.float64))
+        self.assertEqual(Hist.group(a=h, b=h)._content["a"].dtype, numpy.dtype(numpy.float64))
+        self.assertEqual(h.select("x < 1")._content.dtype, numpy.dtype(numpy.float64))
+        self.assertEqual((Hist(bin("x", 2, 0, 2)) + g)._opts()["dtype"], "float64")
+        self.assertEqual((Hist(bin("x", 2, 0, 2), dtype=numpy.float64) + Hist(bin("x", 2, 0, 2)))._opts()["dtype"], numpy.float64)
+
+    def test_scalarweight(self):
+        h = Hist(bin("x", 2, 0, 2), weight=2)
+        h.fill(x=[0.5, 1.5, 1.5])
+        self.assertEqual(h._content.tolist(), [[0, 0], [2, 4], [4, 8], [0, 0], [0, 0]])
+
+        h = Hist(bin("x", 2, 0, 2, underflow=False), profile("y"))
+        h.fill(x=[0.5, 1.5, 1.5, -5], y=[1, 2, 3, 4])
+        self.assertEqual(h._content.tolist(), [[1, 1, 1], [5, 13, 2], [0, 0, 0], [0, 0, 0]])
+
+        h = Hist(groupby("c"), bin("x", 2, 0, 2), profile("3"), weight="w")
+        h.fill(c=[1, 1, 2, 2], x=[0.5, 1.5, 1.5, -5], w=[1, 2, 3, 4])
+        self.assertEqual(h._content[1].tolist(), [[0, 0, 0, 0], [3, 9, 1, 1], [6, 18, 2, 4], [0, 0, 0, 0], [0, 0, 0, 0]])
+        self.assertEqual(h._content[2].tolist(), [[12, 36, 4, 16], [0, 0, 0, 0], [9, 27, 3, 9], [0, 0, 0, 0], [0, 0, 0, 0]])
+
+    def test_nanweight(self):
+        h = Hist(bin("x", 2, 0, 2), profile("y"), weight="w")
+        h.fill(x=[0.5, 1.5, 1.5, numpy.nan], y=[1, 2, 3, 4], w=[1, numpy.nan, 2, 3])
+        self.assertEqual(h._content.tolist(), [[0, 0, 0, 0], [1, 1, 1, 1], [6, 18, 2, 4], [0, 0, 0, 0], [12, 48, 3, 9]])
+
+        h = Hist(weight="w")
+        h.fill(w=[1, numpy.nan, 2])
+        self.assertEqual(h._content.tolist(), [3, 5])
+
+        h = Hist(bin("x", 2, 0, 2), weight="w", checknan=False)
+        self.assertEqual(repr(h), "Hist(bin('x', 2, 0.0, 2.0), weight='w', checknan=False)")
+        h.fill(x=[0.5, 1.5], w=[1, numpy.nan])
+        self.assertTrue(numpy.isnan(h._content[2, 0]))
+        self.assertFalse(h.copy()._checknan)
+
+    def test_profiler(self):
+        book = Book(one=Hist(bin("x + y", 10, 0, 1)), two=Hist(bin("sqrt(x)", 10, 0, 1), weight="y"))
+        self.assertEqual(book.profiler, None)
+        profiler = book.startprofile()
+        book.fill(x=numpy.linspace(0, 1, 100), y=[1.0] * 100)
+        book.fill(x=numpy.linspace(0, 1, 50), y=numpy.ones(50))
+
+        report = profiler.report()
+        self.assertEqual(set(x["kind"] for x in report), set(["Param", "Assign", "Export", "Delete", "postfill"]))
+        self.assertEqual([x["step"] for x in report if x["kind"] == "postfill"], ["one", "two"])
+        self.assertTrue(all(x["calls"] == 2 and x["events"] == 150 and x["time"] >= 0 for x in report))
+        self.assertEqual([x["bytes"] for x in report if x["kind"] == "Param" and x["step"].endswith("'y' (external parameter)")], [800])
+
+        self.assertTrue(book.stopprofile() is profiler)
+        self.assertEqual(book.profiler, None)
+        book.fill(x=[0.5], y=[1.0])
+        self.assertEqual(len(profiler.report()), len(report))
+
+        h = Hist(bin("x", 10, 0, 1))
+        profiler = h.startprofile()
+        h.fill(x=[0.5])
+        self.assertEqual([x["step"] for x in profiler.report() if x["kind"] == "postfill"], [repr(h)])
+
+    def test_metrics(self):
+        h = Hist(bin("x", 10, 0, 1))
+        self.assertEqual(h.metrics, None)
+        metrics = h.startmetrics()
+        h.fill(x=numpy.linspace(0, 1, 100))
+        h.fill(x=numpy.linspace(0, 1, 50))
+        out = metrics.asdict()
+        self.assertEqual((out["fills"], out["events"], out["inputbytes"], out["contentbytes"]), (2, 150, 1200, 13 * 8))
+        self.assertTrue(out["eventrate"] > 0 and out["evaltime"] > 0 and out["filltime"] > 0)
+        self.assertTrue(h.stopmetrics() is metrics)
+        h.fill(x=[0.5])
+        self.assertEqual(metrics.events, 150)
+
+        book = Book(one=Hist(groupby("c"), bin("x", 10, 0, 1)))
+        metrics = book.startmetrics()
+        book["two"] = Hist(bin("x", 10, 0, 1), weight="x")
+        book.fill(x=numpy.linspace(0, 1, 100), c=numpy.arange(100) % 2)
+        out = metrics.asdict()
+        self.assertEqual((out["fills"], out["events"], out["inputbytes"]), (1, 100, 1600))
+        self.assertEqual(list(out["hists"]), ["one", "two"])
+        self.assertEqual(out["hists"]["one"]["contentbytes"], 2 * 13 * 8)
+        self.assertEqual(out["hists"]["two"]["contentbytes"], 13 * 2 * 8)
+        self.assertEqual(out["contentbytes"], 4 * 13 * 8)
+        self.assertEqual(out["hists"]["two"]["evaltime"], 0)
+        book.stopmetrics()
+        self.assertEqual(book["one"].metrics, None)
+
+        book = Book(one=Hist(bin("x", 10, 0, 1)))
+        metrics = book.startmetrics()
+        book.fill(x=[0.5])
+        book += Book(one=Hist(bin("x", 10, 0, 1), fill=[0.5]))
+        self.assertTrue(book["one"].metrics is metrics.hists["one"])
+        book.fill(x=[0.5, 0.5])
+        self.assertEqual((metrics.events, metrics.hists["one"].events), (3, 3))
+        del book["one"]
+        self.assertEqual(list(metrics.asdict()["hists"]), [])
+        book["one"] = Hist(bin("x", 10, 0, 1))
+        book.fill(x=[0.5])
+        self.assertEqual(metrics.hists["one"].events, 1)
+
+        h = Hist(bin("x", 10, 0, 1))
+        h.startmetrics()
+        self.assertEqual((h + h).metrics, None)
+
+    def test_axisedges(self):
+        import pickle
+        self.assertEqual(bin("x", 4, 0, 2).edges.tolist(), [0, 0.5, 1, 1.5, 2])
+        self.assertEqual(bin("x", 4, 0, 2).centers.tolist(), [0.25, 0.75, 1.25, 1.75])
+        self.assertEqual(bin("x", 4, 0, 2).widths.tolist(), [0.5, 0.5, 0.5, 0.5])
+        self.assertEqual(bin("x", 3, 0.1, 0.7).edges[-1], 0.7)
+        self.assertEqual(intbin("x", 2, 4).edges.tolist(), [1.5, 2.5, 3.5, 4.5])
+        self.assertEqual(intbin("x", 2, 4).centers.tolist(), [2, 3, 4])
+        self.assertEqual(intbin("x", 2, 4).widths.tolist(), [1, 1, 1])
+        self.assertEqual(split("x", (0, 1, 3)).edges, (0.0, 1.0, 3.0))
+        self.assertEqual(split("x", (0, 1, 3)).centers.tolist(), [0.5, 2])
+        self.assertEqual(split("x", (0, 1, 3)).widths.tolist(), [1, 2])
+        self.assertEqual(bin("x", 2, 0, 1).keys()[1:3], (Interval(0, 0.5), Interval(0.5, 1)))
+
+        h = Hist(bin("x", 4, 0, 2), profile("y"))
+        self.assertFalse(hasattr(h._fixed[0], "__dict__"))
+        self.assertFalse(hasattr(Interval(0, 1), "__dict__"))
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            axis = pickle.loads(pickle.dumps(h._fixed[0], protocol))
+            self.assertEqual(axis, h._fixed[0])
+            self.assertEqual((axis._parsed, axis._shapeindex), (h._fixed[0]._parsed, h._fixed[0]._shapeindex))
+            self.assertEqual(pickle.loads(pickle.dumps(Interval(0, 1, closedhigh=True), protocol)), Interval(0, 1, closedhigh=True))
+            self.assertEqual(pickle.loads(pickle.dumps(IntervalNaN(), protocol)), IntervalNaN())
+
+    def test_pandas(self):
+        try:
+            import pandas
+        except ImportError:
+            return
+
+        h = Hist(groupby("c"), bin("x", 2, 0, 2, underflow=False), intbin("i", 0, 1), profile("y"))
+        h.fill(c=["a", "b", "b"], x=[0.5, 1.5, numpy.nan], i=[0, 1, 2], y=[1.0, 2.0, 3.0])
+        df = h.pandas("y", error=False)
+        self.assertEqual(df.index.names, ["c", "x", "i"])
+        self.assertEqual(len(df), 2 * 4 * 4)
+        self.assertEqual(df.loc[("a", pandas.Interval(0.0, 1.0, closed="left"), "0")]["count()"], 1)
+        self.assertEqual(df.loc[("b", pandas.Interval(1.0, 2.0, closed="left"), "1")]["y"], 2)
+        self.assertEqual(df.loc[("b", "{NaN}", pandas.Interval(1, float("inf"), closed="right"))]["y"], 3)
+        self.assertEqual(df["count()"].sum(), 3)
+
+        h = Hist(groupbin("x", 1))
+        h.fill(x=[0.5, numpy.nan])
+        self.assertEqual(list(h.pandas(error=False).index), [(pandas.Interval(0.0, 1.0, closed="left"),), ("{NaN}",)])
+
+    def test_arrow(self):
+        try:
+            import pyarrow
+        except ImportError:
+            return
+
+        for h in Hist(bin("x", 2, 0, 2)), Hist(groupby("c"), bin("x", 2, 0, 2)):
+            h.arrow()
+            h._rootblocks()
+            self.assertEqual(h._content, None)
+        self.assertEqual(Hist.fromarrow(Hist(bin("x", 2, 0, 2)).arrow())._content.tolist(), [[0], [0], [0], [0], [0]])
+
+        h = Hist(groupby("c"), groupbin("x", 1), bin("x", 2, 0, 2), intbin("i", 0, 1, overflow=False), cut("i > 0"), profile("y"), weight="w")
+        h.fill(c=["a", "b", "b"], x=[0.5, 1.5, numpy.nan], i=[0, 1, 2], y=[1.0, 2.0, 3.0], w=[1.0, 2.0, 0.5])
+        table = h.arrow()
+        self.assertEqual(table.num_rows, 2 * 3 * 5 * 3 * 2)
+        self.assertEqual(table.column_names[:7], ["c", "x", "low(x)", "high(x)", "low(i)", "high(i)", "i > 0"])
+        self.assertEqual(table.schema.field("c").type, pyarrow.dictionary(pyarrow.int32(), pyarrow.string()))
+        self.assertEqual(table.column("low(x)").to_pylist()[:7], [-numpy.inf] * 6 + [0.0])
+
+        g = Hist.fromarrow(table)
+        self.assertEqual(repr(g), repr(h))
+        self.assertEqual(set(g._content), set(["a", "b"]))
+        self.assertEqual(set(g._content["b"]), set([0.0, 1.0, "NaN"]))
+        for n in "a", "b":
+            for m in h._content[n]:
+                self.assertEqual(h._content[n][m].tolist(), g._content[n][m].tolist())
+
+        h = Hist(bin("x", 2, 0, 2))
+        h.fill(x=[0.5, 1.5, 1.5])
+        g = Hist.fromarrow(h.arrow())
+        self.assertEqual(g._content.dtype, h._content.dtype)
+        self.assertEqual(g._content.tolist(), h._content.tolist())
+        self.assertRaises(TypeError, lambda: Hist(bin("x", 2, 0, 2), defs={"a": numpy.arange(2)}).arrow())
+
+        h = Hist(groupbin("x", 1), cut("y > 0"), profile("x"), profile("y > 0"))
+        h.fill(x=[0.5, 1.5, 1.5], y=[1, -1, 1])
+        table = h.arrow()
+        self.assertEqual(table.column_names[:2], ["key(x)", "key(y > 0)"])
+        self.assertEqual(len(set(table.column_names)), len(table.column_names))
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            return
+        filename = os.path.join(tempfile.mkdtemp(), "h.parquet")
+        h.toparquet(filename)
+        g = Hist.fromparquet(filename)
+        self.assertEqual(repr(g), repr(h))
+        for n in h._content:
+            self.assertEqual(g._content[n].tolist(), h._content[n].tolist())
+
+    def test_uproot(self):
+        try:
+            import uproot
+        except ImportError:
+            return
+
+        h = Hist(bin("x", 2, 0, 2, underflow=False), intbin("i", 0, 1), weight="w")
+        h.fill(x=[-1, 0.5, 1.5, 1.5, 5], i=[0, 0, 1, 2, 0], w=[1, 2, 3, 4, 5])
+        m = h.uproot()
+        self.assertEqual(m.classname, "TH2D")
+        self.assertEqual(m.values(flow=True).tolist(), [[0, 0, 0, 0], [0, 2, 0, 0], [0, 0, 3, 4], [0, 5, 0, 0]])
+        self.assertEqual(m.axis(1).edges().tolist(), [-0.5, 0.5, 1.5])
+
+        h = Hist(groupby("c"), groupbin("y", 1), bin("x", 2, 0, 2), profile("x"))
+        h.fill(c=["a", "b", "b"], x=[0.5, 1.5, 1.5], y=[0.5, 1.5, 3.5])
+        self.assertRaises(TypeError, lambda: h.uproot())
+        filename = os.path.join(tempfile.mkdtemp(), "test.root")
+        Book(h=h).toroot(filename)
+        f = uproot.open(filename)
+        self.assertEqual(sorted(f.keys(cycle=False)), ["h", "h/a", "h/b"])
+        self.assertEqual(f["h/b"].classname, "TProfile2D")
+        self.assertEqual(f["h/b"].axis(0).edges().tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(f["h/b"].values().tolist(), [[0, 0], [0, 1.5], [0, 0], [0, 1.5]])
+
+    def test_vegalite(self):
+        h = Hist(groupby("c"), bin("x", 4, 0, 4), profile("y"))
+        h.fill(c=["a", "b", "b"], x=[0.5, 1.5, 3.5], y=[1.0, 2.0, 3.0])
+
+        values = h.overlay("c").step("x").vegalite()["data"]["values"]
+        self.assertEqual([(x["a0"], x["a1"], x["a2"]) for x in values if x["a0"] == "b"], [("b", 0.0, 0.0), ("b", 1e-10*4, 0.0), ("b", 1.0, 1.0), ("b", 2.0, 0.0), ("b", 3.0, 1.0), ("b", 4.0, 0.0)])
+        values = h.marker("x", profile="y").vegalite()["data"]["values"]
+        self.assertEqual([(x["a0"], x["a1"], x["a2"]) for x in values], [(0.0, 1.0, 0.0), (1.0, 2.0, 0.0), (2.0, 0.0, 0.0), (3.0, 3.0, 0.0)])
+
+        plot = overlay(h.step("x"), h.bar("c"))
+        self.assertEqual(json.loads(plot.tojson(batchsize=2)), plot.vegalite())
+
+        values = h.step("x").vegalite(maxbins=2)["data"]["values"]
+        self.assertEqual([(x["a0"], x["a1"]) for x in values], [(0.0, 0.0), (1e-10*4, 2.0), (2.0, 1.0), (4.0, 0.0)])
+
+    def test_afill(self):
+        if sys.version_info < (3, 5):
+            return
+        import asyncio
+        import inspect
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        def resolved(x):
+            future = loop.create_future()
+            loop.call_soon(future.set_result, x)
+            return future
+
+        class Source(object):
+            def __init__(self, chunks):
+                self.chunks = list(chunks)
+            def __aiter__(self):
+                return self
+            def __anext__(self):
+                future = loop.create_future()
+                if len(self.chunks) == 0:
+                    future.set_exception(StopAsyncIteration())
+                else:
+                    future.set_result(self.chunks.pop(0))
+                return future
+
+        book = Book(one=Hist(bin("x", 2, 0, 2, underflow=False, overflow=False, nanflow=False)), two=Hist(groupby("c")))
+        unused = resolved(None)
+        loop.run_until_complete(asyncio.gather(book.afill(x=resolved([0.5, 1.5]), c=["a", "b"], y=unused),
+                                               book.afill({"x": [1.5], "c": resolved(["a"])})))
+        self.assertEqual(book["one"]._content.tolist(), [[1], [2]])
+        self.assertEqual(dict((n, x.tolist()) for n, x in book["two"]._content.items()), {"a": [2], "b": [1]})
+
+        junk = asyncio.sleep(0)
+        loop.run_until_complete(book.afill({"x": [], "c": [], "junk": junk}))
+        self.assertEqual(inspect.getcoroutinestate(junk), "CORO_CLOSED")
+
+        loop.run_until_complete(book.afillstream(Source([{"x": [0.5], "c": ["b"]}, {"x": resolved([0.5, 0.5]), "c": ["b", "b"]}])))
+        self.assertEqual(book["one"]._content.tolist(), [[4], [2]])
+        self.assertEqual(book["two"]._content["b"].tolist(), [4])
+        asyncio.set_event_loop(None)
+        loop.close()
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(asyncio.gather(book.afill(x=resolved([0.5]), c=["a"]), book.afill(x=[1.5], c=["a"]), book.afill(x=[1.5], c=["a"])))
+        self.assertEqual(book["one"]._content.tolist(), [[5], [4]])
+        self.assertEqual(book["two"]._content["a"].tolist(), [5])
+        asyncio.set_event_loop(None)
+        loop.close()
+
+    def test_pickle(self):
+        book = Book(one=Hist(bin("x", 2, 0, 2)), two=Hist(groupby("c"), profile("x")))
+        book.startmetrics()
+        book.fill(x=[0.5, 1.5], c=["a", "b"])
+        book2 = pickle.loads(pickle.dumps(book))
+        self.assertEqual(book2.metrics, None)
+        book2.fill(x=[0.5], c=["a"])
+        self.assertEqual(book2["one"]._content[:, 0].tolist(), [0, 2, 1, 0, 0])
+        self.assertEqual(book["one"]._content[:, 0].tolist(), [0, 1, 1, 0, 0])
+        self.assertEqual(book2["two"]._content["a"].tolist(), [1.0, 0.5, 2])
+
+    def test_filter(self):
+        x = numpy.arange(100) % 7 * 0.3
+        c = numpy.arange(100) % 3
+        passing = (x > 0.5)
+
+        h = Hist(groupby("c"), bin("x", 2, 0, 2), profile("x"), weight="x + 1", filter="x > 0.5")
+        self.assertEqual(h.fields, ["c", "x"])
+        self.assertTrue(any(isinstance(instruction, histbook.instr.Compress) for instruction in h._instructions))
+        h.fill(x=x, c=c)
+        expected = Hist(groupby("c"), bin("x", 2, 0, 2), profile("x"), weight="x + 1")
+        expected.fill(x=x[passing], c=c[passing])
+        self.assertEqual(sorted(h._content), sorted(expected._content))
+        for n in expected._content:
+            self.assertTrue(numpy.allclose(h._content[n], expected._content[n]))
+
+        shared = Book(one=Hist(bin("x", 2, 0, 2), filter="x > 0.5"), two=Hist(groupby("c"), filter="x > 0.5"))
+        shared.fill(x=x, c=c)
+        self.assertTrue(any(isinstance(instruction, histbook.instr.Compress) for instruction in shared._instructions))
+        self.assertEqual(shared["one"]._content[:, 0].tolist(), [0, 28, 42, 0, 0])
+        self.assertEqual(sum(x[0] for x in shared["two"]._content.values()), numpy.count_nonzero(passing))
+
+        mixed = Book(one=Hist(bin("x", 2, 0, 2), filter="x > 0.5"), two=Hist(groupby("c"), filter="c == 2"), three=Hist(bin("x", 2, 0, 2)))
+        mixed.fill(x=x, c=c)
+        self.assertFalse(any(isinstance(instruction, histbook.instr.Compress) for instruction in mixed._instructions))
+        self.assertEqual(mixed["one"]._content[:, 0].tolist(), [0, 28, 42, 0, 0])
+        self.assertEqual(dict((n, x.tolist()) for n, x in mixed["two"]._content.items()), {2: [33]})
+        self.assertEqual(mixed["three"]._content[:, 0].sum(), 100)
+
+        self.assertRaises(ValueError, lambda: Hist(bin("x", 2, 0, 2), filter="True"))
+
+        self.assertEqual((Hist(bin("x", 2, 0, 2), filter="x > 0.5") + Hist(bin("x", 2, 0, 2), filter="x>0.5"))._filter, "x > 0.5")
+        self.assertEqual(Hist.group(a=Hist(bin("x", 2, 0, 2), weight="x + 1", filter="x > 0.5"), b=Hist(bin("x", 2, 0, 2), weight="x + 1", filter="x > 0.5"))._opts()["filter"], "x > 0.5")
+        def iadd(a, b):
+            a += b
+        for a, b in [(Hist(bin("x", 2, 0, 2), filter="x > 0.5"), Hist(bin("x", 2, 0, 2), filter="c == 2")),
+                     (Hist(bin("x", 2, 0, 2), filter="x > 0.5"), Hist(bin("x", 2, 0, 2))),
+                     (Hist(bin("x", 2, 0, 2), weight="x + 1"), Hist(bin("x", 2, 0, 2), weight="x")),
+                     (Hist(bin("x", 2, 0, 2)), Hist(bin("x", 2, 0, 2), weight="x"))]:
+            self.assertRaises(ValueError, lambda: a + b)
+            self.assertRaises(ValueError, lambda: iadd(a, b))
+            self.assertRaises(ValueError, lambda: Hist.group(a=a, b=b))
+            self.assertRaises(ValueError, lambda: Book(one=a) + Book(one=b))
+
+    def test_register(self):
+        calls = []
+        def testcalibration(x, scale):
+            calls.append(len(x))
+            return x * scale
+        histbook.calc.register("testcalibration", testcalibration, numargs=2)
+        histbook.calc.register("testcbrt", numpy.cbrt)
+
+        book = Book(one=Hist(bin("testcalibration(x, 2)", 4, 0, 4)), two=Hist(bin("testcalibration(x, 2) + 1", 4, 0, 4)), three=Hist(bin("testcbrt(x)", 4, 0, 4)))
+        book.fill(x=[0.1, 0.6, 1.2])
+        self.assertEqual(calls, [3])
+        self.assertEqual(book["one"]._content[:, 0].tolist(), [0, 1, 1, 1, 0, 0, 0])
+        self.assertEqual(book["two"]._content[:, 0].tolist(), [0, 0, 1, 1, 1, 0, 0])
+        self.assertEqual(book["three"]._content[:, 0].tolist(), [0, 2, 1, 0, 0, 0, 0])
+
+        self.assertRaises(histbook.expr.ExpressionError, lambda: Hist(bin("testcalibration(x)", 2, 0, 1)))
+        self.assertRaises(histbook.expr.ExpressionError, lambda: Hist(bin("testcbrt(x, 2)", 2, 0, 1)))
+        self.assertRaises(ValueError, lambda: histbook.calc.register("sqrt", numpy.sqrt))
+        self.assertRaises(ValueError, lambda: histbook.calc.register(3, numpy.sqrt))
+
+        histbook.calc.register(u"testunicodecbrt", numpy.cbrt)
+        self.assertEqual(Hist(bin("testunicodecbrt(x)", 4, 0, 4), fill={"x": [8.0]})._content[:, 0].tolist(), [0, 0, 0, 1, 0, 0, 0])
+
+    def test_quantile(self):
+        random = numpy.random.RandomState(12345)
+        x = random.uniform(0, 2, 10000)
+        y = random.lognormal(0, 1, 10000) * numpy.where(random.uniform(size=10000) < 0.2, -1, 1)
+        y[:10] = numpy.nan
+        y[10:20] = 0
+
+        self.assertEqual(quantile("y").numbuckets, 281)
+        h = Hist(bin("x", 2, 0, 2, underflow=False, overflow=False, nanflow=False), quantile("y", relerr=0.01))
+        h.fill(x=x[:5000], y=y[:5000])
+        h2 = Hist(bin("x", 2, 0, 2, underflow=False, overflow=False, nanflow=False), quantile("y", relerr=0.01))
+        h2.fill(x=x[5000:], y=y[5000:])
+        h += h2
+        sketch = h._profile[0]
+        self.assertEqual(h._content[:, sketch._sketchindex : sketch._sketchindex + sketch.numbuckets].sum(), 10000 - 10)
+
+        table = h.table("y", quantiles=(0.1, 0.5, 0.9))
+        self.assertEqual(table.dtype.names, ("count()", "err(count())", "y", "err(y)", "quantile(y, 0.1)", "quantile(y, 0.5)", "quantile(y, 0.9)"))
+        for i in 0, 1:
+            selected = y[(x >= i) & (x < i + 1) & ~numpy.isnan(y)]
+            for q in 0.1, 0.5, 0.9:
+                expected = numpy.percentile(selected, 100*q)
+                self.assertTrue(abs(table[i]["quantile(y, {0})".format(q)] - expected) <= 0.02 * abs(expected) + 0.01)
+
+        weighted = Hist(groupby("c"), quantile("y", relerr=0.05), weight="w")
+        weighted.fill(c=[1, 1, 1, 2], y=[1.0, 2.0, 3.0, -5.0], w=[1.0, 1.0, 10.0, 1.0])
+        self.assertTrue(abs(weighted.table("y")[1]["quantile(y, 0.5)"] - 3.0) < 0.05*3.0)
+        self.assertTrue(abs(weighted.table("y")[2]["quantile(y, 0.5)"] + 5.0) < 0.05*5.0)
+
+        sparse = Hist(bin("x", 2, 0, 2, underflow=False, overflow=False, nanflow=False), quantile("y"), weight="w", compensated=True)
+        dense = Hist(bin("x", 2, 0, 2, underflow=False, overflow=False, nanflow=False), quantile("y"), weight="w")
+        for start in range(0, 10000, 100):
+            sparse.fill(x=x[start : start + 100], y=y[start : start + 100], w=numpy.ones(100))
+        dense.fill(x=x, y=y, w=numpy.ones(10000))
+        sketch = slice(sparse._profile[0]._sketchindex, sparse._profile[0]._sketchindex + sparse._profile[0].numbuckets)
+        self.assertEqual(sparse._content[:, sketch].tolist(), dense._content[:, sketch].tolist())
+        self.assertTrue(numpy.allclose(sparse._content, dense._content, rtol=1e-6, atol=0, equal_nan=True))
+
+        self.assertEqual(h.table("y", quantiles=()).dtype.names, ("count()", "err(count())", "y", "err(y)"))
+        self.assertEqual(h.project().table("y")["count()"], 10000)
+
+    def test_drop(self):
+        h = Hist(bin("x", 2, 0, 2), profile("x"), quantile("y"), profile("y"))
+        h.fill(x=[0.5, 0.6, 1.5], y=[10.0, -3.0, 2.0])
+        before = h.table("x", "y").tolist()
+        dropped = h.drop("x")
+        self.assertEqual(h.table("x", "y").tolist(), before)
+        self.assertEqual(dropped.table(dropped.axis.quantile("y")).tolist(), h.table(h.axis.quantile("y")).tolist())
+        self.assertEqual(dropped.table(dropped.axis.profile("y")).tolist(), h.table(h.axis.profile("y")).tolist())
+        self.assertEqual(h.drop("y").table("x").tolist(), h.table("x").tolist())
+
+    def test_grow(self):
+        h = Hist(growbin("x", 0.5), growintbin("n"))
+        self.assertEqual(h.shape, (1, 0, 1))
+        h.fill(x=[0.1, 1.2, numpy.nan, numpy.inf], n=[3, 4, 3, 5])
+        self.assertEqual((h.axis[0].low, h.axis[0].high, h.axis[1].min, h.axis[1].max), (0.0, 1.5, 3, 5))
+        self.assertEqual(h._content[..., 0].tolist(), [[1, 0, 0], [0, 0, 0], [0, 1, 0], [1, 0, 0]])
+        h.fill(x=[-1.1], n=[7])
+        self.assertEqual((h.axis[0].low, h.axis[0].high, h.axis[1].min, h.axis[1].max), (-1.5, 1.5, 3, 7))
+        self.assertEqual(h._content[..., 0].tolist(), [[0, 0, 0, 0, 1], [0, 0, 0, 0, 0], [0, 0, 0, 0, 0], [1, 0, 0, 0, 0], [0, 0, 0, 0, 0], [0, 1, 0, 0, 0], [1, 0, 0, 0, 0]])
+
+        other = Hist(growbin("x", 0.5), growintbin("n"), fill={"x": [5.2], "n": [-2]})
+        self.assertEqual(h.axis[0], other.axis[0])
+        total = h + other
+        self.assertEqual((total.axis[0].low, total.axis[0].high, total.axis[1].min, total.axis[1].max), (-1.5, 5.5, -2, 7))
+        self.assertEqual(total._content.sum(), 5)
+        self.assertEqual(total.project("x").table()["count()"].tolist(), [1, 0, 0, 1, 0, 1, 0, 0, 0, 0, 0, 0, 0, 1, 1])
+        self.assertEqual(h.shape, (7, 5, 1))
+        h += other
+        self.assertEqual(h.shape, total.shape)
+        self.assertEqual(h._content.tolist(), total._content.tolist())
+        self.assertEqual(Hist.fromarrow(total.arrow())._content.tolist(), total._content.tolist())
+        self.assertEqual(Hist.group(a=other, b=Hist(growbin("x", 0.5), growintbin("n"))).shape, (2, 1, 1))
+
+        h = Hist(growbin("x", 1, low=-0.5, high=2))
+        self.assertEqual(h.axis[0].edges.tolist(), [-1, 0, 1, 2])
+        copy = h.copy()
+        copy.fill(x=[10])
+        self.assertEqual(h.shape, (4, 1))
+        self.assertEqual(copy.shape, (13, 1))
+
+        h = Hist(growbin("x", 1), growintbin("n", maxbins=10))
+        h.fill(x=[0.0], n=[0])
+        self.assertRaises(ValueError, lambda: h.fill(x=[1e9], n=[0]))
+        self.assertRaises(ValueError, lambda: h.fill(x=[1e300], n=[0]))
+        self.assertRaises(ValueError, lambda: h.fill(x=[1.0], n=[10]))
+        self.assertEqual((h.shape, h._content.sum()), ((2, 1, 1), 1))
+        h.fill(x=[99999.0], n=[9])
+        self.assertEqual((h.shape, h._content.sum()), ((100001, 10, 1), 2))
+        self.assertEqual(Hist.fromarrow(h.arrow()).axis[1], growintbin("n", maxbins=10))
+        self.assertRaises(ValueError, lambda: growbin("x", 1e-6, low=0, high=1))
+        self.assertRaises(TypeError, lambda: growintbin("n", maxbins=0))
+
+    def test_fill_sources(self):
+        def hist():
+            return Hist(bin("x", 2, 0, 2, underflow=False, overflow=False, nanflow=False), weight="w")
+
+        records = numpy.array([(0.5, 1.0, 9), (1.5, 2.0, 9)], dtype=[("x", float), ("w", float), ("unused", int)])
+        h = hist()
+        h.fill(records)
+        self.assertEqual(h._content.tolist(), [[1, 1], [2, 4]])
+        h = hist()
+        h.fill(records[["x"]], w=[1, 2])
+        self.assertEqual(h._content.tolist(), [[1, 1], [2, 4]])
+        self.assertRaises(ValueError, lambda: hist().fill(records[["x"]]))
+
+        h = hist()
+        h.fill(x=memoryview(numpy.array([0.5, 1.5])), w=memoryview(numpy.array([1.0, 1.0])))
+        self.assertEqual(h._content[:, 0].tolist(), [1, 1])
+
+        try:
+            import pandas
+        except ImportError:
+            pass
+        else:
+            h = hist()
+            h.fill(pandas.DataFrame({"x": [0.5, 1.5], "w": [1.0, 2.0]}))
+            self.assertEqual(h._content.tolist(), [[1, 1], [2, 4]])
+
+        try:
+            import pyarrow
+        except ImportError:
+            pass
+        else:
+            table = pyarrow.Table.from_arrays([pyarrow.array([0.5, 1.5]), pyarrow.array([1.0, 2.0])], ["x", "w"])
+            for source in table, table.to_batches()[0]:
+                h = hist()
+                h.fill(source)
+                self.assertEqual(h._content.tolist(), [[1, 1], [2, 4]])
+
+    def test_fillfrom(self):
+        x = numpy.arange(100) % 7 * 0.3
+        y = numpy.arange(100) % 3
+        def book():
+            return Book(one=Hist(bin("x", 2, 0, 2)), two=Hist(groupby("y"), weight="x"))
+        expected = book()
+        expected.fill(x=x, y=y)
+        def check(book):
+            self.assertEqual(book["one"]._content.tolist(), expected["one"]._content.tolist())
+            self.assertEqual(sorted(book["two"]._content), [0, 1, 2])
+            for n in 0, 1, 2:
+                self.assertTrue(numpy.allclose(book["two"]._content[n], expected["two"]._content[n]))
+
+        directory = tempfile.mkdtemp()
+        numpy.save(os.path.join(directory, "x.npy"), x)
+        numpy.save(os.path.join(directory, "y.npy"), y)
+        numpy.save(os.path.join(directory, "unused.npy"), numpy.zeros(3))
+        for chunksize in None, 30:
+            b = book()
+            b.fillfrom(directory, chunksize=chunksize)
+            check(b)
+        self.assertRaises(ValueError, lambda: Hist(bin("z", 2, 0, 2)).fillfrom(directory))
+
+        numpy.savez_compressed(os.path.join(directory, "data.npz"), x=x, y=y, unused=numpy.zeros(3))
+        b = book()
+        b.fillfrom(os.path.join(directory, "data.npz"), chunksize=30)
+        check(b)
+
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            return
+        pyarrow.parquet.write_table(pyarrow.Table.from_arrays([pyarrow.array(x), pyarrow.array(y), pyarrow.array(x)], ["x", "y", "unused"]), os.path.join(directory, "data.parquet"), row_group_size=40)
+        for chunksize in None, 30:
+            b = book()
+            b.fillfrom(os.path.join(directory, "data.parquet"), chunksize=chunksize)
+            check(b)
+        self.assertRaises(ValueError, lambda: Hist(bin("z", 2, 0, 2)).fillfrom(os.path.join(directory, "data.parquet")))
+
+    def test_filldask(self):
+        try:
+            import dask.array
+        except ImportError:
+            return
+
+        x = numpy.arange(100) % 7 * 0.3
+        c = numpy.arange(100) % 3
+        for scheduler in "threads", "processes":
+            book = Book(one=Hist(bin("x", 2, 0, 2, underflow=False, overflow=False, nanflow=False)), two=Hist(groupby("c"), profile("x"), weight="x"))
+            expected = Book(one=Hist(bin("x", 2, 0, 2, underflow=False, overflow=False, nanflow=False)), two=Hist(groupby("c"), profile("x"), weight="x"))
+            expected.fill(x=x, c=c, y=None)
+            book.filldask(x=dask.array.from_array(x, chunks=9), c=c, y=None, scheduler=scheduler, splitevery=3)
+            self.assertEqual(book["one"]._content.tolist(), expected["one"]._content.tolist())
+            self.assertEqual(sorted(book["two"]._content), [0, 1, 2])
+            for n in 0, 1, 2:
+                self.assertTrue(numpy.allclose(book["two"]._content[n], expected["two"]._content[n]))
+
+        book = Book(one=Hist(bin("x", 2, 0, 2)), two=Hist(groupby("c"), bin("x", 2, 0, 2)))
+        metrics = book.startmetrics()
+        book.filldask(x=dask.array.from_array(x, chunks=9), c=c, scheduler="threads")
+        self.assertEqual((metrics.fills, metrics.events), (12, 100))
+        self.assertEqual((metrics.hists["one"].fills, metrics.hists["one"].events), (12, 100))
+        self.assertTrue(book["two"].metrics is metrics.hists["two"])
+
+        self.assertRaises(TypeError, lambda: Hist(bin("x", 2, 0, 2)).filldask(x=x))
@@ -623,3 +623,19 @@ class TestProj(unittest.TestCase):
 
         h7 = h.rebin("x", (3,))
         self.assertEqual(tolist(h7._content), {"one": [[7], [8], [16]], "two": [[7], [8], [16]]})
+
+    def test_rebinby(self):
+        for axis in bin("x", 4, 0, 4), split("x", (0, 1, 2, 3, 4)):
+            h = Hist(axis)
+            h.fill(x=[0.5, 1.5, 1.5, 2.5, 3.5, 3.5, 3.5])
+            self.assertEqual(h.rebinby("x", 2).table(error=False)["count()"].tolist(), [0, 3, 4, 0, 0])
+
+        h = Hist(groupbin("x", 1))
+        h.fill(x=[0.5, 1.5, 1.5, 2.5, 3.5, 3.5, 3.5])
+        self.assertEqual(h.rebinby("x", 2).axis[0], groupbin("x", 2))
+        self.assertEqual(dict((n, x.tolist()) for n, x in h.rebinby("x", 2)._content.items()), {0.0: [3], 2.0: [4]})
+
+    def test_project_away_odd(self):
+        h = Hist(groupby("c"), bin("x", 2, 0, 2, underflow=False, overflow=False, nanflow=False))
+        h.fill(c=[1, 2, 3], x=[0.5, 1.5, 1.5])
+        self.assertEqual(h.project("x")._content.tolist(), [[1], [2]])